@@ -0,0 +1,54 @@
+"""
+Move old expenses into compressed yearly archives (see app.services.archive).
+
+	python -m app.archive_expenses
+	python -m app.archive_expenses --months 12 --user 64b7f0c2e4b0a1a2b3c4d5e6
+
+Expenses dated before the first day of the month ARCHIVE_AFTER_MONTHS (or
+--months) ago are archived for every user, or just --user. The job is safe
+to run while the API serves traffic and to re-run after an interruption;
+schedule it e.g. monthly. Workers with the in-process cache pick archived
+data up within CACHE_TTL_SECONDS. Archives need STORAGE_BACKEND=mongo.
+"""
+import argparse
+import asyncio
+from bson import ObjectId
+from dotenv import load_dotenv
+from app.database import close_database, get_database
+from app.services.archive import ARCHIVE_AFTER_MONTHS, archive_cutoff, archive_user_expenses, create_archive_indexes
+from app.services.storage_backends import storage_backend
+from app.services.user_storage import bump_data_version
+
+load_dotenv()
+
+
+async def _main(args) -> None:
+	if not storage_backend.uses_mongo:
+		raise SystemExit(f"Archiving needs MongoDB; STORAGE_BACKEND is {storage_backend.name}.")
+	cutoff = archive_cutoff(months=args.months)
+	db = get_database()
+	try:
+		await create_archive_indexes(db)
+		user_ids = [ObjectId(args.user)] if args.user else await db.users.distinct("_id")
+		users = archived = 0
+		for user_id in user_ids:
+			count = await archive_user_expenses(db, storage_backend.layout, user_id, cutoff)
+			if count:
+				# Cached responses and ETags from before the move must not be reused
+				await bump_data_version(db, str(user_id))
+				users += 1
+				archived += count
+	finally:
+		await close_database()
+	print(f"Archived {archived} expenses dated before {cutoff} for {users} users ({storage_backend.layout.name} layout).")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m app.archive_expenses")
+	parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="keep this many recent months hot")
+	parser.add_argument("--user", help="only archive this user id")
+	asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
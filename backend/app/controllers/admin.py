@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.services.mongo_monitor import command_monitor
+from app.services.profiler import PROFILING_ENABLED, request_profiler
+from app.dependencies import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/mongo/queries")
+async def mongo_query_stats(
+	top: int = Query(20, ge=1, le=200),
+	explain: bool = False,
+	explain_top: int = Query(5, ge=1, le=50)
+) -> dict:
+	"""
+	Get MongoDB command statistics grouped by normalized query shape.
+	Requires the X-Admin-Token header.
+	
+	Shapes are ordered by total time spent. With explain=true, explain() is run
+	for the slowest shapes so collection scans and in-memory sorts are flagged.
+	"""
+	if explain:
+		for key in command_monitor.slowest_shape_keys(explain_top):
+			await command_monitor.explain_shape(key)
+	return command_monitor.report(top=top)
+
+
+@router.delete("/mongo/queries", status_code=204)
+async def reset_mongo_query_stats():
+	"""
+	Clear collected query-shape statistics and the slow-operation log.
+	Requires the X-Admin-Token header.
+	"""
+	command_monitor.reset()
+	return None
+
+
+@router.get("/profiles")
+async def list_profiles() -> dict:
+	"""
+	List the request profiles currently held in the ring buffer (newest first).
+	Requires the X-Admin-Token header.
+	"""
+	return {
+		"enabled": PROFILING_ENABLED,
+		"profiles": [session.summary() for session in reversed(request_profiler.profiles)],
+	}
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: int, format: str = Query("collapsed", pattern="^(collapsed|json)$")):
+	"""
+	Download a single profile.
+	Requires the X-Admin-Token header.
+	
+	format=collapsed returns collapsed stacks for flamegraph.pl or speedscope;
+	format=json returns stacks plus tracemalloc allocation sites.
+	"""
+	session = request_profiler.get(profile_id)
+	if session is None:
+		raise HTTPException(status_code=404, detail="Profile not found")
+	if format == "json":
+		return session.to_dict()
+	return PlainTextResponse(
+		session.collapsed(),
+		headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed"'}
+	)
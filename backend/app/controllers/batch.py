@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.models.schemas import BatchRequest, BatchResponse, User
+from app.services.batch import BATCH_MAX_REQUESTS, run_batch
+from app.services.etag import current_data_version
+from app.dependencies import get_current_user
+from app.database import get_database
+
+router = APIRouter(tags=["batch"])
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_endpoint(
+	payload: BatchRequest,
+	request: Request,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Run several API calls in one round trip (e.g. everything the app loads on launch).
+	Requires authentication.
+
+	Each sub-request names a method, a path with optional query string,
+	optional headers (such as If-None-Match) and a JSON body, and is answered
+	by the regular endpoint as the batch's user. Consecutive GETs run
+	concurrently; writes run in order. Responses come back in request order
+	with their own status, so one failing sub-request does not fail the batch.
+	/batch and /events cannot be batched.
+	"""
+	if len(payload.requests) > BATCH_MAX_REQUESTS:
+		raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_REQUESTS} requests per batch")
+	content = await run_batch(
+		request.app, request.scope, db, current_user, current_data_version(request), payload.requests
+	)
+	# Sub-responses are already JSON: skip response_model validation
+	return Response(content, media_type="application/json")
@@ -0,0 +1,83 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.models.schemas import Budget, BudgetSet, BudgetsResponse, BudgetStatusResponse, User
+from app.services.budgets import current_month, delete_budget, get_budget_status, get_budgets, set_budget
+from app.services.classifier import ExpenseClassifier
+from app.services.custom_categories import is_custom_category
+from app.dependencies import get_current_user
+from app.database import get_database
+
+router = APIRouter(prefix="/budgets", tags=["budgets"])
+
+
+@router.get("", response_model=BudgetsResponse)
+async def list_budgets_endpoint(
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	List the current user's monthly budgets.
+	Requires authentication.
+	"""
+	try:
+		budgets = await get_budgets(db, current_user.id)
+		return BudgetsResponse(
+			budgets=[Budget(category=category, limit=limit) for category, limit in sorted(budgets.items())]
+		)
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error retrieving budgets: {str(e)}")
+
+
+@router.get("/status", response_model=BudgetStatusResponse)
+async def budget_status_endpoint(
+	month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM, defaults to the current month"),
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Spend against each budget of the current user in a month.
+	Requires authentication.
+
+	Spend comes from running counters, so this never scans expenses.
+	"""
+	try:
+		month = month or current_month()
+		return BudgetStatusResponse(month=month, budgets=await get_budget_status(db, current_user.id, month))
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error retrieving budget status: {str(e)}")
+
+
+@router.put("/{category}", response_model=Budget)
+async def set_budget_endpoint(
+	category: str,
+	payload: BudgetSet,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Set the monthly limit for a built-in or custom category.
+	Requires authentication.
+	"""
+	if category not in ExpenseClassifier.CATEGORIES and not await is_custom_category(db, current_user.id, category):
+		raise HTTPException(status_code=400, detail=f"Unknown category {category}")
+	try:
+		await set_budget(db, current_user.id, category, payload.limit)
+		return Budget(category=category, limit=payload.limit)
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/{category}", status_code=204)
+async def delete_budget_endpoint(
+	category: str,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Remove the budget of a category.
+	Requires authentication.
+	"""
+	if not await delete_budget(db, current_user.id, category):
+		raise HTTPException(status_code=404, detail="Budget not found")
+	return None
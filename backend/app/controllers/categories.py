@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.models.schemas import CategoriesResponse, CustomCategory, CustomCategoryCreate, User
+from app.services.classifier import ExpenseClassifier
+from app.services.custom_categories import create_custom_category, delete_custom_category, get_custom_centroids
+from app.dependencies import get_current_user
+from app.database import get_database
+
+router = APIRouter(prefix="/categories", tags=["categories"])
+
+
+@router.get("", response_model=CategoriesResponse)
+async def list_categories_endpoint(
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	List the built-in categories and the current user's custom categories.
+	Requires authentication.
+	"""
+	try:
+		centroids = await get_custom_centroids(db, current_user.id)
+		return CategoriesResponse(
+			built_in=ExpenseClassifier.CATEGORIES,
+			custom=[CustomCategory(name=c["name"], examples=c["examples"]) for c in centroids]
+		)
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error retrieving categories: {str(e)}")
+
+
+@router.post("", response_model=CustomCategory, status_code=201)
+async def create_category_endpoint(
+	payload: CustomCategoryCreate,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Create a custom category for the current user.
+	Requires authentication.
+	
+	The category is learned from the expenses the user labels with it
+	(send "category" when creating or updating an expense).
+	"""
+	try:
+		return await create_custom_category(db, current_user.id, payload.name.strip())
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/{name}", status_code=204)
+async def delete_category_endpoint(
+	name: str,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Delete a custom category. Existing expenses keep their category name.
+	Requires authentication.
+	"""
+	if not await delete_custom_category(db, current_user.id, name):
+		raise HTTPException(status_code=404, detail="Category not found")
+	return None
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from app.models.schemas import ClassifyRequest, ClassifyResponse
-from app.services.classifier import get_classifier
+from app.services.classifier import classify
 
 router = APIRouter(prefix="/classify", tags=["classification"])
 
@@ -13,8 +13,7 @@ async def classify_expense(request: ClassifyRequest):
 	Returns the predicted category, confidence probability, and top 3 categories.
 	"""
 	try:
-		classifier = get_classifier()
-		category, probability, top_classes = classifier.predict(request.description)
+		category, probability, top_classes = classify(request.description)
 		
 		return ClassifyResponse(
 			category=category,
@@ -0,0 +1,69 @@
+from typing import Any, Dict
+import orjson
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.models.schemas import User
+from app.services.etag import current_data_version
+from app.services.events import EVENTS_HEARTBEAT_SECONDS, event_broker
+from app.services.stats import get_category_stats
+from app.dependencies import get_current_user
+from app.database import get_database
+
+router = APIRouter(tags=["events"])
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+	"""Encode one Server-Sent Event."""
+	return b"event: " + event.encode("utf-8") + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def _event_stream(db: AsyncIOMotorDatabase, user_id: str, data_version):
+	# Subscribing inside the generator guarantees the finally block runs
+	subscription = await event_broker.subscribe(user_id)
+	try:
+		yield _sse("ready", {"data_version": data_version})
+		while True:
+			event = await subscription.get(EVENTS_HEARTBEAT_SECONDS)
+			if event is None:
+				yield b": keepalive\n\n"
+				continue
+			
+			# Send everything that piled up in one write, followed by one stats update
+			chunks = []
+			expenses_changed = False
+			for queued in [event, *subscription.drain()]:
+				payload = {key: value for key, value in queued.items() if key not in ("type", "origin")}
+				chunks.append(_sse(queued["type"], payload))
+				expenses_changed = expenses_changed or queued["type"].startswith("expense.")
+			if expenses_changed:
+				chunks.append(_sse("stats", {"stats": await get_category_stats(db, user_id)}))
+			yield b"".join(chunks)
+	finally:
+		event_broker.unsubscribe(subscription)
+
+
+@router.get("/events", responses={200: {"content": {SSE_MEDIA_TYPE: {}}}})
+async def events_endpoint(
+	request: Request,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Stream the current user's expense changes as Server-Sent Events.
+	Requires authentication.
+	
+	Events: "ready" (with the current data_version) on connect, then
+	"expense.created" / "expense.updated" (with the expense),
+	"expense.deleted" (with its id), followed by "stats" with the updated
+	category totals. "resync" means events were dropped because the client
+	fell behind; refetch via GET /expenses/changes. A comment line is sent
+	every EVENTS_HEARTBEAT_SECONDS to keep the connection open.
+	"""
+	return StreamingResponse(
+		_event_stream(db, current_user.id, current_data_version(request)),
+		media_type=SSE_MEDIA_TYPE,
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+	)
@@ -1,32 +1,122 @@
-from datetime import date
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.models.schemas import ExpenseCreate, Expense, ExpensesResponse, User
-from app.services.storage import create_expense, get_expenses_by_user, update_expense, delete_expense
-from app.services.classifier import get_classifier
+from app.models.schemas import (
+	DescriptionSuggestionsResponse, ExpenseBulkCreate, ExpenseBulkResponse, ExpenseCreate, ExpenseCreateResponse, Expense,
+	ExpenseChangesResponse, ExpenseSearchResponse, ExpensesResponse, User
+)
+from app.services.storage import (
+	create_expense, create_expenses_bulk, get_expense_rows_by_user, iter_expense_batches, update_expense, delete_expense,
+	get_expense_rows_changed_since, get_deleted_expense_ids_since, search_expense_rows, PENDING_CATEGORY
+)
+from app.services.autocomplete import DescriptionTrie, autocomplete_index
+from app.services.budgets import check_budget
+from app.services.classifier import ExpenseClassifier, classify_batch
+from app.services.custom_categories import add_label, classify_for_user, get_custom_centroids, is_custom_category
+from app.services.duplicates import DuplicateExpenseError
+from app.services.classification_queue import DEFERRED_CLASSIFICATION, enqueue_classification
+from app.services.etag import conditional_etag, current_data_version, not_modified, set_etag_headers
+from app.services.sync import changes_window_start, decode_sync_token, encode_sync_token, token_expired
 from app.dependencies import get_current_user
 from app.database import get_database
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
-@router.post("", response_model=Expense, status_code=201)
+# ?date_from= / ?date_to= bounds (inclusive ISO dates)
+ISO_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+
+def wants_ndjson(request: Request, stream: bool) -> bool:
+	"""Streaming is chosen with ?stream=true or an NDJSON Accept header."""
+	return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def _ndjson_rows(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+):
+	"""Encode each cursor batch as NDJSON lines as soon as it arrives."""
+	async for batch in iter_expense_batches(db, user_id, date_from=date_from, date_to=date_to):
+		yield b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in batch)
+
+
+async def _categorize(db: AsyncIOMotorDatabase, user_id: str, payload: ExpenseCreate) -> Tuple[str, float, bool]:
+	"""
+	Category and probability for an expense write.
+	
+	A category chosen by the user is kept as-is (probability 1.0) and, for a
+	custom category, reported as a label; otherwise the description is
+	classified with the user's custom categories, keyword rules, then the model.
+	With DEFERRED_CLASSIFICATION the expense is stored as pending instead and
+	classified in the background.
+	
+	Returns:
+		Tuple of (category, probability, is_custom_label)
+	"""
+	if payload.category:
+		if payload.category in ExpenseClassifier.CATEGORIES:
+			return payload.category, 1.0, False
+		if await is_custom_category(db, user_id, payload.category):
+			return payload.category, 1.0, True
+		raise HTTPException(status_code=400, detail=f"Unknown category: {payload.category}")
+	if DEFERRED_CLASSIFICATION:
+		return PENDING_CATEGORY, 0.0, False
+	category, probability, _ = await classify_for_user(db, user_id, payload.description, ranked=False)
+	return category, probability, False
+
+
+async def _categorize_many(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	payloads: List[ExpenseCreate]
+) -> List[Tuple[str, float, bool]]:
+	"""Like _categorize for many payloads, classifying the rest in one batch where possible."""
+	results: List[Optional[Tuple[str, float, bool]]] = [None] * len(payloads)
+	to_classify = []
+	for position, payload in enumerate(payloads):
+		if payload.category or DEFERRED_CLASSIFICATION:
+			results[position] = await _categorize(db, user_id, payload)
+		else:
+			to_classify.append(position)
+	if to_classify and await get_custom_centroids(db, user_id):
+		for position in to_classify:
+			results[position] = await _categorize(db, user_id, payloads[position])
+	elif to_classify:
+		predictions = await asyncio.to_thread(
+			classify_batch, [payloads[position].description for position in to_classify], ranked=False
+		)
+		for position, (category, probability, _) in zip(to_classify, predictions):
+			results[position] = (category, probability, False)
+	return results
+
+
+@router.post("", response_model=ExpenseCreateResponse, status_code=201)
 async def create_expense_endpoint(
 	payload: ExpenseCreate,
 	current_user: User = Depends(get_current_user),
 	db: AsyncIOMotorDatabase = Depends(get_database)
 ):
 	"""
-	Create a new expense. The description will be automatically classified.
+	Create a new expense. The description will be automatically classified
+	unless a built-in or custom "category" is given.
 	Date is automatically set to today if not provided.
 	Requires authentication.
 	
-	Returns the created expense with its predicted category.
+	Returns the created expense with its predicted category ("pending" while
+	deferred classification is running) and whether that category is now
+	over its budget for the expense's month.
 	"""
 	try:
-		# Classify the expense
-		classifier = get_classifier()
-		category, probability, _ = classifier.predict(payload.description)
+		# Classify the expense unless the user picked a category
+		category, probability, labeled = await _categorize(db, current_user.id, payload)
 		
 		# Set current date if not provided
 		expense_date = payload.date if payload.date else date.today().isoformat()
@@ -40,14 +130,75 @@ async def create_expense_endpoint(
 		
 		# Store the expense in the database for the current user
 		expense = await create_expense(db, current_user.id, expense_payload, category, probability)
+		if labeled:
+			await add_label(db, current_user.id, category, payload.description)
+		elif category == PENDING_CATEGORY:
+			await enqueue_classification(db, current_user.id, expense.id, payload.description)
 		
-		return expense
+		budget = await check_budget(db, current_user.id, expense.category, expense.date)
+		return ExpenseCreateResponse.model_construct(
+			**expense.model_dump(), over_budget=bool(budget and budget["over_budget"])
+		)
+	except HTTPException:
+		raise
+	except DuplicateExpenseError as e:
+		raise HTTPException(status_code=409, detail={"message": str(e), "duplicate_of": e.duplicate_of})
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Error creating expense: {str(e)}")
 
 
-@router.get("", response_model=ExpensesResponse)
+@router.post("/bulk", response_model=ExpenseBulkResponse, status_code=201)
+async def create_expenses_bulk_endpoint(
+	payload: ExpenseBulkCreate,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Import many expenses at once (e.g. from a bank export).
+	Requires authentication.
+	
+	Descriptions without a "category" are classified in one batch. Near-
+	duplicates of existing expenses or of earlier items are flagged
+	(duplicate_of) or, with DUPLICATE_POLICY=reject, listed under rejected.
+	"""
+	try:
+		categorized = await _categorize_many(db, current_user.id, payload.expenses)
+		created, rejected = await create_expenses_bulk(db, current_user.id, [
+			(item, category, probability)
+			for item, (category, probability, _) in zip(payload.expenses, categorized)
+		])
+		
+		rejected_indices = {index for index, _ in rejected}
+		kept = [
+			(item, categorized[index])
+			for index, item in enumerate(payload.expenses) if index not in rejected_indices
+		]
+		for expense, (item, (category, _, labeled)) in zip(created, kept):
+			if labeled:
+				await add_label(db, current_user.id, category, item.description)
+			elif category == PENDING_CATEGORY:
+				await enqueue_classification(db, current_user.id, expense.id, item.description)
+		
+		return ExpenseBulkResponse(
+			created=created,
+			rejected=[{"index": index, "duplicate_of": duplicate_of} for index, duplicate_of in rejected]
+		)
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error importing expenses: {str(e)}")
+
+
+@router.get(
+	"",
+	response_model=ExpensesResponse,
+	responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}}
+)
 async def list_expenses_endpoint(
+	request: Request,
+	stream: bool = False,
+	date_from: Optional[str] = Query(None, pattern=ISO_DATE_PATTERN),
+	date_to: Optional[str] = Query(None, pattern=ISO_DATE_PATTERN),
 	current_user: User = Depends(get_current_user),
 	db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -55,15 +206,144 @@ async def list_expenses_endpoint(
 	Get all expenses for the current user.
 	Requires authentication.
 	
-	Returns a list of all stored expenses for the authenticated user.
+	Returns a list of all stored expenses for the authenticated user, or
+	those dated within ?date_from=&date_to= (inclusive, YYYY-MM-DD). Ranges
+	covering only recent months never read archived years.
+	With ?stream=true or "Accept: application/x-ndjson", expenses are streamed
+	as one JSON object per line while the cursor is read, so memory use and
+	time-to-first-byte do not grow with the user's history.
+	
+	Responses carry an ETag derived from the user's data version; send it back
+	in If-None-Match to get 304 Not Modified while nothing has changed.
 	"""
+	ndjson = wants_ndjson(request, stream)
+	view = "expenses-ndjson" if ndjson else "expenses"
+	# The range is part of the ETag but not of the metric label
+	etag_view = f"{view}:{date_from or ''}:{date_to or ''}" if date_from or date_to else view
+	etag = conditional_etag(request, current_user.id, etag_view)
+	unchanged = not_modified(request, etag, view)
+	if unchanged is not None:
+		return unchanged
+	
+	if ndjson:
+		response = StreamingResponse(
+			_ndjson_rows(db, current_user.id, date_from, date_to), media_type=NDJSON_MEDIA_TYPE
+		)
+		set_etag_headers(response, etag)
+		return response
+	
 	try:
-		expenses = await get_expenses_by_user(db, current_user.id)
-		return ExpensesResponse(expenses=expenses)
+		# Rows are trusted storage output: skip response_model validation and
+		# serialize straight to JSON with orjson
+		expenses = await get_expense_rows_by_user(db, current_user.id, date_from, date_to)
+		response = ORJSONResponse({"expenses": expenses})
+		set_etag_headers(response, etag)
+		return response
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Error retrieving expenses: {str(e)}")
 
 
+@router.get("/search", response_model=ExpenseSearchResponse)
+async def search_expenses_endpoint(
+	q: str = Query(..., min_length=1, max_length=200),
+	limit: int = Query(20, ge=1, le=100),
+	offset: int = Query(0, ge=0),
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Search the current user's expenses by description, best match first.
+	Requires authentication.
+	
+	Matching is word-based with stemming ("movies" finds "movie"); use
+	GET /expenses/suggest for prefix completion while typing. Page with
+	offset/limit; next_offset is null on the last page.
+	"""
+	try:
+		# One extra row tells whether another page exists
+		rows = await search_expense_rows(db, current_user.id, q, limit + 1, offset)
+		return ORJSONResponse({
+			"results": rows[:limit],
+			"next_offset": offset + limit if len(rows) > limit else None
+		})
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error searching expenses: {str(e)}")
+
+
+@router.get("/suggest", response_model=DescriptionSuggestionsResponse)
+async def suggest_descriptions_endpoint(
+	request: Request,
+	prefix: str = Query(..., min_length=1, max_length=200),
+	limit: int = Query(8, ge=1, le=20),
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Autocomplete a description from the current user's past expenses.
+	Requires authentication.
+	
+	Suggestions are ranked by how often a description was used, then by
+	recency, and carry the category last used with it. Archived expenses
+	are not suggested.
+	"""
+	version = current_data_version(request)
+	trie = autocomplete_index.get(current_user.id, version)
+	if trie is None:
+		trie = DescriptionTrie(await get_expense_rows_by_user(db, current_user.id, archived=False))
+		autocomplete_index.put(current_user.id, version, trie)
+	return ORJSONResponse({"suggestions": trie.complete(prefix, limit)})
+
+
+@router.get("/changes", response_model=ExpenseChangesResponse)
+async def list_expense_changes_endpoint(
+	since: Optional[str] = None,
+	current_user: User = Depends(get_current_user),
+	db: AsyncIOMotorDatabase = Depends(get_database)
+):
+	"""
+	Get expenses created, updated or deleted since a sync token.
+	Requires authentication.
+	
+	Call without ?since for the initial sync (every expense, reset=true), then
+	pass the returned next_token on each following call. Apply changes as
+	upserts by id and remove the deleted ids; a change may be repeated across
+	two consecutive syncs. reset=true means the token was too old and changes
+	holds the full list.
+	"""
+	# Taken before querying so writes racing this sync show up next time
+	now = datetime.utcnow()
+	since_at = None
+	if since:
+		try:
+			since_at = decode_sync_token(since)
+		except ValueError as e:
+			raise HTTPException(status_code=400, detail=str(e))
+	
+	try:
+		if since_at is None or token_expired(since_at, now):
+			changes = await get_expense_rows_by_user(db, current_user.id)
+			return ORJSONResponse({
+				"changes": changes,
+				"deleted": [],
+				"next_token": encode_sync_token(now),
+				"reset": True
+			})
+		
+		window_start = changes_window_start(since_at)
+		changes, deleted = await asyncio.gather(
+			get_expense_rows_changed_since(db, current_user.id, window_start),
+			get_deleted_expense_ids_since(db, current_user.id, window_start)
+		)
+		return ORJSONResponse({
+			"changes": changes,
+			"deleted": deleted,
+			"next_token": encode_sync_token(now),
+			"reset": False
+		})
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"Error retrieving expense changes: {str(e)}")
+
+
 @router.put("/{expense_id}", response_model=Expense)
 async def update_expense_endpoint(
 	expense_id: str,
@@ -72,15 +352,15 @@ async def update_expense_endpoint(
 	db: AsyncIOMotorDatabase = Depends(get_database)
 ):
 	"""
-	Update an existing expense. The description will be re-classified.
+	Update an existing expense. The description will be re-classified unless
+	a "category" is given; choosing a custom category teaches it this expense.
 	Requires authentication.
 	
 	Returns the updated expense with its predicted category.
 	"""
 	try:
-		# Re-classify the expense
-		classifier = get_classifier()
-		category, probability, _ = classifier.predict(payload.description)
+		# Re-classify the expense unless the user picked a category
+		category, probability, labeled = await _categorize(db, current_user.id, payload)
 		
 		# Set current date if not provided
 		expense_date = payload.date if payload.date else date.today().isoformat()
@@ -97,6 +377,10 @@ async def update_expense_endpoint(
 		
 		if not updated_expense:
 			raise HTTPException(status_code=404, detail="Expense not found")
+		if labeled:
+			await add_label(db, current_user.id, category, payload.description)
+		elif category == PENDING_CATEGORY:
+			await enqueue_classification(db, current_user.id, expense_id, payload.description)
 		
 		return updated_expense
 	except HTTPException:
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.metrics import render_prometheus
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+	"""
+	Expose all collected metrics in Prometheus text format.
+	"""
+	return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
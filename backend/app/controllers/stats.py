@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.models.schemas import CategoryStatsResponse, User
-from app.services.storage import get_expenses_by_user
-from app.services.stats import aggregate_by_category
+from app.services.stats import get_category_stats as load_category_stats
+from app.controllers.expenses import ISO_DATE_PATTERN
+from app.services.etag import conditional_etag, not_modified, set_etag_headers
 from app.dependencies import get_current_user
 from app.database import get_database
 
@@ -11,6 +13,10 @@ router = APIRouter(prefix="/stats", tags=["statistics"])
 
 @router.get("/category", response_model=CategoryStatsResponse)
 async def get_category_stats(
+	request: Request,
+	response: Response,
+	date_from: Optional[str] = Query(None, pattern=ISO_DATE_PATTERN),
+	date_to: Optional[str] = Query(None, pattern=ISO_DATE_PATTERN),
 	current_user: User = Depends(get_current_user),
 	db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -19,10 +25,18 @@ async def get_category_stats(
 	Requires authentication.
 	
 	Returns total amount and count for each category, sorted by total amount (descending).
+	Optionally limited to expenses dated within ?date_from=&date_to= (inclusive).
+	Supports If-None-Match with the returned ETag (304 when nothing changed).
 	"""
+	etag_view = f"stats:{date_from or ''}:{date_to or ''}" if date_from or date_to else "stats"
+	etag = conditional_etag(request, current_user.id, etag_view)
+	unchanged = not_modified(request, etag, "stats")
+	if unchanged is not None:
+		return unchanged
+	
 	try:
-		expenses = await get_expenses_by_user(db, current_user.id)
-		stats = aggregate_by_category(expenses)
+		stats = await load_category_stats(db, current_user.id, date_from, date_to)
+		set_etag_headers(response, etag)
 		return CategoryStatsResponse(stats=stats)
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"Error retrieving stats: {str(e)}")
@@ -1,4 +1,5 @@
 """MongoDB database configuration and connection management."""
+import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
@@ -24,13 +25,24 @@ def get_client() -> AsyncIOMotorClient:
     """
     Get or create MongoDB client.
     Returns singleton AsyncIOMotorClient instance.
+
+    The client is created with the command monitor from
+    app.services.mongo_monitor registered as an event listener.
     """
     global _client
     if _client is None:
+        from app.services.mongo_monitor import command_monitor
+
         _client = AsyncIOMotorClient(
             MONGO_URL,
             serverSelectionTimeoutMS=5000,  # 5 second timeout
+            event_listeners=[command_monitor],
         )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        command_monitor.bind(_client, loop)
     return _client
 
 
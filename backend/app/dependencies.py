@@ -1,4 +1,7 @@
-from fastapi import Depends, HTTPException, status
+import os
+import secrets
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.services.auth import decode_access_token
@@ -8,8 +11,12 @@ from app.database import get_database
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Shared secret for operational endpoints under /admin (disabled when unset)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 
 async def get_current_user(
+	request: Request,
 	token: str = Depends(oauth2_scheme),
 	db: AsyncIOMotorDatabase = Depends(get_database)
 ) -> User:
@@ -23,6 +30,11 @@ async def get_current_user(
 		async def protected_route(current_user: User = Depends(get_current_user)):
 			return {"user": current_user.username}
 	"""
+	# Sub-requests of POST /batch run as the user the batch authenticated
+	batch_user = getattr(request.state, "authenticated_user", None)
+	if batch_user is not None:
+		return batch_user
+	
 	# Decode token
 	token_data = decode_access_token(token)
 	if token_data is None:
@@ -41,9 +53,29 @@ async def get_current_user(
 			headers={"WWW-Authenticate": "Bearer"},
 		)
 	
+	# Read with the user so conditional GETs can answer 304 without another query
+	request.state.data_version = user_dict["data_version"]
+	
 	return User(
 		id=user_dict["id"],
 		username=user_dict["username"],
 		email=user_dict["email"]
 	)
 
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+	"""
+	Guard operational endpoints with the X-Admin-Token header.
+	
+	Admin endpoints are disabled entirely unless ADMIN_TOKEN is configured.
+	"""
+	if not ADMIN_TOKEN:
+		raise HTTPException(
+			status_code=status.HTTP_404_NOT_FOUND,
+			detail="Admin endpoints are disabled",
+		)
+	if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN,
+			detail="Invalid admin token",
+		)
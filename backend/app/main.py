@@ -1,7 +1,19 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.controllers import classify, expenses, stats, auth
-from app.services.classifier import get_classifier
+from fastapi.responses import JSONResponse
+from app.controllers import classify, expenses, stats, auth, metrics, admin, events, categories, budgets, batch
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiler import ProfilerMiddleware
+from app.services.profiler import PROFILING_ENABLED
+from app.services.readiness import startup_tracker
+from app.services.sync import SYNC_TOMBSTONE_TTL_DAYS
+from app.services.events import event_broker
+from app.services.write_batcher import expense_inserts
+from app.services.classification_queue import DEFERRED_CLASSIFICATION, classification_worker
+from app.services.classifier import get_classifier, get_keyword_matcher
+from app.services.storage_backends import storage_backend
+from app.services.archive import create_archive_indexes
 from app.database import get_client, get_database, close_database
 import os
 from dotenv import load_dotenv
@@ -19,42 +31,101 @@ app.add_middleware(
 	allow_headers=["*"],
 )
 
+# Record per-route request count and latency histograms
+app.add_middleware(MetricsMiddleware)
 
-# Initialize database and classifier at startup
-@app.on_event("startup")
-async def startup_event():
-	"""Initialize the database and ML classifier on app startup."""
-	# Initialize MongoDB connection
+# Sampling profiler is only installed when enabled, so it costs nothing otherwise
+if PROFILING_ENABLED:
+	app.add_middleware(ProfilerMiddleware)
+
+
+async def _init_database():
+	"""Ping MongoDB, then create all indexes concurrently (or open the embedded store)."""
+	if not storage_backend.uses_mongo:
+		try:
+			async with startup_tracker.phase("storage_open"):
+				await storage_backend.create_indexes(get_database())
+			print(f"✅ Using the embedded {storage_backend.name} storage backend.")
+		except Exception as e:
+			print(f"⚠️  Warning: Could not open the {storage_backend.name} storage backend: {e}")
+		return
+	
 	try:
-		client = get_client()
-		# Test connection
-		await client.admin.command('ping')
+		async with startup_tracker.phase("mongo_ping"):
+			client = get_client()
+			# Test connection
+			await client.admin.command('ping')
 		print("✅ MongoDB connection established successfully.")
 		
 		# Create indexes for better query performance
-		db = get_database()
-		await db.users.create_index("username", unique=True)
-		await db.users.create_index("email", unique=True)
-		await db.expenses.create_index("user_id")
-		await db.expenses.create_index("date")
-		await db.expenses.create_index("category")
-		print("✅ Database indexes created/verified.")
+		async with startup_tracker.phase("mongo_indexes"):
+			db = get_database()
+			await asyncio.gather(
+				storage_backend.create_indexes(db),
+				create_archive_indexes(db),
+				db.custom_categories.create_index([("user_id", 1), ("name", 1)], unique=True),
+				db.budgets.create_index([("user_id", 1), ("category", 1)], unique=True),
+				db.monthly_spend.create_index([("user_id", 1), ("month", 1)], unique=True),
+				db.classification_queue.create_index([("lease_until", 1), ("enqueued_at", 1)]),
+				# Tombstones are only needed until every client had a chance to sync
+				db.expense_tombstones.create_index(
+					"deleted_at", expireAfterSeconds=SYNC_TOMBSTONE_TTL_DAYS * 86400
+				),
+			)
+		print(f"✅ Database indexes created/verified ({storage_backend.layout.name} expense layout).")
 	except Exception as e:
 		print(f"⚠️  Warning: Could not connect to MongoDB: {e}")
 		print("   For MongoDB Atlas: Check your connection string in .env file")
 		print("   For Local MongoDB: brew services start mongodb-community (macOS)")
 		print("   Connection URL:", os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
-	
-	# Initialize classifier
+
+
+async def _init_classifier():
+	"""Train the classifier in a worker thread so it overlaps with Mongo setup."""
 	print("Initializing expense classifier...")
-	classifier = get_classifier()
-	print(f"Classifier ready! Supports {len(classifier.CATEGORIES)} categories.")
+	try:
+		async with startup_tracker.phase("classifier"):
+			classifier = await asyncio.to_thread(get_classifier)
+			await asyncio.to_thread(get_keyword_matcher)
+		print(f"Classifier ready! Supports {len(classifier.CATEGORIES)} categories.")
+	except Exception as e:
+		print(f"⚠️  Warning: Could not initialize classifier: {e}")
+
+
+async def _warm_up():
+	await asyncio.gather(_init_database(), _init_classifier())
+	if DEFERRED_CLASSIFICATION:
+		classification_worker.start(get_database())
+		print("Deferred classification worker started.")
+	report = startup_tracker.report()
+	phases = ", ".join(f"{name}={phase['seconds']}s" for name, phase in report["phases"].items())
+	print(f"Startup phases: {phases}; ready={report['ready']} after {report['time_to_ready_seconds']}s")
+
+
+# Initialize database and classifier at startup
+@app.on_event("startup")
+async def startup_event():
+	"""
+	Initialize the database and ML classifier in the background.
+	
+	Startup returns immediately so /health answers right away; /ready reports
+	success once Mongo is reachable and the model is warm.
+	"""
+	startup_tracker.begin()
+	app.state.warm_up_task = asyncio.create_task(_warm_up())
 
 
 # Close database connection on shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
 	"""Close database connections on app shutdown."""
+	warm_up_task = getattr(app.state, "warm_up_task", None)
+	if warm_up_task is not None and not warm_up_task.done():
+		warm_up_task.cancel()
+	await classification_worker.stop()
+	await expense_inserts.close()
+	await event_broker.close()
+	await storage_backend.close()
 	await close_database()
 	print("Database connections closed.")
 
@@ -64,6 +135,12 @@ app.include_router(auth.router)  # Authentication routes (register, login)
 app.include_router(classify.router)  # Public classification endpoint
 app.include_router(expenses.router)  # Protected expense routes
 app.include_router(stats.router)  # Protected stats routes
+app.include_router(categories.router)  # Protected custom category routes
+app.include_router(budgets.router)  # Protected budget routes
+app.include_router(batch.router)  # Protected multi-request endpoint
+app.include_router(events.router)  # Protected Server-Sent Events stream
+app.include_router(metrics.router)  # Prometheus metrics
+app.include_router(admin.router)  # Operational endpoints (X-Admin-Token)
 
 
 @app.get("/health")
@@ -71,3 +148,10 @@ def health() -> dict:
 	return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready() -> JSONResponse:
+	"""Readiness probe: 200 once Mongo answers and the classifier is trained, 503 before."""
+	report = startup_tracker.report()
+	return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
@@ -0,0 +1,38 @@
+"""Request count and latency instrumentation."""
+import time
+from app.services.metrics import REQUEST_COUNT, REQUEST_LATENCY
+
+
+class MetricsMiddleware:
+	"""
+	Pure ASGI middleware that records request count and latency per route.
+
+	Requests are labelled with the route template (e.g. /expenses/{expense_id})
+	rather than the raw path, so label cardinality stays bounded.
+	"""
+
+	def __init__(self, app):
+		self.app = app
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+
+		start = time.perf_counter()
+		status_code = 500
+
+		async def send_wrapper(message):
+			nonlocal status_code
+			if message["type"] == "http.response.start":
+				status_code = message["status"]
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_wrapper)
+		finally:
+			route = scope.get("route")
+			route_path = getattr(route, "path", None) or "unmatched"
+			labels = (scope["method"], route_path, str(status_code))
+			REQUEST_COUNT.inc(*labels)
+			REQUEST_LATENCY.observe(time.perf_counter() - start, *labels)
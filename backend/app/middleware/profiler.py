@@ -0,0 +1,53 @@
+"""Opt-in sampling profiler for individual requests."""
+import time
+from app.dependencies import ADMIN_TOKEN
+from app.services.profiler import PROFILE_DEBUG_HEADER, request_profiler
+
+
+class ProfilerMiddleware:
+	"""
+	Pure ASGI middleware that profiles a random fraction of requests, or any
+	request carrying the debug header with the admin token as its value.
+
+	Only installed when PROFILING_ENABLED is true.
+	"""
+
+	def __init__(self, app):
+		self.app = app
+		self.header_name = PROFILE_DEBUG_HEADER.encode("latin-1")
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+
+		header_value = None
+		for name, value in scope["headers"]:
+			if name == self.header_name:
+				header_value = value.decode("latin-1")
+				break
+
+		reason = request_profiler.should_profile(header_value, ADMIN_TOKEN)
+		if reason is None:
+			await self.app(scope, receive, send)
+			return
+
+		session = request_profiler.start(scope["method"], scope["path"], reason)
+		status_code = None
+
+		async def send_wrapper(message):
+			nonlocal status_code
+			if message["type"] == "http.response.start":
+				status_code = message["status"]
+				# Let the caller find the profile in the admin buffer
+				message.setdefault("headers", [])
+				message["headers"] = list(message["headers"]) + [
+					(b"x-profile-id", str(session.id).encode("latin-1"))
+				]
+			await send(message)
+
+		start = time.perf_counter()
+		try:
+			await self.app(scope, receive, send_wrapper)
+		finally:
+			request_profiler.finish(session, status_code, (time.perf_counter() - start) * 1000.0)
@@ -0,0 +1,80 @@
+"""
+Convert stored expenses between layouts (see app.services.expense_layouts).
+
+	python -m app.migrate_layout --to bucket
+	python -m app.migrate_layout --to document --drop-source
+
+Users are migrated one at a time: their expenses are read from the source
+layout, written to the target (replacing anything a previous, interrupted
+run left there) and counted back before the source copy is optionally
+removed. Re-running is therefore safe. Stop the API (or keep EXPENSE_LAYOUT
+on the source layout) while migrating, then restart it with
+EXPENSE_LAYOUT set to the target. Layouts only exist on STORAGE_BACKEND=mongo.
+"""
+import argparse
+import asyncio
+from dotenv import load_dotenv
+from app.database import close_database, get_database
+from app.services.expense_layouts import LAYOUTS
+from app.services.storage_backends import storage_backend
+from app.services.user_storage import bump_data_version
+
+load_dotenv()
+
+
+async def migrate(db, source_name: str, target_name: str, drop_source: bool = False) -> dict:
+	"""
+	Copy every user's expenses from one layout to another.
+
+	Args:
+		db: MongoDB database instance
+		source_name: Layout to read ("document" or "bucket")
+		target_name: Layout to write
+		drop_source: Remove each user's source copy once verified
+
+	Returns:
+		{"users", "expenses", "mismatched"} counts
+	"""
+	source, target = LAYOUTS[source_name], LAYOUTS[target_name]
+	await target.create_indexes(db)
+	summary = {"users": 0, "expenses": 0, "mismatched": 0}
+	for user_id in await source.user_ids(db):
+		docs = await source.export_user(db, user_id)
+		await target.replace_user(db, user_id, docs)
+		copied = await target.count(db, user_id)
+		if copied != len(docs):
+			print(f"⚠️  Warning: user {user_id}: {len(docs)} expenses read, {copied} written; source kept")
+			summary["mismatched"] += 1
+			continue
+		if drop_source:
+			await source.delete_user(db, user_id)
+		# Cached responses and ETags from before the move must not be reused
+		await bump_data_version(db, str(user_id))
+		summary["users"] += 1
+		summary["expenses"] += copied
+	return summary
+
+
+async def _main(args) -> None:
+	if not storage_backend.uses_mongo:
+		raise SystemExit(f"Expense layouts are MongoDB-only; STORAGE_BACKEND is {storage_backend.name}.")
+	source = "document" if args.to == "bucket" else "bucket"
+	try:
+		summary = await migrate(get_database(), source, args.to, args.drop_source)
+	finally:
+		await close_database()
+	print(
+		f"Migrated {summary['expenses']} expenses of {summary['users']} users from the {source} "
+		f"to the {args.to} layout ({summary['mismatched']} users skipped)."
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m app.migrate_layout")
+	parser.add_argument("--to", required=True, choices=sorted(LAYOUTS), help="target expense layout")
+	parser.add_argument("--drop-source", action="store_true", help="delete migrated expenses from the source layout")
+	asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
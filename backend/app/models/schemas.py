@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -16,6 +16,7 @@ class ExpenseCreate(BaseModel):
 	description: str = Field(..., min_length=1)
 	amount: float = Field(..., gt=0)
 	date: Optional[str] = None  # ISO date string (YYYY-MM-DD), optional
+	category: Optional[str] = None  # Built-in or custom category chosen by the user; skips classification
 
 
 class Expense(BaseModel):
@@ -25,12 +26,97 @@ class Expense(BaseModel):
 	date: Optional[str] = None
 	category: str
 	probability: float
+	duplicate_of: Optional[str] = None  # Set when flagged as a near-duplicate of another expense
+
+
+class ExpenseCreateResponse(Expense):
+	over_budget: bool = False  # The expense's category is over its budget for the expense's month
 
 
 class ExpensesResponse(BaseModel):
 	expenses: List[Expense]
 
 
+class ExpenseSearchResult(Expense):
+	score: float  # Text relevance, higher is better
+
+
+class ExpenseSearchResponse(BaseModel):
+	results: List[ExpenseSearchResult]
+	next_offset: Optional[int] = None  # Pass as offset for the next page; None when done
+
+
+class DescriptionSuggestion(BaseModel):
+	description: str
+	category: Optional[str] = None  # Category of the most recent expense with this description
+	count: int  # Times the description was used
+
+
+class DescriptionSuggestionsResponse(BaseModel):
+	suggestions: List[DescriptionSuggestion]
+
+
+class ExpenseBulkCreate(BaseModel):
+	expenses: List[ExpenseCreate] = Field(..., min_length=1, max_length=500)
+
+
+class BulkRejection(BaseModel):
+	index: int  # Position in the request's expenses list
+	duplicate_of: str
+
+
+class ExpenseBulkResponse(BaseModel):
+	created: List[Expense]
+	rejected: List[BulkRejection]  # Duplicates refused under DUPLICATE_POLICY=reject
+
+
+class ExpenseChangesResponse(BaseModel):
+	changes: List[Expense]  # Created or updated since the token
+	deleted: List[str]  # Ids of expenses deleted since the token
+	next_token: str
+	reset: bool = False  # True when the client must replace its local copy with changes
+
+
+class CustomCategoryCreate(BaseModel):
+	name: str = Field(..., min_length=1, max_length=50)
+
+
+class CustomCategory(BaseModel):
+	name: str
+	examples: int  # Expenses labeled with this category so far
+
+
+class CategoriesResponse(BaseModel):
+	built_in: List[str]
+	custom: List[CustomCategory]
+
+
+class BudgetSet(BaseModel):
+	limit: float = Field(..., gt=0)  # Monthly spending limit
+
+
+class Budget(BaseModel):
+	category: str
+	limit: float
+
+
+class BudgetsResponse(BaseModel):
+	budgets: List[Budget]
+
+
+class BudgetStatus(BaseModel):
+	category: str
+	limit: float
+	spent: float  # Spend in the month so far (duplicates excluded)
+	remaining: float  # Negative once over budget
+	over_budget: bool
+
+
+class BudgetStatusResponse(BaseModel):
+	month: str  # YYYY-MM
+	budgets: List[BudgetStatus]
+
+
 class CategoryStat(BaseModel):
 	category: str
 	total_amount: float
@@ -41,6 +127,29 @@ class CategoryStatsResponse(BaseModel):
 	stats: List[CategoryStat]
 
 
+class BatchSubRequest(BaseModel):
+	id: Optional[str] = None  # Echoed back to match responses to requests
+	method: Literal["GET", "POST", "PUT", "DELETE"] = "GET"
+	path: str = Field(..., pattern=r"^/")  # Route path with optional query string, e.g. /expenses?date_from=2024-01-01
+	headers: Dict[str, str] = {}  # Extra request headers, e.g. If-None-Match
+	body: Optional[Any] = None  # JSON body for POST and PUT
+
+
+class BatchRequest(BaseModel):
+	requests: List[BatchSubRequest] = Field(..., min_length=1)
+
+
+class BatchSubResponse(BaseModel):
+	id: Optional[str] = None
+	status: int
+	headers: Dict[str, str]
+	body: Optional[Any] = None  # Parsed JSON, text for other media types, null when empty
+
+
+class BatchResponse(BaseModel):
+	responses: List[BatchSubResponse]  # In request order
+
+
 # User Authentication Schemas
 class UserCreate(BaseModel):
 	username: str = Field(..., min_length=3, max_length=50)
@@ -0,0 +1,62 @@
+"""
+Rebuild the budget spend counters from the expenses (see app.services.budgets).
+
+	python -m app.reconcile_budgets
+	python -m app.reconcile_budgets --user 64b7f0c2e4b0a1a2b3c4d5e6
+
+Each user's expenses, archived ones included, are summed per month and
+category and only the counters that drifted are rewritten. An expense
+written while its user is being reconciled can be missed; re-running
+fixes that, so schedule the job e.g. nightly. Budgets need
+STORAGE_BACKEND=mongo.
+"""
+import argparse
+import asyncio
+from bson import ObjectId
+from dotenv import load_dotenv
+from app.database import close_database, get_database
+from app.services.budgets import replace_spend, spend_totals
+from app.services.storage import iter_expense_batches
+from app.services.storage_backends import storage_backend
+
+load_dotenv()
+
+
+async def reconcile_user(db, user_id: ObjectId) -> int:
+	"""
+	Recompute one user's spend counters.
+
+	Returns:
+		Number of user-months that were corrected
+	"""
+	rows = []
+	async for batch in iter_expense_batches(db, str(user_id)):
+		rows.extend(batch)
+	return await replace_spend(db, user_id, spend_totals(rows))
+
+
+async def _main(args) -> None:
+	if not storage_backend.uses_mongo:
+		raise SystemExit(f"Budgets need MongoDB; STORAGE_BACKEND is {storage_backend.name}.")
+	db = get_database()
+	try:
+		user_ids = [ObjectId(args.user)] if args.user else await db.users.distinct("_id")
+		users = repaired = 0
+		for user_id in user_ids:
+			count = await reconcile_user(db, user_id)
+			if count:
+				users += 1
+				repaired += count
+	finally:
+		await close_database()
+	print(f"Reconciled spend counters of {len(user_ids)} users: {repaired} months corrected for {users} users.")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m app.reconcile_budgets")
+	parser.add_argument("--user", help="only reconcile this user id")
+	asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
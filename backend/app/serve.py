@@ -0,0 +1,42 @@
+"""
+Multi-worker server entrypoint with a shared classifier model.
+
+	python -m app.serve --workers 8 --host 0.0.0.0 --port 8000
+
+The supervisor process trains the classifier once, publishes its weights into
+shared memory (see app.services.model_sharing) and starts uvicorn workers that
+attach read-only views instead of training their own copy. Per-worker memory
+therefore stays flat as the worker count grows.
+"""
+import argparse
+import os
+import uvicorn
+from dotenv import load_dotenv
+from app.services.classifier import ExpenseClassifier
+from app.services.model_sharing import MODEL_SHM_ENV, publish_model
+
+load_dotenv()
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m app.serve")
+	parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+	parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+	parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+	args = parser.parse_args()
+
+	print("Training classifier once in the supervisor...")
+	shm = publish_model(ExpenseClassifier())
+	print(f"Published model weights to shared memory '{shm.name}' ({shm.size} bytes).")
+
+	# Spawned workers inherit the environment and attach by name
+	os.environ[MODEL_SHM_ENV] = shm.name
+	try:
+		uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+	finally:
+		shm.close()
+		shm.unlink()
+
+
+if __name__ == "__main__":
+	main()
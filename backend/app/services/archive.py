@@ -0,0 +1,386 @@
+"""
+Cold-data archive of old expenses in compressed per-user, per-year documents.
+
+The archival job (`python -m app.archive_expenses`) moves expenses dated
+before a month-aligned horizon (ARCHIVE_AFTER_MONTHS back from today) out
+of the hot expense layout into expense_archives, one document per user and
+year:
+
+	{user_id, year, count, first_date, last_date,
+	 totals: [{"category", "total_amount", "count"}], ids, data: zlib(BSON), rev}
+
+The hot collection and its indexes then only hold recent data. The
+summary fields are small and cached per user, so stats over the whole
+history add the precomputed yearly totals without decompressing anything,
+and a date-ranged read only opens the archives whose [first_date,
+last_date] the range reaches. Reads that stay after the horizon never
+touch the archive. The uncompressed ids (indexed, never cached) tell which
+archive holds an expense, so a lookup by id opens at most one.
+
+Archived expenses remain editable: storage restores one into the hot
+layout on update and removes it from its archive on delete (promoting its
+archived duplicates). They are not
+searched (GET /expenses/search) and are not duplicate candidates.
+
+Archives live in MongoDB; with an embedded STORAGE_BACKEND nothing is
+archived and every read stays on the hot store.
+
+Archives are rewritten whole under an optimistic rev check; a failure
+between writing an archive and removing the hot copies leaves both, which
+readers de-duplicate (the hot copy wins) and the next run finishes.
+"""
+import os
+import zlib
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+import bson
+from bson import Binary, ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from .cache import user_cache
+from .expense_layouts import entry_row, in_range, newest_first
+from .metrics import Counter, track_mongo
+from .storage_backends import storage_backend
+
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "24"))
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6"))
+
+# Fields kept for archived expenses (fingerprints are recomputed if one is restored)
+_ARCHIVED_FIELDS = (
+	"_id", "description", "amount", "date", "category", "probability", "duplicate_of", "created_at", "updated_at"
+)
+
+# Optimistic retries when another writer replaced the archive first
+_ARCHIVE_WRITE_RETRIES = 5
+
+ARCHIVE_READS = Counter(
+	"archive_reads_total",
+	"Archive documents decompressed to serve a read, by reason.",
+	("reason",)
+)
+
+
+async def create_archive_indexes(db: AsyncIOMotorDatabase) -> None:
+	"""Create the expense_archives indexes (one archive per user and year; id lookups)."""
+	await db.expense_archives.create_index([("user_id", 1), ("year", 1)], unique=True)
+	await db.expense_archives.create_index([("user_id", 1), ("ids", 1)])
+
+
+def archive_cutoff(today: Optional[date] = None, months: int = ARCHIVE_AFTER_MONTHS) -> str:
+	"""First day of the month `months` before today (ISO); older expenses are archived."""
+	today = today or date.today()
+	index = today.year * 12 + today.month - 1 - months
+	return date(index // 12, index % 12 + 1, 1).isoformat()
+
+
+def _pack(docs: List[dict]) -> Binary:
+	return Binary(zlib.compress(bson.encode({"expenses": docs}), ARCHIVE_COMPRESSION_LEVEL))
+
+
+def _unpack(data: bytes) -> List[dict]:
+	return bson.decode(zlib.decompress(data))["expenses"]
+
+
+def _summarize(docs: List[dict]) -> Dict[str, Any]:
+	totals: Dict[str, Dict[str, float]] = {}
+	for doc in docs:
+		if doc.get("duplicate_of") is not None:
+			continue
+		total = totals.setdefault(doc["category"], {"amount": 0.0, "count": 0})
+		total["amount"] += doc["amount"]
+		total["count"] += 1
+	dates = [doc["date"] for doc in docs if doc.get("date")]
+	return {
+		"count": len(docs),
+		"first_date": min(dates, default=None),
+		"last_date": max(dates, default=None),
+		"totals": [
+			{"category": category, "total_amount": values["amount"], "count": values["count"]}
+			for category, values in totals.items()
+		]
+	}
+
+
+def merge_category_stats(*parts: Iterable[dict]) -> List[dict]:
+	"""Add up lists of {"category", "total_amount", "count"}, sorted by total."""
+	totals: Dict[str, Dict[str, float]] = {}
+	for part in parts:
+		for stat in part:
+			total = totals.setdefault(stat["category"], {"amount": 0.0, "count": 0})
+			total["amount"] += stat["total_amount"]
+			total["count"] += stat["count"]
+	stats = [
+		{"category": category, "total_amount": values["amount"], "count": values["count"]}
+		for category, values in totals.items()
+	]
+	return sorted(stats, key=lambda s: s["total_amount"], reverse=True)
+
+
+@track_mongo("get_archive_summaries")
+async def _query_summaries(db: AsyncIOMotorDatabase, user_id: str) -> List[dict]:
+	cursor = db.expense_archives.find(
+		{"user_id": ObjectId(user_id)},
+		{"_id": 0, "year": 1, "count": 1, "first_date": 1, "last_date": 1, "totals": 1}
+	).sort("year", -1)
+	return await cursor.to_list(length=None)
+
+
+async def get_archive_summaries(db: AsyncIOMotorDatabase, user_id: str) -> List[dict]:
+	"""
+	A user's archives without their data, newest year first (cached).
+
+	Returns:
+		List of {"year", "count", "first_date", "last_date", "totals"}
+	"""
+	if not storage_backend.uses_mongo:
+		return []
+	return await user_cache.get_or_load(user_id, "archive", lambda: _query_summaries(db, user_id))
+
+
+def _reached(summaries: List[dict], date_from: Optional[str], date_to: Optional[str]) -> List[dict]:
+	return [
+		summary for summary in summaries
+		if summary["count"]
+		and (not date_from or (summary["last_date"] or "") >= date_from)
+		and (not date_to or (summary["first_date"] or "") <= date_to)
+	]
+
+
+@track_mongo("read_archives")
+async def _read_years(db: AsyncIOMotorDatabase, user_id: str, years: List[int], reason: str) -> List[dict]:
+	"""Decompressed expense documents of some archive years."""
+	if not years:
+		return []
+	archives = await db.expense_archives.find(
+		{"user_id": ObjectId(user_id), "year": {"$in": years}}, {"data": 1}
+	).to_list(length=None)
+	ARCHIVE_READS.inc(reason, amount=len(archives))
+	return [doc for archive in archives for doc in _unpack(archive["data"])]
+
+
+async def get_archived_rows(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> List[dict]:
+	"""
+	Archived expenses of a user within a date range, newest first.
+
+	Only the archives the range reaches are read; an unbounded read is cached.
+
+	Returns:
+		List of expense dicts in the Expense shape ([] when nothing is archived in range)
+	"""
+	summaries = _reached(await get_archive_summaries(db, user_id), date_from, date_to)
+	if not summaries:
+		return []
+
+	async def load() -> List[dict]:
+		docs = await _read_years(db, user_id, [summary["year"] for summary in summaries], "rows")
+		return [
+			entry_row(doc) for doc in newest_first(docs)
+			if in_range(doc.get("date"), date_from, date_to)
+		]
+
+	if date_from or date_to:
+		return await load()
+	return await user_cache.get_or_load(user_id, "archived_expenses", load)
+
+
+async def iter_archived_years(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> AsyncIterator[List[dict]]:
+	"""
+	Stream a user's archived expenses within a date range one archive year at a time, newest first.
+
+	Only the years the range reaches are read, one decompressed year in memory at a time.
+
+	Yields:
+		Lists of expense dicts in the Expense shape, newest first within the year
+	"""
+	for summary in _reached(await get_archive_summaries(db, user_id), date_from, date_to):
+		docs = await _read_years(db, user_id, [summary["year"]], "stream")
+		yield [
+			entry_row(doc) for doc in newest_first(docs)
+			if in_range(doc.get("date"), date_from, date_to)
+		]
+
+
+async def get_archived_stats(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> List[dict]:
+	"""
+	Per-category totals of a user's archived expenses within a date range.
+
+	Archives entirely inside the range contribute their precomputed totals;
+	only archives the range cuts through are decompressed.
+	"""
+	partial, parts = [], []
+	for summary in _reached(await get_archive_summaries(db, user_id), date_from, date_to):
+		if in_range(summary["first_date"], date_from, date_to) and in_range(summary["last_date"], date_from, date_to):
+			parts.append(summary["totals"])
+		else:
+			partial.append(summary["year"])
+	docs = [
+		doc for doc in await _read_years(db, user_id, partial, "stats")
+		if in_range(doc.get("date"), date_from, date_to)
+	]
+	if docs:
+		parts.append(_summarize(docs)["totals"])
+	return merge_category_stats(*parts)
+
+
+def merge_with_archived(rows: List[dict], archived: List[dict]) -> List[dict]:
+	"""
+	Combine hot and archived rows (both newest first) into one newest-first list.
+
+	Archived expenses normally predate every hot one, so this is a plain
+	concatenation; hot copies of archived ids win.
+	"""
+	if not archived:
+		return rows
+	newest_archived = archived[0]["date"] or ""
+	overlap = {row["id"] for row in rows if (row["date"] or "") <= newest_archived}
+	if overlap:
+		archived = [row for row in archived if row["id"] not in overlap]
+	if not rows or (rows[-1]["date"] or "") >= newest_archived:
+		return rows + archived
+	return sorted(rows + archived, key=lambda row: row["date"] or "", reverse=True)
+
+
+@track_mongo("find_archived_expense")
+async def find_archived_expense(db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[Tuple[int, dict]]:
+	"""
+	Look an expense id up in a user's archives.
+
+	Returns:
+		(archive year, expense document) or None
+	"""
+	# Users without archives (the common case) are answered from the cached summaries
+	if not await get_archive_summaries(db, user_id):
+		return None
+	expense_id = ObjectId(expense_id)
+	archive = await db.expense_archives.find_one(
+		{"user_id": ObjectId(user_id), "ids": expense_id}, {"year": 1, "data": 1}
+	)
+	if archive is None:
+		return None
+	ARCHIVE_READS.inc("lookup")
+	for doc in _unpack(archive["data"]):
+		if doc["_id"] == expense_id:
+			return archive["year"], doc
+	return None
+
+
+def _promote_duplicates(docs: Iterable[dict], original: ObjectId) -> List[dict]:
+	"""Make the oldest duplicate of a deleted original an original and point the others at it (in place)."""
+	duplicates = sorted(
+		(doc for doc in docs if doc.get("duplicate_of") == original),
+		key=lambda doc: (doc.get("created_at") or datetime.min, doc["_id"])
+	)
+	for position, doc in enumerate(duplicates):
+		if position:
+			doc["duplicate_of"] = duplicates[0]["_id"]
+		else:
+			del doc["duplicate_of"]
+	return duplicates
+
+
+@track_mongo("write_archive")
+async def update_archive(
+	db: AsyncIOMotorDatabase,
+	user_id: ObjectId,
+	year: int,
+	add: Iterable[dict] = (),
+	remove: Set[ObjectId] = frozenset(),
+	promote_duplicates_of: Optional[ObjectId] = None
+) -> List[dict]:
+	"""
+	Add (or replace by _id) and remove expenses in one user-year archive.
+
+	Args:
+		db: MongoDB database instance
+		user_id: Owner of the archive
+		year: Archive year
+		add: Expense documents to store
+		remove: Expense ids to drop
+		promote_duplicates_of: A deleted original whose archived duplicates
+			are handed over to the oldest of them (as storage does for hot ones)
+
+	Returns:
+		Expense documents whose duplicate_of changed, the promoted one first
+	"""
+	add = [{field: doc[field] for field in _ARCHIVED_FIELDS if field in doc} for doc in add]
+	for _ in range(_ARCHIVE_WRITE_RETRIES):
+		current = await db.expense_archives.find_one({"user_id": user_id, "year": year})
+		docs = {doc["_id"]: doc for doc in _unpack(current["data"])} if current else {}
+		for expense_id in remove:
+			docs.pop(expense_id, None)
+		for doc in add:
+			docs[doc["_id"]] = doc
+		changed = _promote_duplicates(docs.values(), promote_duplicates_of) if promote_duplicates_of else []
+
+		if current is None:
+			if not docs:
+				return changed
+			try:
+				await db.expense_archives.insert_one({
+					"user_id": user_id, "year": year, **_summarize(list(docs.values())), "ids": list(docs),
+					"data": _pack(list(docs.values())), "rev": 0, "updated_at": datetime.utcnow()
+				})
+				return changed
+			except DuplicateKeyError:
+				continue
+
+		guard = {"_id": current["_id"], "rev": current["rev"]}
+		if not docs:
+			result = await db.expense_archives.delete_one(guard)
+			if result.deleted_count:
+				return changed
+			continue
+		result = await db.expense_archives.replace_one(guard, {
+			"user_id": user_id, "year": year, **_summarize(list(docs.values())), "ids": list(docs),
+			"data": _pack(list(docs.values())), "rev": current["rev"] + 1, "updated_at": datetime.utcnow()
+		})
+		if result.matched_count:
+			return changed
+	raise RuntimeError(f"Archive {user_id}/{year} kept changing during update")
+
+
+async def archive_user_expenses(db: AsyncIOMotorDatabase, layout, user_id: ObjectId, cutoff: str) -> int:
+	"""
+	Move a user's expenses dated before cutoff from the hot layout to their archives.
+
+	Args:
+		db: MongoDB database instance
+		layout: Hot expense layout (app.services.storage_backends.storage_backend)
+		user_id: User to archive
+		cutoff: ISO date (first day of a month); older expenses are moved
+
+	Returns:
+		Number of expenses archived
+	"""
+	archived = 0
+	for handle, docs in await layout.export_before(db, user_id, cutoff):
+		by_year: Dict[int, List[dict]] = {}
+		for doc in docs:
+			by_year.setdefault(int(doc["date"][:4]), []).append(doc)
+		# Archive first, so an interruption leaves copies rather than losing expenses
+		for year, year_docs in by_year.items():
+			await update_archive(db, user_id, year, add=year_docs)
+		kept = set(await layout.remove_exported(db, user_id, handle, docs))
+		if kept:
+			# Changed since the export: those stay hot, take them back out
+			for year, year_docs in by_year.items():
+				ids = {doc["_id"] for doc in year_docs} & kept
+				if ids:
+					await update_archive(db, user_id, year, remove=ids)
+		archived += len(docs) - len(kept)
+	return archived
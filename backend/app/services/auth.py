@@ -5,6 +5,7 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.models.schemas import TokenData
+from app.services.metrics import BCRYPT_LATENCY, timed
 
 # Secret key for JWT (in production, use environment variable)
 SECRET_KEY = os.getenv("SECRET_KEY", "secret-key")
@@ -22,7 +23,8 @@ def get_password_hash(password: str) -> str:
     Passlib safely handles the 72-byte bcrypt limit.
     """
     password = password.strip()
-    return pwd_context.hash(password)
+    with timed(BCRYPT_LATENCY, "hash"):
+        return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -30,7 +32,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Verify a password against its bcrypt hash.
     """
     plain_password = plain_password.strip()
-    return pwd_context.verify(plain_password, hashed_password)
+    with timed(BCRYPT_LATENCY, "verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
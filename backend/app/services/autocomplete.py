@@ -0,0 +1,166 @@
+"""
+Per-user prefix autocomplete over past expense descriptions.
+
+Each user's distinct descriptions (normalized to lowercase with collapsed
+whitespace) go into a trie whose nodes keep their top
+AUTOCOMPLETE_TOP_K completions, ranked by how often the description was
+used and then by recency. A lookup walks the prefix and returns the
+precomputed list, so it costs O(len(prefix)) regardless of history size.
+
+Tries are built lazily from the user's (cached) hot expense rows, so
+archived years are never decompressed for them, and kept in a bounded LRU
+tagged with the user's data version. Creating or updating an expense
+inserts its description into the cached trie in place and moves the tag to
+the new version (see AutocompleteIndex.record); any other write, or a trie
+not exactly one version behind (e.g. on another worker), makes the next
+lookup rebuild from fresh data. A description replaced by an update keeps
+its count until that rebuild.
+"""
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+AUTOCOMPLETE_TOP_K = int(os.getenv("AUTOCOMPLETE_TOP_K", "10"))
+AUTOCOMPLETE_MAX_USERS = int(os.getenv("AUTOCOMPLETE_MAX_USERS", "1000"))
+
+
+def normalize(text: str) -> str:
+	return " ".join(text.lower().split())
+
+
+class _Node:
+	__slots__ = ("children", "top")
+
+	def __init__(self):
+		self.children: Dict[str, "_Node"] = {}
+		# Normalized descriptions of the best completions, best first
+		self.top: List[str] = []
+
+
+class DescriptionTrie:
+	"""Trie of descriptions with precomputed top-k completions per node."""
+
+	def __init__(self, rows: List[dict], top_k: int = AUTOCOMPLETE_TOP_K):
+		self.top_k = top_k
+		self._suggestions: Dict[str, dict] = {}
+		# Higher is more recent; rows are newest first and later inserts are newer still
+		self._recency: Dict[str, int] = {}
+		self._next_recency = 1
+		# The first occurrence keeps the display text and category
+		for position, row in enumerate(rows):
+			key = normalize(row.get("description") or "")
+			if not key:
+				continue
+			suggestion = self._suggestions.get(key)
+			if suggestion is None:
+				self._suggestions[key] = {"description": row["description"], "category": row.get("category"), "count": 1}
+				self._recency[key] = -position
+			else:
+				suggestion["count"] += 1
+
+		self.root = _Node()
+		# Inserting in rank order means each node's first top_k entries are its best completions
+		for key in sorted(self._suggestions, key=self._rank):
+			node = self.root
+			if len(node.top) < top_k:
+				node.top.append(key)
+			for char in key:
+				node = node.children.setdefault(char, _Node())
+				if len(node.top) < top_k:
+					node.top.append(key)
+
+	def _rank(self, key: str) -> Tuple[int, int]:
+		return -self._suggestions[key]["count"], -self._recency[key]
+
+	def insert(self, description: str, category: Optional[str], uses: int = 1) -> None:
+		"""
+		Record the newest use of a description in place.
+
+		Its count and recency only grow, so it can only move up: each node on
+		its path re-places it among that node's top_k, and no other node changes.
+
+		Args:
+			description: Description as entered
+			category: Category the expense was stored with
+			uses: Added to the description's count (0 only refreshes it)
+		"""
+		key = normalize(description)
+		if not key:
+			return
+		suggestion = self._suggestions.setdefault(key, {"description": description, "category": category, "count": 0})
+		suggestion.update(description=description, category=category, count=max(1, suggestion["count"] + uses))
+		self._recency[key] = self._next_recency
+		self._next_recency += 1
+
+		rank = self._rank(key)
+		node = self.root
+		self._place(node, key, rank)
+		for char in key:
+			node = node.children.setdefault(char, _Node())
+			self._place(node, key, rank)
+
+	def _place(self, node: _Node, key: str, rank: Tuple[int, int]) -> None:
+		if key in node.top:
+			node.top.remove(key)
+		position = next((index for index, other in enumerate(node.top) if self._rank(other) > rank), len(node.top))
+		if position < self.top_k:
+			node.top.insert(position, key)
+			del node.top[self.top_k:]
+
+	def complete(self, prefix: str, limit: int = AUTOCOMPLETE_TOP_K) -> List[dict]:
+		node = self.root
+		for char in normalize(prefix):
+			node = node.children.get(char)
+			if node is None:
+				return []
+		return [self._suggestions[key] for key in node.top[:limit]]
+
+
+class AutocompleteIndex:
+	"""Bounded LRU of per-user tries, each tagged with the data version it reflects."""
+
+	def __init__(self, max_users: int = AUTOCOMPLETE_MAX_USERS):
+		self.max_users = max_users
+		self._tries: "OrderedDict[str, Tuple[Optional[int], DescriptionTrie]]" = OrderedDict()
+
+	def get(self, user_id: str, version: Optional[int]) -> Optional[DescriptionTrie]:
+		entry = self._tries.get(user_id)
+		if entry is None or version is None or entry[0] != version:
+			return None
+		self._tries.move_to_end(user_id)
+		return entry[1]
+
+	def put(self, user_id: str, version: Optional[int], trie: DescriptionTrie) -> None:
+		self._tries[user_id] = (version, trie)
+		self._tries.move_to_end(user_id)
+		while len(self._tries) > self.max_users:
+			self._tries.popitem(last=False)
+
+	def record(self, user_id: str, version: Optional[int], rows: List[dict], uses: int = 1) -> None:
+		"""
+		Apply a create or update that moved the user to `version` to their cached trie.
+
+		The trie is updated in place only if it reflects the version just
+		before the write; otherwise it cannot tell whether the rows are
+		already in it and is dropped, to be rebuilt on the next lookup.
+
+		Args:
+			user_id: Owner of the written expenses
+			version: The user's data version after the write
+			rows: Created or updated expense rows
+			uses: Passed to DescriptionTrie.insert for each row
+		"""
+		entry = self._tries.get(user_id)
+		if entry is None:
+			return
+		cached_version, trie = entry
+		if version is None or cached_version is None or cached_version != version - 1:
+			del self._tries[user_id]
+			return
+		for row in rows:
+			trie.insert(row.get("description") or "", row.get("category"), uses)
+		self._tries[user_id] = (version, trie)
+
+
+# Process-wide index used by GET /expenses/suggest
+autocomplete_index = AutocompleteIndex()
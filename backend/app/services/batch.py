@@ -0,0 +1,195 @@
+"""
+In-process execution of POST /batch sub-requests.
+
+Each sub-request is dispatched through the application itself (middleware,
+routing, validation and the existing endpoints) as an ASGI call, so no
+route needs batch-specific code and a batched call answers exactly like
+the standalone one. The batch is authenticated once: sub-requests inherit
+its Authorization header and carry the verified user in their request
+state, which get_current_user returns without decoding the token or
+looking the user up again.
+
+Sub-requests run in order, except that consecutive GETs are started
+together with asyncio.gather. A write (POST, PUT, DELETE) waits for the
+reads before it and finishes before anything after it starts, and the
+user's data version is re-read after it, so later sub-requests see the
+write and get current ETags.
+
+Response bodies are spliced into the batch response as the raw JSON the
+endpoints produced instead of being parsed and encoded again.
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import orjson
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from ..models.schemas import BatchSubRequest, User
+from .metrics import Counter
+from .user_storage import get_user_by_username
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+# Nested batches and endless event streams cannot run inside a batch
+_EXCLUDED_PATHS = ("/batch", "/events")
+
+# Batch request headers every sub-request inherits
+_INHERITED_HEADERS = (b"authorization", b"user-agent")
+
+# Headers a sub-request may not set itself
+_RESERVED_HEADERS = ("authorization", "content-length", "content-type", "host")
+
+BATCH_SUBREQUESTS = Counter(
+	"batch_subrequests_total",
+	"Sub-requests run through POST /batch: concurrent (grouped reads), sequential (writes) or rejected.",
+	("mode",)
+)
+
+_Result = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+
+def _excluded(path: str) -> bool:
+	path = path.rstrip("/") or "/"
+	return any(path == excluded or path.startswith(excluded + "/") for excluded in _EXCLUDED_PATHS)
+
+
+def _error(status: int, detail: str) -> _Result:
+	return status, [(b"content-type", b"application/json")], orjson.dumps({"detail": detail})
+
+
+async def _dispatch(
+	app,
+	parent_scope: Dict[str, Any],
+	state: Dict[str, Any],
+	sub: BatchSubRequest,
+	mode: str
+) -> _Result:
+	"""Run one sub-request through the ASGI app and collect its response."""
+	url = urlsplit(sub.path)
+	if _excluded(url.path):
+		BATCH_SUBREQUESTS.inc("rejected")
+		return _error(400, f"{url.path} cannot be called inside a batch")
+	BATCH_SUBREQUESTS.inc(mode)
+
+	headers = [(name, value) for name, value in parent_scope["headers"] if name in _INHERITED_HEADERS]
+	headers.extend(
+		(name.lower().encode("latin-1"), value.encode("latin-1"))
+		for name, value in sub.headers.items() if name.lower() not in _RESERVED_HEADERS
+	)
+	body = b""
+	if sub.body is not None:
+		body = orjson.dumps(sub.body)
+		headers.append((b"content-type", b"application/json"))
+	headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+	scope = {
+		"type": "http",
+		"asgi": parent_scope.get("asgi", {"version": "3.0"}),
+		"http_version": parent_scope.get("http_version", "1.1"),
+		"method": sub.method,
+		"scheme": parent_scope.get("scheme", "http"),
+		"path": url.path,
+		"raw_path": url.path.encode("utf-8"),
+		"query_string": url.query.encode("latin-1"),
+		"root_path": parent_scope.get("root_path", ""),
+		"headers": headers,
+		"client": parent_scope.get("client"),
+		"server": parent_scope.get("server"),
+		"state": state,
+	}
+
+	finished = asyncio.Event()
+	pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+	async def receive() -> Dict[str, Any]:
+		if pending:
+			return pending.pop()
+		# Streaming responses watch for a disconnect; only report one when done
+		await finished.wait()
+		return {"type": "http.disconnect"}
+
+	status: Optional[int] = None
+	response_headers: List[Tuple[bytes, bytes]] = []
+	chunks: List[bytes] = []
+
+	async def send(message: Dict[str, Any]) -> None:
+		nonlocal status, response_headers
+		if message["type"] == "http.response.start":
+			status = message["status"]
+			response_headers = list(message.get("headers", []))
+		elif message["type"] == "http.response.body":
+			chunks.append(message.get("body", b""))
+
+	try:
+		await app(scope, receive, send)
+	except Exception:
+		# The error middleware already sent a 500 if it got the chance
+		if status is None:
+			return _error(500, "Internal Server Error")
+	finally:
+		finished.set()
+	return status or 500, response_headers, b"".join(chunks)
+
+
+def _encode(sub: BatchSubRequest, result: _Result) -> bytes:
+	"""One BatchSubResponse as JSON, embedding a JSON body without re-encoding it."""
+	status, headers, body = result
+	header_map = {
+		name.decode("latin-1"): value.decode("latin-1") for name, value in headers if name != b"content-length"
+	}
+	if not body:
+		encoded_body = b"null"
+	elif header_map.get("content-type", "").startswith("application/json"):
+		encoded_body = body
+	else:
+		encoded_body = orjson.dumps(body.decode("utf-8", "replace"))
+	return orjson.dumps({"id": sub.id, "status": status, "headers": header_map})[:-1] + b',"body":' + encoded_body + b"}"
+
+
+async def run_batch(
+	app,
+	parent_scope: Dict[str, Any],
+	db: AsyncIOMotorDatabase,
+	user: User,
+	data_version: Optional[int],
+	requests: List[BatchSubRequest]
+) -> bytes:
+	"""
+	Run batch sub-requests as the already authenticated user.
+
+	Args:
+		app: ASGI application to dispatch to (request.app)
+		parent_scope: Scope of the POST /batch request
+		db: MongoDB database instance
+		user: User authenticated for the batch
+		data_version: The user's data version read during authentication
+		requests: Sub-requests in order
+
+	Returns:
+		Encoded BatchResponse JSON ({"responses": [...]} in request order)
+	"""
+	results: List[Optional[_Result]] = [None] * len(requests)
+
+	def state() -> Dict[str, Any]:
+		return {**parent_scope.get("state", {}), "authenticated_user": user, "data_version": data_version}
+
+	index = 0
+	while index < len(requests):
+		if requests[index].method == "GET":
+			start = index
+			while index < len(requests) and requests[index].method == "GET":
+				index += 1
+			results[start:index] = await asyncio.gather(*(
+				_dispatch(app, parent_scope, state(), sub, "concurrent") for sub in requests[start:index]
+			))
+			continue
+
+		results[index] = await _dispatch(app, parent_scope, state(), requests[index], "sequential")
+		index += 1
+		if index < len(requests):
+			# Later ETags must reflect the write
+			user_dict = await get_user_by_username(db, user.username)
+			if user_dict is not None:
+				data_version = user_dict["data_version"]
+
+	return b'{"responses":[' + b",".join(_encode(sub, result) for sub, result in zip(requests, results)) + b"]}"
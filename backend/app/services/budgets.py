@@ -0,0 +1,248 @@
+"""
+Monthly per-category budgets checked against running spend counters.
+
+A budget is a monthly limit for one of a user's categories (budgets
+collection, one document per user and category). Spend is never summed
+from the expenses when a budget is checked: every expense write adjusts a
+counter document per user and month,
+
+	{user_id, month: "YYYY-MM", totals: {category: amount}, updated_at}
+
+with a single upserted $inc (storage.py calls record_spend with the rows
+an operation removed and added), so checking or listing budgets is a
+couple of point reads regardless of the size of the history. Duplicates
+(duplicate_of set) are not counted, matching the category stats.
+
+The old version of an updated or deleted expense is read just before the
+write, so racing writes to the same expense, or a crash between the
+write and its counter update, can leave a counter off. Counters are
+rebuilt from the expenses with `python -m app.reconcile_budgets`.
+
+Budgets live in MongoDB; with an embedded STORAGE_BACKEND none can be set
+and no spend is counted.
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from .expense_layouts import category_from_key, total_key
+from .metrics import track_mongo
+from .storage_backends import storage_backend
+
+# Amounts closer than this count as equal when comparing counters with expenses
+_SPEND_TOLERANCE = 0.005
+
+
+def current_month() -> str:
+	return date.today().isoformat()[:7]
+
+
+def spend_totals(rows: Iterable[dict]) -> Dict[str, Dict[str, float]]:
+	"""
+	Spend per month and category of expense rows (duplicates excluded).
+
+	Returns:
+		{"YYYY-MM": {category: amount}}
+	"""
+	totals: Dict[str, Dict[str, float]] = {}
+	for row in rows:
+		if row.get("duplicate_of") is not None or not row.get("date"):
+			continue
+		month = totals.setdefault(row["date"][:7], {})
+		month[row["category"]] = month.get(row["category"], 0.0) + row["amount"]
+	return totals
+
+
+@track_mongo("record_spend")
+async def record_spend(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	removed: Iterable[dict] = (),
+	added: Iterable[dict] = ()
+) -> None:
+	"""
+	Move the spend counters by the expenses a write removed and added.
+
+	An update passes the old row as removed and the new one as added. A
+	failure is reported but not raised: the expense write already happened
+	and reconciliation repairs the counter.
+
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		removed: Expense rows as they were before the write
+		added: Expense rows as they are after the write
+	"""
+	if not storage_backend.uses_mongo:
+		return
+	deltas: Dict[str, Dict[str, float]] = {}
+	for sign, rows in ((-1, removed), (1, added)):
+		for month, categories in spend_totals(rows).items():
+			month_deltas = deltas.setdefault(month, {})
+			for category, amount in categories.items():
+				month_deltas[category] = month_deltas.get(category, 0.0) + sign * amount
+
+	operations = []
+	for month, categories in deltas.items():
+		inc = {f"totals.{total_key(category)}": amount for category, amount in categories.items() if amount}
+		if inc:
+			operations.append(UpdateOne(
+				{"user_id": ObjectId(user_id), "month": month},
+				{"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+				upsert=True
+			))
+	if not operations:
+		return
+	try:
+		await db.monthly_spend.bulk_write(operations, ordered=False)
+	except Exception as e:
+		print(f"⚠️  Warning: Could not update spend counters for user {user_id}: {e}")
+
+
+@track_mongo("get_monthly_spend")
+async def get_monthly_spend(db: AsyncIOMotorDatabase, user_id: str, month: str) -> Dict[str, float]:
+	"""Counted spend per category of one user-month."""
+	if not storage_backend.uses_mongo:
+		return {}
+	doc = await db.monthly_spend.find_one(
+		{"user_id": ObjectId(user_id), "month": month}, {"_id": 0, "totals": 1}
+	)
+	totals = (doc or {}).get("totals") or {}
+	return {category_from_key(key): amount for key, amount in totals.items()}
+
+
+@track_mongo("get_budgets")
+async def get_budgets(db: AsyncIOMotorDatabase, user_id: str) -> Dict[str, float]:
+	"""A user's monthly limits by category."""
+	if not storage_backend.uses_mongo:
+		return {}
+	docs = await db.budgets.find(
+		{"user_id": ObjectId(user_id)}, {"_id": 0, "category": 1, "limit": 1}
+	).to_list(length=None)
+	return {doc["category"]: doc["limit"] for doc in docs}
+
+
+@track_mongo("set_budget")
+async def set_budget(db: AsyncIOMotorDatabase, user_id: str, category: str, limit: float) -> None:
+	"""
+	Create or replace a user's monthly limit for a category.
+
+	Raises:
+		ValueError: If budgets are not available with the storage backend
+	"""
+	if not storage_backend.uses_mongo:
+		raise ValueError(f"Budgets are not available with the {storage_backend.name} storage backend")
+	await db.budgets.update_one(
+		{"user_id": ObjectId(user_id), "category": category},
+		{"$set": {"limit": limit, "updated_at": datetime.utcnow()}},
+		upsert=True
+	)
+
+
+@track_mongo("delete_budget")
+async def delete_budget(db: AsyncIOMotorDatabase, user_id: str, category: str) -> bool:
+	"""
+	Remove a user's budget for a category.
+
+	Returns:
+		True if the budget existed and was deleted, False otherwise
+	"""
+	if not storage_backend.uses_mongo:
+		return False
+	result = await db.budgets.delete_one({"user_id": ObjectId(user_id), "category": category})
+	return result.deleted_count > 0
+
+
+def _status(category: str, limit: float, spent: float) -> dict:
+	return {
+		"category": category,
+		"limit": limit,
+		"spent": spent,
+		"remaining": limit - spent,
+		"over_budget": spent > limit + _SPEND_TOLERANCE
+	}
+
+
+async def get_budget_status(db: AsyncIOMotorDatabase, user_id: str, month: Optional[str] = None) -> List[dict]:
+	"""
+	Spend against every budget of a user in one month.
+
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		month: "YYYY-MM", defaults to the current month
+
+	Returns:
+		List of {"category", "limit", "spent", "remaining", "over_budget"}, sorted by category
+	"""
+	budgets = await get_budgets(db, user_id)
+	if not budgets:
+		return []
+	spend = await get_monthly_spend(db, user_id, month or current_month())
+	return [_status(category, budgets[category], spend.get(category, 0.0)) for category in sorted(budgets)]
+
+
+@track_mongo("check_budget")
+async def check_budget(db: AsyncIOMotorDatabase, user_id: str, category: str, expense_date: str) -> Optional[dict]:
+	"""
+	Status of the budget an expense falls under, from two point reads.
+
+	Returns:
+		{"category", "limit", "spent", "remaining", "over_budget"} for the
+		expense's category and month, or None when it has no budget
+	"""
+	if not storage_backend.uses_mongo:
+		return None
+	budget = await db.budgets.find_one(
+		{"user_id": ObjectId(user_id), "category": category}, {"_id": 0, "limit": 1}
+	)
+	if budget is None:
+		return None
+	spend = await get_monthly_spend(db, user_id, expense_date[:7])
+	return _status(category, budget["limit"], spend.get(category, 0.0))
+
+
+@track_mongo("replace_spend")
+async def replace_spend(db: AsyncIOMotorDatabase, user_id: ObjectId, totals: Dict[str, Dict[str, float]]) -> int:
+	"""
+	Overwrite a user's spend counters with recomputed totals.
+
+	Only counters that drifted are written; months without spend are removed.
+
+	Args:
+		db: MongoDB database instance
+		user_id: User to repair
+		totals: Output of spend_totals over all of the user's expenses
+
+	Returns:
+		Number of user-months whose counters were corrected
+	"""
+	stored = {
+		doc["month"]: {category_from_key(key): amount for key, amount in (doc.get("totals") or {}).items()}
+		for doc in await db.monthly_spend.find({"user_id": user_id}, {"_id": 0, "month": 1, "totals": 1}).to_list(length=None)
+	}
+	repaired = 0
+	for month in set(stored) | set(totals):
+		expected, current = totals.get(month, {}), stored.get(month, {})
+		drifted = any(
+			abs(expected.get(category, 0.0) - current.get(category, 0.0)) > _SPEND_TOLERANCE
+			for category in set(expected) | set(current)
+		)
+		if not drifted:
+			continue
+		repaired += 1
+		if expected:
+			await db.monthly_spend.replace_one(
+				{"user_id": user_id, "month": month},
+				{
+					"user_id": user_id,
+					"month": month,
+					"totals": {total_key(category): amount for category, amount in expected.items()},
+					"updated_at": datetime.utcnow()
+				},
+				upsert=True
+			)
+		else:
+			await db.monthly_spend.delete_one({"user_id": user_id, "month": month})
+	return repaired
@@ -0,0 +1,156 @@
+"""
+Per-user read cache for expense lists and category stats.
+
+Values are cached per (user, view), e.g. ("<user_id>", "expenses"). Storage
+write paths call invalidate_user() so the next read goes back to MongoDB.
+
+The backend is pluggable: anything implementing CacheBackend can be selected
+with CACHE_BACKEND=module:Class. The default is an in-process LRU; a Redis
+(or Redis-compatible) backend only needs get/set/delete with a TTL and must
+store values that round-trip through JSON (lists of plain dicts).
+
+With several workers and the in-process LRU, a write only invalidates the
+worker that handled it; other workers may serve entries up to
+CACHE_TTL_SECONDS old. Use a shared backend when that matters.
+"""
+import importlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Protocol, Tuple
+from app.services.metrics import Counter, Gauge
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Views cached per user; invalidate_user() drops all of them
+CACHED_VIEWS = ("expenses", "stats", "categories", "archive", "archived_expenses")
+
+CACHE_REQUESTS = Counter(
+	"cache_requests_total",
+	"Per-user read cache lookups by view and result (hit/miss).",
+	("view", "result")
+)
+CACHE_INVALIDATIONS = Counter(
+	"cache_invalidations_total",
+	"Per-user cache invalidations triggered by expense writes."
+)
+CACHE_ENTRIES = Gauge(
+	"cache_entries",
+	"Entries currently held by the in-process LRU cache."
+)
+
+
+class CacheBackend(Protocol):
+	"""Minimal key/value interface a cache backend must implement."""
+
+	async def get(self, key: str) -> Optional[Any]:
+		...
+
+	async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+		...
+
+	async def delete(self, *keys: str) -> None:
+		...
+
+
+class LRUCacheBackend:
+	"""In-process LRU with per-entry TTL. Operations never await, so no locking is needed."""
+
+	def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, default_ttl: Optional[float] = CACHE_TTL_SECONDS):
+		self.max_entries = max_entries
+		self.default_ttl = default_ttl
+		self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+	async def get(self, key: str) -> Optional[Any]:
+		entry = self._entries.get(key)
+		if entry is None:
+			return None
+		expires_at, value = entry
+		if expires_at and expires_at < time.monotonic():
+			del self._entries[key]
+			return None
+		self._entries.move_to_end(key)
+		return value
+
+	async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+		ttl = self.default_ttl if ttl is None else ttl
+		expires_at = time.monotonic() + ttl if ttl else 0.0
+		self._entries[key] = (expires_at, value)
+		self._entries.move_to_end(key)
+		while len(self._entries) > self.max_entries:
+			self._entries.popitem(last=False)
+		CACHE_ENTRIES.set(value=len(self._entries))
+
+	async def delete(self, *keys: str) -> None:
+		for key in keys:
+			self._entries.pop(key, None)
+		CACHE_ENTRIES.set(value=len(self._entries))
+
+
+class NullCacheBackend:
+	"""Backend that never stores anything (CACHE_BACKEND=none)."""
+
+	async def get(self, key: str) -> Optional[Any]:
+		return None
+
+	async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+		return None
+
+	async def delete(self, *keys: str) -> None:
+		return None
+
+
+class UserCache:
+	"""
+	Read-through cache keyed by user and view.
+
+	A per-user generation counter guards against a read that started before a
+	write storing stale data after the write invalidated the user.
+	"""
+
+	def __init__(self, backend: CacheBackend, ttl: Optional[float] = CACHE_TTL_SECONDS):
+		self.backend = backend
+		self.ttl = ttl
+		self._generations: Dict[str, int] = {}
+
+	@staticmethod
+	def key(user_id: str, view: str) -> str:
+		return f"user:{user_id}:{view}"
+
+	async def get_or_load(self, user_id: str, view: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+		"""Return the cached view for a user, loading and caching it on a miss."""
+		key = self.key(user_id, view)
+		value = await self.backend.get(key)
+		if value is not None:
+			CACHE_REQUESTS.inc(view, "hit")
+			return value
+		CACHE_REQUESTS.inc(view, "miss")
+
+		generation = self._generations.get(user_id, 0)
+		value = await loader()
+		if self._generations.get(user_id, 0) == generation:
+			await self.backend.set(key, value, self.ttl)
+		return value
+
+	async def invalidate_user(self, user_id: str) -> None:
+		"""Drop every cached view for a user after one of their expenses changed."""
+		self._generations[user_id] = self._generations.get(user_id, 0) + 1
+		await self.backend.delete(*(self.key(user_id, view) for view in CACHED_VIEWS))
+		CACHE_INVALIDATIONS.inc()
+
+
+def _build_backend(name: str) -> CacheBackend:
+	if name == "lru":
+		return LRUCacheBackend()
+	if name == "none":
+		return NullCacheBackend()
+	module_name, _, class_name = name.partition(":")
+	if not class_name:
+		raise ValueError(f"Unknown CACHE_BACKEND {name!r}; use lru, none or module:Class")
+	return getattr(importlib.import_module(module_name), class_name)()
+
+
+# Process-wide cache used by app.services.storage and app.services.stats
+user_cache = UserCache(_build_backend(CACHE_BACKEND))
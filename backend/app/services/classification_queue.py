@@ -0,0 +1,235 @@
+"""
+Deferred expense classification through a MongoDB-backed queue.
+
+With DEFERRED_CLASSIFICATION enabled, expense writes without a user-chosen
+category are stored immediately with category "pending" and a queue entry
+in classification_queue (keyed by the expense id). ClassificationWorker
+leases batches of entries, classifies them in one vectorized call and
+stores the results, so write latency does not depend on model cost.
+
+Entries are leased, not removed, while being classified: if a worker dies
+its lease expires after CLASSIFY_QUEUE_LEASE_SECONDS and another worker
+picks the entries up. On start the worker also re-enqueues pending
+expenses that lost their queue entry (e.g. a crash between the two
+inserts), so the queue survives restarts. Entries that failed
+CLASSIFY_QUEUE_MAX_ATTEMPTS times stay in the collection for inspection.
+The queue needs MongoDB, so deferred classification is switched off with
+an embedded STORAGE_BACKEND.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from app.services.classifier import classify_batch
+from app.services.custom_categories import classify_for_user, get_custom_centroids
+from app.services.metrics import Counter, Histogram, track_mongo
+from app.services.storage import apply_classifications, get_pending_expenses
+from app.services.storage_backends import storage_backend
+
+DEFERRED_CLASSIFICATION = os.getenv("DEFERRED_CLASSIFICATION", "false").lower() in ("1", "true", "yes")
+if DEFERRED_CLASSIFICATION and not storage_backend.uses_mongo:
+	print(f"⚠️  Warning: DEFERRED_CLASSIFICATION needs MongoDB; disabled with the {storage_backend.name} storage backend")
+	DEFERRED_CLASSIFICATION = False
+CLASSIFY_QUEUE_BATCH_SIZE = int(os.getenv("CLASSIFY_QUEUE_BATCH_SIZE", "64"))
+CLASSIFY_QUEUE_POLL_MS = float(os.getenv("CLASSIFY_QUEUE_POLL_MS", "200"))
+CLASSIFY_QUEUE_LEASE_SECONDS = float(os.getenv("CLASSIFY_QUEUE_LEASE_SECONDS", "60"))
+CLASSIFY_QUEUE_MAX_ATTEMPTS = int(os.getenv("CLASSIFY_QUEUE_MAX_ATTEMPTS", "5"))
+
+CLASSIFY_QUEUE_PROCESSED = Counter(
+	"classification_queue_processed_total",
+	"Queued expenses classified by the deferred worker, by result.",
+	("result",)
+)
+CLASSIFY_QUEUE_LAG = Histogram(
+	"classification_queue_lag_seconds",
+	"Time from enqueueing a pending expense to storing its category.",
+	buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+@track_mongo("enqueue_classification")
+async def enqueue_classification(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	expense_id: str,
+	description: str
+) -> None:
+	"""
+	Queue a pending expense for classification (replacing any older entry).
+
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		expense_id: ID of the pending expense (MongoDB ObjectId as string)
+		description: Description to classify
+	"""
+	await db.classification_queue.replace_one(
+		{"_id": ObjectId(expense_id)},
+		{
+			"user_id": ObjectId(user_id),
+			"description": description,
+			"enqueued_at": datetime.utcnow(),
+			"lease": None,
+			"lease_until": None,
+			"attempts": 0
+		},
+		upsert=True
+	)
+	classification_worker.notify()
+
+
+class ClassificationWorker:
+	"""Background task that drains classification_queue in batches."""
+
+	def __init__(
+		self,
+		batch_size: int = CLASSIFY_QUEUE_BATCH_SIZE,
+		poll_ms: float = CLASSIFY_QUEUE_POLL_MS,
+		lease_seconds: float = CLASSIFY_QUEUE_LEASE_SECONDS,
+		max_attempts: int = CLASSIFY_QUEUE_MAX_ATTEMPTS
+	):
+		self.batch_size = batch_size
+		self.poll_interval = poll_ms / 1000
+		self.lease_seconds = lease_seconds
+		self.max_attempts = max_attempts
+		self._task: Optional[asyncio.Task] = None
+		self._wakeup: Optional[asyncio.Event] = None
+
+	def start(self, db: AsyncIOMotorDatabase) -> None:
+		if self._task is None:
+			self._wakeup = asyncio.Event()
+			self._task = asyncio.create_task(self._run(db))
+
+	async def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+
+	def notify(self) -> None:
+		"""Wake the worker early after a local enqueue."""
+		if self._wakeup is not None:
+			self._wakeup.set()
+
+	async def _run(self, db: AsyncIOMotorDatabase) -> None:
+		try:
+			requeued = await self.requeue_orphans(db)
+			if requeued:
+				print(f"Re-queued {requeued} pending expenses for classification.")
+		except Exception as e:
+			print(f"⚠️  Warning: Could not re-queue pending expenses: {e}")
+		while True:
+			try:
+				processed = await self.run_once(db)
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				print(f"⚠️  Warning: Deferred classification batch failed: {e}")
+				processed = 0
+			if processed < self.batch_size:
+				self._wakeup.clear()
+				try:
+					await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+				except asyncio.TimeoutError:
+					pass
+
+	@track_mongo("requeue_pending_expenses")
+	async def requeue_orphans(self, db: AsyncIOMotorDatabase) -> int:
+		"""Queue pending expenses that have no queue entry."""
+		pending = await get_pending_expenses(db)
+		if not pending:
+			return 0
+		now = datetime.utcnow()
+		result = await db.classification_queue.bulk_write([
+			UpdateOne(
+				{"_id": doc["_id"]},
+				{"$setOnInsert": {
+					"user_id": doc["user_id"],
+					"description": doc["description"],
+					"enqueued_at": now,
+					"lease": None,
+					"lease_until": None,
+					"attempts": 0
+				}},
+				upsert=True
+			)
+			for doc in pending
+		], ordered=False)
+		return result.upserted_count
+
+	@track_mongo("lease_classification_batch")
+	async def _lease_batch(self, db: AsyncIOMotorDatabase) -> List[dict]:
+		now = datetime.utcnow()
+		available = {
+			"attempts": {"$lt": self.max_attempts},
+			"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]
+		}
+		candidates = await db.classification_queue.find(available, {"_id": 1})\
+			.sort("enqueued_at", 1).limit(self.batch_size).to_list(length=None)
+		if not candidates:
+			return []
+		# Only entries still available get our lease token, so concurrent workers never share one
+		lease = uuid.uuid4().hex
+		await db.classification_queue.update_many(
+			{"_id": {"$in": [doc["_id"] for doc in candidates]}, **available},
+			{
+				"$set": {"lease": lease, "lease_until": now + timedelta(seconds=self.lease_seconds)},
+				"$inc": {"attempts": 1}
+			}
+		)
+		return await db.classification_queue.find({"lease": lease}).to_list(length=None)
+
+	async def run_once(self, db: AsyncIOMotorDatabase) -> int:
+		"""
+		Lease, classify and store one batch.
+
+		Returns:
+			Number of queue entries processed
+		"""
+		entries = await self._lease_batch(db)
+		if not entries:
+			return 0
+
+		# Users with custom categories need their centroids; everyone else shares one batch call
+		results = [None] * len(entries)
+		batched = []
+		for position, entry in enumerate(entries):
+			user_id = str(entry["user_id"])
+			if await get_custom_centroids(db, user_id):
+				results[position] = await classify_for_user(db, user_id, entry["description"], ranked=False)
+			else:
+				batched.append(position)
+		if batched:
+			predictions = await asyncio.to_thread(
+				classify_batch, [entries[position]["description"] for position in batched], ranked=False
+			)
+			for position, prediction in zip(batched, predictions):
+				results[position] = prediction
+
+		updated = await apply_classifications(db, [
+			(entry["_id"], entry["user_id"], entry["description"], category, probability)
+			for entry, (category, probability, _) in zip(entries, results)
+		])
+		# Entries re-enqueued meanwhile have a new lease (None) and are kept
+		await db.classification_queue.delete_many({
+			"_id": {"$in": [entry["_id"] for entry in entries]},
+			"lease": entries[0]["lease"]
+		})
+
+		CLASSIFY_QUEUE_PROCESSED.inc("classified", amount=updated)
+		CLASSIFY_QUEUE_PROCESSED.inc("skipped", amount=len(entries) - updated)
+		now = datetime.utcnow()
+		for entry in entries:
+			CLASSIFY_QUEUE_LAG.observe((now - entry["enqueued_at"]).total_seconds())
+		return len(entries)
+
+
+# Started by app.main when DEFERRED_CLASSIFICATION is enabled
+classification_worker = ClassificationWorker()
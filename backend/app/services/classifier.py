@@ -1,8 +1,26 @@
-from typing import List, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import os
 import re
+import threading
+from app.services.keyword_rules import KeywordMatcher, load_keyword_rules
+from app.services.metrics import CLASSIFIER_LATENCY, Counter, timed
+from app.services.model_sharing import SharedExpenseClassifier, shared_model_name
+
+# Keyword rule tier in front of the model (see classify())
+CLASSIFIER_RULES_ENABLED = os.getenv("CLASSIFIER_RULES_ENABLED", "true").lower() in ("1", "true", "yes")
+CLASSIFIER_RULE_CONFIDENCE = float(os.getenv("CLASSIFIER_RULE_CONFIDENCE", "0.99"))
+
+CLASSIFIER_RULE_RESULTS = Counter(
+	"classifier_rule_results_total",
+	"Keyword rule tier outcomes: hit (model skipped), miss or ambiguous (model used).",
+	("result",)
+)
+
+# sklearn takes about a second to import, so it is only imported when a model
+# is actually built (see ExpenseClassifier.build_pipeline)
+if TYPE_CHECKING:
+	import numpy as np
+	from sklearn.pipeline import Pipeline
 
 
 class ExpenseClassifier:
@@ -24,9 +42,33 @@ class ExpenseClassifier:
 		"Other"
 	]
 	
-	def __init__(self):
-		"""Initialize and train the classifier with seed data."""
-		self.pipeline = Pipeline([
+	def __init__(
+		self,
+		pipeline: Optional["Pipeline"] = None,
+		training_data: Optional[Tuple[List[str], List[str]]] = None
+	):
+		"""
+		Initialize and train the classifier.
+		
+		Args:
+			pipeline: Unfitted pipeline to train instead of the default
+				TF-IDF + Logistic Regression model (used by the benchmarks)
+			training_data: (texts, labels) to train on instead of the seed data
+		"""
+		self.pipeline = pipeline if pipeline is not None else self.build_pipeline()
+		
+		# Load training data from seed data
+		training_texts, training_labels = training_data or self._get_seed_data()
+		self.pipeline.fit(training_texts, training_labels)
+	
+	@staticmethod
+	def build_pipeline() -> "Pipeline":
+		"""Build the default unfitted TF-IDF + Logistic Regression pipeline."""
+		from sklearn.feature_extraction.text import TfidfVectorizer
+		from sklearn.linear_model import LogisticRegression
+		from sklearn.pipeline import Pipeline
+		
+		return Pipeline([
 			('tfidf', TfidfVectorizer(
 				max_features=1000,
 				ngram_range=(1, 2),
@@ -38,12 +80,9 @@ class ExpenseClassifier:
 				random_state=42
 			))
 		])
-		
-		# Load training data from seed data
-		training_texts, training_labels = self._get_seed_data()
-		self.pipeline.fit(training_texts, training_labels)
 	
-	def _get_seed_data(self) -> Tuple[List[str], List[str]]:
+	@staticmethod
+	def _get_seed_data() -> Tuple[List[str], List[str]]:
 		"""Generate seed training data for each category."""
 		seed_data = {
 			"Food": [
@@ -305,20 +344,60 @@ class ExpenseClassifier:
 		cleaned = self._clean_text(description)
 		
 		# Predict
-		predicted_category = self.pipeline.predict([cleaned])[0]
-		probabilities = self.pipeline.predict_proba([cleaned])[0]
+		with timed(CLASSIFIER_LATENCY, "predict"):
+			probabilities = self.pipeline.predict_proba([cleaned])[0]
 		
-		# Get probability for predicted category
-		category_idx = self.CATEGORIES.index(predicted_category)
-		probability = float(probabilities[category_idx])
+		# Probabilities are ordered like the fitted classes_, not CATEGORIES
+		classes = self.pipeline.classes_
+		top_indices = probabilities.argsort()[-3:][::-1]
+		predicted_category = str(classes[top_indices[0]])
+		probability = float(probabilities[top_indices[0]])
 		
 		# Get top 3 categories
-		top_indices = probabilities.argsort()[-3:][::-1]
-		top_classes = [self.CATEGORIES[idx] for idx in top_indices]
+		top_classes = [str(classes[idx]) for idx in top_indices]
 		
 		return predicted_category, probability, top_classes
 	
-	def _clean_text(self, text: str) -> str:
+	def predict_batch(self, descriptions: List[str]) -> List[Tuple[str, float, List[str]]]:
+		"""
+		Predict categories for many descriptions with one vectorized model call.
+		
+		Args:
+			descriptions: Expense description texts
+		
+		Returns:
+			List of (predicted_category, probability, top_3_categories), in input order
+		"""
+		if not descriptions:
+			return []
+		cleaned = [self._clean_text(description) for description in descriptions]
+		
+		with timed(CLASSIFIER_LATENCY, "predict_batch"):
+			probabilities = self.pipeline.predict_proba(cleaned)
+		
+		classes = self.pipeline.classes_
+		top_indices = probabilities.argsort(axis=1)[:, -3:][:, ::-1]
+		results = []
+		for row, indices in zip(probabilities, top_indices):
+			results.append((
+				str(classes[indices[0]]),
+				float(row[indices[0]]),
+				[str(classes[idx]) for idx in indices]
+			))
+		return results
+	
+	@property
+	def vocabulary(self) -> Dict[str, int]:
+		"""TF-IDF feature index of every term."""
+		return self.pipeline.named_steps["tfidf"].vocabulary_
+	
+	def transform(self, text: str) -> Tuple["np.ndarray", "np.ndarray"]:
+		"""TF-IDF vector of a cleaned description as (feature indices, weights)."""
+		row = self.pipeline.named_steps["tfidf"].transform([text])
+		return row.indices, row.data
+	
+	@staticmethod
+	def _clean_text(text: str) -> str:
 		"""Clean and normalize input text."""
 		# Lowercase
 		text = text.lower()
@@ -331,12 +410,114 @@ class ExpenseClassifier:
 
 # Global classifier instance (initialized at startup)
 classifier = None
+_classifier_lock = threading.Lock()
 
 
 def get_classifier() -> ExpenseClassifier:
-	"""Get or initialize the global classifier instance."""
+	"""
+	Get or initialize the global classifier instance.
+	
+	Startup trains the model in a worker thread, so initialization is guarded
+	by a lock to make sure it only happens once. When running under app.serve,
+	workers attach to the supervisor's shared-memory weights instead of
+	training their own copy.
+	"""
 	global classifier
 	if classifier is None:
-		classifier = ExpenseClassifier()
+		with _classifier_lock:
+			if classifier is None:
+				shm_name = shared_model_name()
+				if shm_name:
+					classifier = SharedExpenseClassifier(shm_name)
+				else:
+					classifier = ExpenseClassifier()
 	return classifier
 
+
+def is_classifier_ready() -> bool:
+	"""Whether the global classifier has been trained."""
+	return classifier is not None
+
+
+_keyword_matcher: Optional[KeywordMatcher] = None
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+	"""Build the keyword automaton once from the configured rule table."""
+	global _keyword_matcher
+	if _keyword_matcher is None:
+		rules = load_keyword_rules()
+		unknown = set(rules.values()) - set(ExpenseClassifier.CATEGORIES)
+		if unknown:
+			raise ValueError(f"Keyword rules use unknown categories: {sorted(unknown)}")
+		_keyword_matcher = KeywordMatcher(rules)
+	return _keyword_matcher
+
+
+def _match_rules(description: str) -> Optional[str]:
+	"""Category from the keyword rules, or None to fall through to the model."""
+	if not CLASSIFIER_RULES_ENABLED:
+		return None
+	category, ambiguous = get_keyword_matcher().match(ExpenseClassifier._clean_text(description))
+	CLASSIFIER_RULE_RESULTS.inc("hit" if category else "ambiguous" if ambiguous else "miss")
+	return category
+
+
+def _rule_result(category: str, prediction: Optional[Tuple[str, float, List[str]]]) -> Tuple[str, float, List[str]]:
+	"""A keyword hit, its top categories completed from the model's ranking if given."""
+	top_classes = [category]
+	if prediction is not None:
+		ranking = prediction[2]
+		top_classes.extend(name for name in ranking if name != category)
+		del top_classes[len(ranking):]
+	return category, CLASSIFIER_RULE_CONFIDENCE, top_classes
+
+
+def classify(description: str, ranked: bool = True) -> Tuple[str, float, List[str]]:
+	"""
+	Classify a description, trying the keyword rules before the model.
+	
+	An unambiguous keyword hit wins with CLASSIFIER_RULE_CONFIDENCE; anything
+	else is passed to the classifier's predict. A hit is listed first in the
+	top categories and the model's ranking fills the rest, which costs a model
+	inference; callers that only need the category pass ranked=False to skip
+	it (top categories are then just the hit).
+	
+	Args:
+		description: Expense description text
+		ranked: Fill the top categories of a keyword hit from the model
+	
+	Returns:
+		Tuple of (predicted_category, probability, top_categories)
+	"""
+	category = _match_rules(description)
+	if category is not None:
+		return _rule_result(category, get_classifier().predict(description) if ranked else None)
+	return get_classifier().predict(description)
+
+
+def classify_batch(descriptions: List[str], ranked: bool = True) -> List[Tuple[str, float, List[str]]]:
+	"""
+	Classify many descriptions with one predict_batch call (see classify()).
+	
+	With ranked=False only the rule misses are sent to the model.
+	
+	Args:
+		descriptions: Expense description texts
+		ranked: Fill the top categories of keyword hits from the model
+	
+	Returns:
+		List of (predicted_category, probability, top_categories), in input order
+	"""
+	rule_hits = [_match_rules(description) for description in descriptions]
+	to_predict = [position for position, category in enumerate(rule_hits) if ranked or category is None]
+	predictions: List[Optional[Tuple[str, float, List[str]]]] = [None] * len(descriptions)
+	if to_predict:
+		for position, prediction in zip(
+			to_predict, get_classifier().predict_batch([descriptions[position] for position in to_predict])
+		):
+			predictions[position] = prediction
+	return [
+		prediction if category is None else _rule_result(category, prediction)
+		for category, prediction in zip(rule_hits, predictions)
+	]
@@ -0,0 +1,248 @@
+"""
+Per-user custom categories as nearest centroids in the TF-IDF feature space.
+
+Each custom category is one document holding the running sum of the TF-IDF
+vectors of the expenses the user labeled with it, plus the label count. A
+new label is a single $inc of the count and of the description's non-zero
+features, so updates are O(1) in the number of labeled expenses and memory
+is O(custom categories) per user; no per-user model is trained.
+
+At prediction time the description's (L2-normalized) vector is compared
+with each centroid by cosine similarity. The best custom category wins if
+it reaches CUSTOM_CATEGORY_MIN_SIMILARITY and shares at least
+CUSTOM_CATEGORY_MIN_FEATURES features with the description; otherwise
+classification falls back to the global tiers (keyword rules, then the
+model). The vocabulary is fitted on the seed phrases, so a centroid often
+holds only a few generic terms; without the feature minimum a single
+shared word such as "food" would be enough to win.
+
+Labels whose description has no in-vocabulary feature teach nothing and
+are skipped. Sums are only meaningful for the vocabulary they were built
+with, so every centroid records a fingerprint of the feature space; it is
+ignored after the vocabulary changes and restarted by the next label.
+
+Custom categories live in MongoDB; with an embedded STORAGE_BACKEND users
+have none and creating one is refused.
+"""
+import hashlib
+import json
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from app.services.cache import user_cache
+from app.services.classifier import ExpenseClassifier, classify, get_classifier
+from app.services.metrics import Counter, track_mongo
+from app.services.storage_backends import storage_backend
+
+CUSTOM_CATEGORY_MIN_SIMILARITY = float(os.getenv("CUSTOM_CATEGORY_MIN_SIMILARITY", "0.5"))
+CUSTOM_CATEGORY_MIN_FEATURES = int(os.getenv("CUSTOM_CATEGORY_MIN_FEATURES", "2"))
+CUSTOM_CATEGORY_MAX_PER_USER = int(os.getenv("CUSTOM_CATEGORY_MAX_PER_USER", "50"))
+
+CUSTOM_CATEGORY_RESULTS = Counter(
+	"custom_category_results_total",
+	"Custom-category centroid lookups: hit (custom category used) or fallback (global tiers used).",
+	("result",)
+)
+CUSTOM_CATEGORY_LABELS = Counter(
+	"custom_category_labels_total",
+	"Labels folded into custom categories: added, reset (centroid restarted for a new vocabulary) or empty (skipped, no known features).",
+	("result",)
+)
+
+_feature_spaces: Dict[int, str] = {}
+
+
+def feature_space_id(classifier) -> str:
+	"""Fingerprint of a classifier's TF-IDF vocabulary (memoized per instance)."""
+	key = id(classifier)
+	if key not in _feature_spaces:
+		vocabulary = json.dumps(sorted((term, int(idx)) for term, idx in classifier.vocabulary.items()))
+		_feature_spaces[key] = hashlib.sha1(vocabulary.encode("utf-8")).hexdigest()[:16]
+	return _feature_spaces[key]
+
+
+@track_mongo("create_custom_category")
+async def create_custom_category(db: AsyncIOMotorDatabase, user_id: str, name: str) -> dict:
+	"""
+	Create an empty custom category for a user.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		name: Category name
+	
+	Returns:
+		Category summary dict (name, examples)
+	
+	Raises:
+		ValueError: If the name clashes with a built-in or existing category,
+			or the user reached CUSTOM_CATEGORY_MAX_PER_USER
+	"""
+	if not storage_backend.uses_mongo:
+		raise ValueError(f"Custom categories are not available with the {storage_backend.name} storage backend")
+	if name in ExpenseClassifier.CATEGORIES:
+		raise ValueError(f"{name} is a built-in category")
+	if await db.custom_categories.count_documents({"user_id": ObjectId(user_id)}) >= CUSTOM_CATEGORY_MAX_PER_USER:
+		raise ValueError(f"At most {CUSTOM_CATEGORY_MAX_PER_USER} custom categories are allowed")
+	try:
+		await db.custom_categories.insert_one({
+			"user_id": ObjectId(user_id),
+			"name": name,
+			"count": 0,
+			"sums": {},
+			"feature_space": feature_space_id(get_classifier()),
+			"created_at": datetime.utcnow()
+		})
+	except DuplicateKeyError:
+		raise ValueError(f"Category {name} already exists")
+	await user_cache.invalidate_user(user_id)
+	return {"name": name, "examples": 0}
+
+
+@track_mongo("delete_custom_category")
+async def delete_custom_category(db: AsyncIOMotorDatabase, user_id: str, name: str) -> bool:
+	"""
+	Delete a user's custom category (expenses keep their category name).
+	
+	Returns:
+		True if the category existed and was deleted, False otherwise
+	"""
+	if not storage_backend.uses_mongo:
+		return False
+	result = await db.custom_categories.delete_one({"user_id": ObjectId(user_id), "name": name})
+	if result.deleted_count == 0:
+		return False
+	await user_cache.invalidate_user(user_id)
+	return True
+
+
+@track_mongo("get_custom_categories")
+async def _query_centroids(db: AsyncIOMotorDatabase, user_id: str) -> List[dict]:
+	docs = await db.custom_categories.find(
+		{"user_id": ObjectId(user_id)},
+		{"_id": 0, "name": 1, "count": 1, "sums": 1, "feature_space": 1}
+	).sort("name", 1).to_list(length=None)
+	centroids = []
+	for doc in docs:
+		sums = doc.get("sums") or {}
+		centroids.append({
+			"name": doc["name"],
+			"examples": doc.get("count", 0),
+			"feature_space": doc.get("feature_space"),
+			# Cosine similarity only needs the direction of the sum
+			"sums": sums,
+			"norm": math.sqrt(sum(value * value for value in sums.values()))
+		})
+	return centroids
+
+
+async def get_custom_centroids(db: AsyncIOMotorDatabase, user_id: str) -> List[dict]:
+	"""
+	Get a user's custom categories with their centroid sums (cached per user).
+	
+	Returns:
+		List of dicts with name, examples, feature_space, sums and norm;
+		shared with other callers, do not mutate
+	"""
+	if not storage_backend.uses_mongo:
+		return []
+	return await user_cache.get_or_load(user_id, "categories", lambda: _query_centroids(db, user_id))
+
+
+async def is_custom_category(db: AsyncIOMotorDatabase, user_id: str, name: str) -> bool:
+	return any(centroid["name"] == name for centroid in await get_custom_centroids(db, user_id))
+
+
+@track_mongo("label_custom_category")
+async def add_label(db: AsyncIOMotorDatabase, user_id: str, name: str, description: str) -> bool:
+	"""
+	Fold a user-labeled description into a custom category's centroid.
+	
+	A centroid built with another vocabulary is restarted from this label.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		name: Custom category the user chose
+		description: Description of the labeled expense
+	
+	Returns:
+		True if the label was stored, False if the description has no
+		in-vocabulary features (or the category does not exist)
+	"""
+	classifier = get_classifier()
+	indices, weights = classifier.transform(ExpenseClassifier._clean_text(description))
+	if len(indices) == 0:
+		CUSTOM_CATEGORY_LABELS.inc("empty")
+		return False
+	
+	space = feature_space_id(classifier)
+	sums = {str(int(index)): float(weight) for index, weight in zip(indices, weights)}
+	increments = {f"sums.{index}": weight for index, weight in sums.items()}
+	increments["count"] = 1
+	result = await db.custom_categories.update_one(
+		{"user_id": ObjectId(user_id), "name": name, "feature_space": space},
+		{"$inc": increments}
+	)
+	outcome = "added"
+	if result.matched_count == 0:
+		result = await db.custom_categories.update_one(
+			{"user_id": ObjectId(user_id), "name": name, "feature_space": {"$ne": space}},
+			{"$set": {"sums": sums, "count": 1, "feature_space": space}}
+		)
+		outcome = "reset"
+	if result.matched_count == 0:
+		return False
+	CUSTOM_CATEGORY_LABELS.inc(outcome)
+	await user_cache.invalidate_user(user_id)
+	return True
+
+
+async def classify_for_user(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	description: str,
+	ranked: bool = True
+) -> Tuple[str, float, List[str]]:
+	"""
+	Classify a description for a user, trying their custom categories first.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		description: Expense description text
+		ranked: Passed to classify() when falling back to the global tiers
+	
+	Returns:
+		Tuple of (predicted_category, probability, top_categories); for a
+		custom category the probability is the cosine similarity
+	"""
+	centroids = await get_custom_centroids(db, user_id)
+	if not centroids:
+		return classify(description, ranked)
+	
+	classifier = get_classifier()
+	space = feature_space_id(classifier)
+	indices, weights = classifier.transform(ExpenseClassifier._clean_text(description))
+	scored = []
+	for centroid in centroids:
+		if centroid["feature_space"] != space or not centroid["norm"]:
+			continue
+		sums = centroid["sums"]
+		shared = [(float(weight), sums[str(int(index))]) for index, weight in zip(indices, weights) if sums.get(str(int(index)))]
+		# One shared (usually generic) term is not evidence enough
+		if len(shared) < CUSTOM_CATEGORY_MIN_FEATURES:
+			continue
+		scored.append((sum(weight * total for weight, total in shared) / centroid["norm"], centroid["name"]))
+	scored.sort(reverse=True)
+	
+	if scored and scored[0][0] >= CUSTOM_CATEGORY_MIN_SIMILARITY:
+		CUSTOM_CATEGORY_RESULTS.inc("hit")
+		similarity, name = scored[0]
+		return name, float(similarity), [name for _, name in scored[:3]]
+	CUSTOM_CATEGORY_RESULTS.inc("fallback")
+	return classify(description, ranked)
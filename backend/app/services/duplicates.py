@@ -0,0 +1,85 @@
+"""
+Near-duplicate expense detection with SimHash.
+
+Each expense gets a 64-bit SimHash of its description's character 3-grams,
+so two descriptions that share most of their 3-grams ("Starbucks #123" vs
+"STARBUCKS 123", "Starbucks coffee" vs "Starbucks coffe") land a few bits
+apart while unrelated ones differ in about half the bits. A duplicate must
+have the same amount (in cents) and date, so each expense stores that pair
+as its lookup key in the indexed dup_keys field: one indexed query returns
+the user's expenses of that day and amount, usually a handful, and each is
+checked exactly against DUPLICATE_MAX_HAMMING.
+
+DUPLICATE_POLICY chooses what happens to a duplicate: "flag" stores it
+with duplicate_of set (it is listed but left out of category stats),
+"reject" refuses it, "off" disables detection. Deleting an original
+promotes its oldest duplicate in its place (see storage.delete_expense).
+"""
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+DUPLICATE_POLICIES = ("flag", "reject", "off")
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "flag").lower()
+# One-character edits of short descriptions move their SimHash by up to ~10 bits;
+# different descriptions are typically 20+ bits apart
+DUPLICATE_MAX_HAMMING = int(os.getenv("DUPLICATE_MAX_HAMMING", "10"))
+
+if DUPLICATE_POLICY not in DUPLICATE_POLICIES:
+	raise ValueError(f"Unknown DUPLICATE_POLICY {DUPLICATE_POLICY!r}; use {', '.join(DUPLICATE_POLICIES)}")
+
+_BITS = 64
+
+
+class DuplicateExpenseError(ValueError):
+	"""Raised by storage when DUPLICATE_POLICY=reject and a duplicate exists."""
+
+	def __init__(self, duplicate_of: str):
+		super().__init__(f"Duplicate of expense {duplicate_of}")
+		self.duplicate_of = duplicate_of
+
+
+def _shingles(description: str) -> List[str]:
+	text = " ".join("".join(c if c.isalnum() else " " for c in description.lower()).split())
+	if len(text) < 3:
+		return [text] if text else []
+	return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def simhash(description: str) -> int:
+	"""64-bit SimHash of a description's character 3-grams."""
+	weights = [0] * _BITS
+	for shingle in _shingles(description):
+		value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+		for bit in range(_BITS):
+			weights[bit] += 1 if value >> bit & 1 else -1
+	return sum(1 << bit for bit in range(_BITS) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+	return bin((a ^ b) & (1 << _BITS) - 1).count("1")
+
+
+def to_int64(value: int) -> int:
+	"""Store unsigned 64-bit hashes in MongoDB's signed int64."""
+	return value - (1 << _BITS) if value >= 1 << (_BITS - 1) else value
+
+
+def fingerprint(description: str, amount: float, date: Optional[str]) -> Tuple[int, List[str]]:
+	"""
+	SimHash and candidate lookup keys for an expense.
+
+	Returns:
+		(simhash as signed int64, dup_keys: the single "cents:date" key)
+	"""
+	return to_int64(simhash(description)), [f"{int(round(amount * 100))}:{date or ''}"]
+
+
+def is_near_duplicate(signed_hash: int, amount: float, date: Optional[str], candidate: dict) -> bool:
+	"""Exact check of a candidate found through shared dup_keys."""
+	return (
+		int(round(candidate.get("amount", 0) * 100)) == int(round(amount * 100))
+		and candidate.get("date") == date
+		and "dup_hash" in candidate
+		and hamming(signed_hash, candidate["dup_hash"]) <= DUPLICATE_MAX_HAMMING
+	)
@@ -0,0 +1,78 @@
+"""
+Conditional GET support based on a per-user data version.
+
+Every expense write bumps users.data_version atomically ($inc) after the
+write succeeds. The version is read together with the user during
+authentication, so an unchanged refresh is answered with 304 Not Modified
+before any expense query runs.
+"""
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import Response
+from app.services.metrics import Counter
+
+# Clients must revalidate every time; shared caches must not store user data
+CACHE_CONTROL = "private, no-cache"
+
+NOT_MODIFIED = Counter(
+	"conditional_not_modified_total",
+	"Conditional GETs answered with 304 Not Modified, by view.",
+	("view",)
+)
+
+
+def current_data_version(request: Request) -> Optional[int]:
+	"""Data version stored on the request by get_current_user, if any."""
+	return getattr(request.state, "data_version", None)
+
+
+def make_etag(user_id: str, view: str, version: int) -> str:
+	"""
+	Strong ETag for one user's view at a given data version.
+
+	The user id is part of the tag so a device that switches accounts can
+	never be served another user's cached representation.
+	"""
+	return f'"{view}-{user_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+	"""If-None-Match comparison (weak, as RFC 9110 requires for this header)."""
+	if not if_none_match:
+		return False
+	if if_none_match.strip() == "*":
+		return True
+	for candidate in if_none_match.split(","):
+		candidate = candidate.strip()
+		if candidate.startswith("W/"):
+			candidate = candidate[2:]
+		if candidate == etag:
+			return True
+	return False
+
+
+def conditional_etag(request: Request, user_id: str, view: str) -> Optional[str]:
+	"""ETag for the request's view, or None when the data version is unknown."""
+	version = current_data_version(request)
+	if version is None:
+		return None
+	return make_etag(user_id, view, version)
+
+
+def not_modified(request: Request, etag: Optional[str], view: str) -> Optional[Response]:
+	"""
+	Build a 304 response when the client already holds the current version.
+
+	Returns:
+		304 Response, or None when the full response must be sent
+	"""
+	if etag is None or not etag_matches(request.headers.get("if-none-match"), etag):
+		return None
+	NOT_MODIFIED.inc(view)
+	return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag_headers(response: Response, etag: Optional[str]) -> None:
+	if etag is not None:
+		response.headers["ETag"] = etag
+		response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,176 @@
+"""
+Per-user change events for the GET /events Server-Sent Events stream.
+
+Storage write paths publish an event per expense write. The EventBroker
+hands events to a fan-out backend, which delivers them to the broker of
+every worker; each broker then pushes them into the bounded queues of that
+worker's subscribers for the user.
+
+The default "local" backend delivers in-process only, which is enough for a
+single worker. For several workers select a shared backend with
+EVENTS_BACKEND=module:Class (e.g. one built on Redis pub/sub); it only has
+to implement FanoutBackend and carry JSON-serializable dicts. Events from
+other workers also invalidate this worker's per-user read cache.
+
+Slow consumers never block writers: when a subscriber's queue is full its
+pending events are dropped and replaced by a single "resync" event, telling
+the client to refetch instead of replaying a backlog.
+"""
+import asyncio
+import importlib
+import os
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Protocol, Set
+from app.services.cache import user_cache
+from app.services.metrics import Counter, Gauge
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "local")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+EVENTS_PUBLISHED = Counter(
+	"events_published_total",
+	"Change events published by storage writes, by type.",
+	("type",)
+)
+EVENTS_DROPPED = Counter(
+	"events_dropped_total",
+	"Events dropped for slow subscribers (replaced by a resync event)."
+)
+EVENTS_SUBSCRIBERS = Gauge(
+	"events_subscribers",
+	"Open event stream subscriptions on this worker."
+)
+
+Deliver = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class FanoutBackend(Protocol):
+	"""Carries events between the brokers of all workers."""
+
+	async def start(self, deliver: Deliver) -> None:
+		"""Begin calling deliver(user_id, event) for every published event."""
+		...
+
+	async def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+		...
+
+	async def close(self) -> None:
+		...
+
+
+class LocalFanout:
+	"""Single-process fan-out: publishing delivers straight to this worker."""
+
+	def __init__(self):
+		self._deliver: Optional[Deliver] = None
+
+	async def start(self, deliver: Deliver) -> None:
+		self._deliver = deliver
+
+	async def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+		if self._deliver is not None:
+			await self._deliver(user_id, event)
+
+	async def close(self) -> None:
+		self._deliver = None
+
+
+class Subscription:
+	"""One open event stream with its own bounded queue."""
+
+	def __init__(self, user_id: str, max_size: int = EVENTS_QUEUE_SIZE):
+		self.user_id = user_id
+		self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_size)
+
+	def push(self, event: Dict[str, Any]) -> None:
+		"""Queue an event without blocking; on overflow collapse the backlog into a resync."""
+		try:
+			self.queue.put_nowait(event)
+		except asyncio.QueueFull:
+			EVENTS_DROPPED.inc(amount=self.queue.qsize())
+			while not self.queue.empty():
+				self.queue.get_nowait()
+			self.queue.put_nowait({"type": "resync"})
+
+	async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+		"""Next event, or None if nothing arrived within timeout."""
+		try:
+			return await asyncio.wait_for(self.queue.get(), timeout)
+		except asyncio.TimeoutError:
+			return None
+
+	def drain(self) -> list:
+		"""Events already queued, without waiting."""
+		events = []
+		while not self.queue.empty():
+			events.append(self.queue.get_nowait())
+		return events
+
+
+class EventBroker:
+	"""Routes published events to this worker's subscribers, per user."""
+
+	def __init__(self, backend: FanoutBackend):
+		self.backend = backend
+		self.worker_id = uuid.uuid4().hex
+		self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+		self._started = False
+
+	async def start(self) -> None:
+		if not self._started:
+			await self.backend.start(self._deliver)
+			self._started = True
+
+	async def close(self) -> None:
+		if self._started:
+			await self.backend.close()
+			self._started = False
+
+	async def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+		"""Publish an event for a user; never raises into the write path."""
+		EVENTS_PUBLISHED.inc(event.get("type", "unknown"))
+		try:
+			await self.start()
+			await self.backend.publish(user_id, {**event, "origin": self.worker_id})
+		except Exception as e:
+			print(f"⚠️  Warning: Could not publish {event.get('type')} event: {e}")
+
+	async def _deliver(self, user_id: str, event: Dict[str, Any]) -> None:
+		if event.get("origin") != self.worker_id:
+			# Another worker wrote; drop what this worker cached for the user
+			await user_cache.invalidate_user(user_id)
+		for subscription in list(self._subscribers.get(user_id, ())):
+			subscription.push(event)
+
+	async def subscribe(self, user_id: str) -> Subscription:
+		await self.start()
+		subscription = Subscription(user_id)
+		self._subscribers[user_id].add(subscription)
+		EVENTS_SUBSCRIBERS.set(value=self.subscriber_count())
+		return subscription
+
+	def unsubscribe(self, subscription: Subscription) -> None:
+		subscribers = self._subscribers.get(subscription.user_id)
+		if subscribers is not None:
+			subscribers.discard(subscription)
+			if not subscribers:
+				del self._subscribers[subscription.user_id]
+		EVENTS_SUBSCRIBERS.set(value=self.subscriber_count())
+
+	def subscriber_count(self) -> int:
+		return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def _build_backend(name: str) -> FanoutBackend:
+	if name == "local":
+		return LocalFanout()
+	module_name, _, class_name = name.partition(":")
+	if not class_name:
+		raise ValueError(f"Unknown EVENTS_BACKEND {name!r}; use local or module:Class")
+	return getattr(importlib.import_module(module_name), class_name)()
+
+
+# Process-wide broker used by app.services.storage and the /events endpoint
+event_broker = EventBroker(_build_backend(EVENTS_BACKEND))
@@ -0,0 +1,795 @@
+"""
+Physical layouts for expense documents in MongoDB.
+
+app.services.storage owns the behaviour around a write (duplicate policy,
+cache invalidation, data versions, change events) and delegates the raw
+MongoDB operations to the layout selected by EXPENSE_LAYOUT:
+
+- "document" (default): one document per expense in the expenses collection.
+- "bucket": one document per user and month in expense_buckets, holding the
+  month's expenses in an embedded array plus running per-category totals
+  ({"totals": {category: {"amount", "count"}}}, duplicates excluded).
+  Index entries grow with the number of user-months instead of the number
+  of expenses, a user's history is read from a few contiguous documents,
+  and category stats are summed from the bucket totals without reading a
+  single expense.
+
+Bucket layout trade-offs: search matches words in Python over the user's
+rows (a text index would score whole buckets, not expenses), and moving an
+expense to another month is two writes (push to the new bucket, then pull
+from the old one, so an interruption can leave a copy but never loses it).
+
+Existing data is converted with `python -m app.migrate_layout --to bucket`.
+"""
+import asyncio
+import os
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from .write_batcher import expense_inserts
+
+EXPENSE_LAYOUT = os.getenv("EXPENSE_LAYOUT", "document").lower()
+
+# Fields returned to clients; everything else stays on the server
+EXPENSE_PROJECTION = {
+	"description": 1,
+	"amount": 1,
+	"date": 1,
+	"category": 1,
+	"probability": 1,
+	"duplicate_of": 1
+}
+
+# Client-facing fields, in row order
+_ROW_FIELDS = tuple(EXPENSE_PROJECTION)
+
+# Category of expenses waiting for deferred classification
+PENDING_CATEGORY = "pending"
+
+# Fields read for the exact near-duplicate check
+_DUPLICATE_FIELDS = ("amount", "date", "dup_hash", "duplicate_of")
+
+# Optimistic retries when a bucket entry changed between read and write
+_BUCKET_WRITE_RETRIES = 5
+
+
+def _to_rows(docs: List[dict]) -> List[dict]:
+	"""
+	Turn projected expense documents into API rows in place.
+
+	Converting _id in one pass over the batch avoids building a Pydantic
+	model per document for data we wrote ourselves.
+	"""
+	for doc in docs:
+		doc["id"] = str(doc.pop("_id"))
+		if "date" not in doc:
+			doc["date"] = None
+		if "duplicate_of" in doc:
+			doc["duplicate_of"] = str(doc["duplicate_of"])
+	return docs
+
+
+class DocumentLayout:
+	"""One document per expense (the original layout)."""
+
+	name = "document"
+
+	async def create_indexes(self, db: AsyncIOMotorDatabase) -> None:
+		await asyncio.gather(
+			# Serves a user's newest-first list and stream without an in-memory SORT,
+			# and every other user_id lookup as its prefix
+			db.expenses.create_index([("user_id", 1), ("date", -1), ("created_at", -1)]),
+			db.expenses.create_index("date"),
+			db.expenses.create_index("category"),
+			db.expenses.create_index([("user_id", 1), ("updated_at", 1)]),
+			db.expenses.create_index([("user_id", 1), ("dup_keys", 1)]),
+			# Flagged duplicates of an expense, for promoting one when it is deleted
+			db.expenses.create_index(
+				[("user_id", 1), ("duplicate_of", 1)], partialFilterExpression={"duplicate_of": {"$exists": True}}
+			),
+			db.expenses.create_index([("user_id", 1), ("description", "text")]),
+		)
+
+	async def insert_one(self, db: AsyncIOMotorDatabase, doc: dict) -> None:
+		# Coalesced with concurrent inserts when INSERT_BATCHING is enabled
+		await expense_inserts.insert(db, doc)
+
+	async def insert_many(self, db: AsyncIOMotorDatabase, docs: List[dict]) -> None:
+		await db.expenses.insert_many(docs, ordered=False)
+
+	def _user_cursor(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	):
+		query: Dict[str, Any] = {"user_id": ObjectId(user_id)}
+		if date_from or date_to:
+			query["date"] = _date_range(date_from, date_to)
+		return db.expenses.find(query, EXPENSE_PROJECTION).sort([("date", -1), ("created_at", -1)])
+
+	async def find_rows(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> List[dict]:
+		return _to_rows(await self._user_cursor(db, user_id, date_from, date_to).to_list(length=None))
+
+	async def iter_batches(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		batch_size: int,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> AsyncIterator[List[dict]]:
+		cursor = self._user_cursor(db, user_id, date_from, date_to).batch_size(batch_size)
+		while True:
+			docs = await cursor.to_list(length=batch_size)
+			if not docs:
+				break
+			yield _to_rows(docs)
+
+	async def find_row(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[dict]:
+		doc = await db.expenses.find_one(
+			{"_id": ObjectId(expense_id), "user_id": ObjectId(user_id)},
+			EXPENSE_PROJECTION
+		)
+		return _to_rows([doc])[0] if doc else None
+
+	async def rows_changed_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[dict]:
+		cursor = db.expenses.find(
+			{"user_id": ObjectId(user_id), "updated_at": {"$gte": since}},
+			EXPENSE_PROJECTION
+		).sort("updated_at", 1)
+		return _to_rows(await cursor.to_list(length=None))
+
+	async def search(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		query: str,
+		limit: int,
+		offset: int
+	) -> List[dict]:
+		cursor = db.expenses.find(
+			{"user_id": ObjectId(user_id), "$text": {"$search": query}},
+			{**EXPENSE_PROJECTION, "score": {"$meta": "textScore"}}
+		).sort([("score", {"$meta": "textScore"}), ("date", -1)]).skip(offset).limit(limit)
+		return _to_rows(await cursor.to_list(length=None))
+
+	async def duplicate_candidates(self, db: AsyncIOMotorDatabase, user_id: str, docs: List[dict]) -> List[dict]:
+		keys = sorted({key for doc in docs for key in doc["dup_keys"]})
+		return await db.expenses.find(
+			{"user_id": ObjectId(user_id), "dup_keys": {"$in": keys}},
+			{field: 1 for field in _DUPLICATE_FIELDS}
+		).to_list(length=None)
+
+	async def update(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		expense_id: str,
+		fields: Dict[str, Any]
+	) -> Optional[dict]:
+		# Update and fetch the new version in a single round trip
+		doc = await db.expenses.find_one_and_update(
+			{"_id": ObjectId(expense_id), "user_id": ObjectId(user_id)},
+			{"$set": fields, "$unset": {"duplicate_of": ""}},
+			projection=EXPENSE_PROJECTION,
+			return_document=ReturnDocument.AFTER
+		)
+		return _to_rows([doc])[0] if doc else None
+
+	async def delete(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> bool:
+		result = await db.expenses.delete_one({
+			"_id": ObjectId(expense_id),
+			"user_id": ObjectId(user_id)
+		})
+		return result.deleted_count > 0
+
+	async def promote_duplicates(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		original_id: str,
+		now: datetime
+	) -> List[dict]:
+		query = {"user_id": ObjectId(user_id), "duplicate_of": ObjectId(original_id)}
+		docs = await db.expenses.find(query, {**EXPENSE_PROJECTION, "created_at": 1}).sort(
+			[("created_at", 1), ("_id", 1)]
+		).to_list(length=None)
+		if not docs:
+			return []
+		promoted = docs[0]["_id"]
+		await db.expenses.update_one(
+			{"_id": promoted, **query}, {"$unset": {"duplicate_of": ""}, "$set": {"updated_at": now}}
+		)
+		await db.expenses.update_many(query, {"$set": {"duplicate_of": promoted, "updated_at": now}})
+		for doc in docs:
+			doc.pop("created_at", None)
+			doc["duplicate_of"] = promoted
+		del docs[0]["duplicate_of"]
+		return _to_rows(docs)
+
+	async def set_classifications(
+		self,
+		db: AsyncIOMotorDatabase,
+		results: List[Tuple[ObjectId, ObjectId, str, str, float]],
+		now: datetime
+	) -> List[Tuple[str, dict]]:
+		await db.expenses.bulk_write([
+			UpdateOne(
+				{"_id": expense_id, "category": PENDING_CATEGORY, "description": description},
+				{"$set": {"category": category, "probability": probability, "updated_at": now}}
+			)
+			for expense_id, _, description, category, probability in results
+		], ordered=False)
+		# Only expenses stamped by this call changed
+		docs = await db.expenses.find(
+			{"_id": {"$in": [result[0] for result in results]}, "updated_at": now},
+			{**EXPENSE_PROJECTION, "user_id": 1}
+		).to_list(length=None)
+		return [(str(doc.pop("user_id")), _to_rows([doc])[0]) for doc in docs]
+
+	async def pending_expenses(self, db: AsyncIOMotorDatabase) -> List[dict]:
+		return await db.expenses.find(
+			{"category": PENDING_CATEGORY}, {"_id": 1, "user_id": 1, "description": 1}
+		).to_list(length=None)
+
+	async def category_totals(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[List[dict]]:
+		# Not precomputed in this layout; stats aggregate the expense rows
+		return None
+
+	# Migration helpers (see app.migrate_layout)
+
+	async def user_ids(self, db: AsyncIOMotorDatabase) -> List[ObjectId]:
+		return await db.expenses.distinct("user_id")
+
+	async def export_user(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> List[dict]:
+		return await db.expenses.find({"user_id": user_id}).to_list(length=None)
+
+	async def replace_user(self, db: AsyncIOMotorDatabase, user_id: ObjectId, docs: List[dict]) -> None:
+		await self.delete_user(db, user_id)
+		if docs:
+			await db.expenses.insert_many(docs, ordered=False)
+
+	async def delete_user(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> None:
+		await db.expenses.delete_many({"user_id": user_id})
+
+	async def count(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> int:
+		return await db.expenses.count_documents({"user_id": user_id})
+
+	# Archival helpers (see app.services.archive)
+
+	async def export_before(self, db: AsyncIOMotorDatabase, user_id: ObjectId, cutoff: str) -> List[Tuple[Any, List[dict]]]:
+		docs = await db.expenses.find({"user_id": user_id, "date": {"$lt": cutoff}}).to_list(length=None)
+		return [(None, docs)] if docs else []
+
+	async def remove_exported(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: ObjectId,
+		handle: Any,
+		docs: List[dict]
+	) -> List[ObjectId]:
+		# Expenses edited since they were exported stay where they are
+		await db.expenses.bulk_write([
+			DeleteOne({"_id": doc["_id"], "user_id": user_id, "updated_at": doc.get("updated_at")})
+			for doc in docs
+		], ordered=False)
+		return await db.expenses.distinct("_id", {"_id": {"$in": [doc["_id"] for doc in docs]}})
+
+
+def _date_range(date_from: Optional[str], date_to: Optional[str]) -> Dict[str, str]:
+	bounds = {}
+	if date_from:
+		bounds["$gte"] = date_from
+	if date_to:
+		bounds["$lte"] = date_to
+	return bounds
+
+
+def in_range(date: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> bool:
+	"""Whether an ISO date lies within inclusive optional bounds (a missing date sorts first)."""
+	return (not date_from or (date or "") >= date_from) and (not date_to or (date or "") <= date_to)
+
+
+def _month(doc: dict) -> str:
+	return (doc.get("date") or "")[:7]
+
+
+def total_key(category: str) -> str:
+	"""Escape a category for use as a field name under totals (reversed by category_from_key)."""
+	return category.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def category_from_key(key: str) -> str:
+	"""Category name of a field name made by total_key."""
+	return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def _totals_inc(docs: List[dict], sign: int = 1, inc: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+	"""$inc operand adding (or with sign=-1 removing) expenses from the bucket totals."""
+	inc = {} if inc is None else inc
+	for doc in docs:
+		if doc.get("duplicate_of") is not None:
+			continue
+		key = f"totals.{total_key(doc['category'])}"
+		inc[f"{key}.amount"] = inc.get(f"{key}.amount", 0) + sign * doc["amount"]
+		inc[f"{key}.count"] = inc.get(f"{key}.count", 0) + sign
+	return inc
+
+
+def _entry_guard(entry: dict) -> dict:
+	"""$elemMatch filter that only matches an embedded expense as it was read."""
+	return {
+		"_id": entry["_id"],
+		"updated_at": entry.get("updated_at"),
+		"amount": entry["amount"],
+		"category": entry["category"],
+		"duplicate_of": entry.get("duplicate_of")
+	}
+
+
+def entry_row(entry: dict) -> dict:
+	"""
+	API row (Expense shape) of one expense document, leaving the document as is.
+
+	Unlike _to_rows this copies, so it suits documents that are still in use
+	(bucket entries, archived or in-memory documents).
+	"""
+	row = {"id": str(entry["_id"]), "date": None}
+	for field in _ROW_FIELDS:
+		if field in entry:
+			row[field] = entry[field]
+	if "duplicate_of" in row:
+		row["duplicate_of"] = str(row["duplicate_of"])
+	return row
+
+
+def newest_first(entries: List[dict]) -> List[dict]:
+	"""Expense documents sorted newest first, by date then creation time (like the hot reads)."""
+	return sorted(
+		entries,
+		key=lambda entry: (entry.get("date") or "", entry.get("created_at") or datetime.min),
+		reverse=True
+	)
+
+
+_SEARCH_TOKEN = re.compile(r'-?"[^"]+"|\S+')
+
+
+def _search_score(description: str, terms: List[str], phrases: List[str], excluded: List[str]) -> int:
+	"""Number of query words found in a description; 0 when it does not match."""
+	text = description.lower()
+	words = re.findall(r"\w+", text)
+	if any(word.startswith(term) for term in excluded for word in words):
+		return 0
+	if any(phrase not in text for phrase in phrases):
+		return 0
+	score = sum(1 for term in terms for word in words if word.startswith(term))
+	return score + len(phrases) if score or phrases else 0
+
+
+def search_rows(rows: List[dict], query: str, limit: int, offset: int) -> List[dict]:
+	"""
+	Word-prefix search over expense rows for stores without a text index.
+
+	Supports "quoted phrases" and -excluded words like $text; rows must be
+	newest first, which is kept among equal scores.
+	"""
+	terms, phrases, excluded = [], [], []
+	for token in _SEARCH_TOKEN.findall(query.lower()):
+		negated = token.startswith("-")
+		token = token.lstrip("-")
+		if token.startswith('"'):
+			if not negated:
+				phrases.append(" ".join(token.strip('"').split()))
+			continue
+		words = re.findall(r"\w+", token)
+		(excluded if negated else terms).extend(words)
+	matches = []
+	for row in rows:
+		score = _search_score(row["description"], terms, phrases, excluded)
+		if score:
+			matches.append({**row, "score": float(score)})
+	matches.sort(key=lambda row: row["score"], reverse=True)
+	return matches[offset:offset + limit]
+
+
+class BucketLayout:
+	"""One document per user and month with embedded expenses and totals."""
+
+	name = "bucket"
+
+	def __init__(self, collection: str = "expense_buckets"):
+		self.collection = collection
+
+	def _buckets(self, db: AsyncIOMotorDatabase):
+		return db[self.collection]
+
+	async def create_indexes(self, db: AsyncIOMotorDatabase) -> None:
+		await asyncio.gather(
+			self._buckets(db).create_index([("user_id", 1), ("month", 1)], unique=True),
+			self._buckets(db).create_index([("user_id", 1), ("updated_at", 1)]),
+		)
+
+	async def insert_one(self, db: AsyncIOMotorDatabase, doc: dict) -> None:
+		await self.insert_many(db, [doc])
+
+	async def insert_many(self, db: AsyncIOMotorDatabase, docs: List[dict]) -> None:
+		groups: Dict[Tuple[ObjectId, str], List[dict]] = {}
+		for doc in docs:
+			doc.setdefault("_id", ObjectId())
+			groups.setdefault((doc["user_id"], _month(doc)), []).append(doc)
+		operations = [
+			UpdateOne(
+				{"user_id": user_id, "month": month},
+				{
+					"$push": {"expenses": {"$each": [
+						{key: value for key, value in doc.items() if key != "user_id"} for doc in group
+					]}},
+					"$inc": _totals_inc(group, inc={"count": len(group)}),
+					"$max": {"updated_at": max(doc["updated_at"] for doc in group)}
+				},
+				upsert=True
+			)
+			for (user_id, month), group in groups.items()
+		]
+		await self._bulk_upsert(db, operations)
+
+	async def _bulk_upsert(self, db: AsyncIOMotorDatabase, operations: List[UpdateOne]) -> None:
+		try:
+			await self._buckets(db).bulk_write(operations, ordered=False)
+		except BulkWriteError as e:
+			# Two concurrent upserts of a new bucket: the loser retries as a plain update
+			errors = e.details.get("writeErrors", [])
+			if not errors or any(error.get("code") != 11000 for error in errors):
+				raise
+			await self._buckets(db).bulk_write([operations[error["index"]] for error in errors], ordered=False)
+
+	def _user_buckets(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	):
+		query: Dict[str, Any] = {"user_id": ObjectId(user_id)}
+		if date_from or date_to:
+			query["month"] = _date_range(date_from and date_from[:7], date_to and date_to[:7])
+		projection = {f"expenses.{field}": 1 for field in ("_id", "created_at", *_ROW_FIELDS)}
+		return self._buckets(db).find(query, projection).sort("month", -1)
+
+	async def find_rows(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> List[dict]:
+		rows = []
+		for bucket in await self._user_buckets(db, user_id, date_from, date_to).to_list(length=None):
+			rows.extend(
+				entry_row(entry) for entry in newest_first(bucket.get("expenses", []))
+				if in_range(entry.get("date"), date_from, date_to)
+			)
+		return rows
+
+	async def iter_batches(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		batch_size: int,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> AsyncIterator[List[dict]]:
+		batch: List[dict] = []
+		async for bucket in self._user_buckets(db, user_id, date_from, date_to):
+			batch.extend(
+				entry_row(entry) for entry in newest_first(bucket.get("expenses", []))
+				if in_range(entry.get("date"), date_from, date_to)
+			)
+			while len(batch) >= batch_size:
+				yield batch[:batch_size]
+				batch = batch[batch_size:]
+		if batch:
+			yield batch
+
+	async def _find_entry(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[Tuple[dict, dict]]:
+		"""(bucket without expenses, embedded expense) holding an expense id."""
+		expense_id = ObjectId(expense_id)
+		bucket = await self._buckets(db).find_one(
+			{"user_id": ObjectId(user_id), "expenses._id": expense_id},
+			{"month": 1, "expenses": {"$elemMatch": {"_id": expense_id}}}
+		)
+		if not bucket or not bucket.get("expenses"):
+			return None
+		return bucket, bucket.pop("expenses")[0]
+
+	async def find_row(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[dict]:
+		found = await self._find_entry(db, user_id, expense_id)
+		return entry_row(found[1]) if found else None
+
+	async def rows_changed_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[dict]:
+		# A bucket's updated_at is the newest updated_at of its expenses
+		buckets = await self._buckets(db).find(
+			{"user_id": ObjectId(user_id), "updated_at": {"$gte": since}},
+			{f"expenses.{field}": 1 for field in ("_id", "updated_at", *_ROW_FIELDS)}
+		).to_list(length=None)
+		entries = [
+			entry for bucket in buckets for entry in bucket.get("expenses", [])
+			if entry.get("updated_at") and entry["updated_at"] >= since
+		]
+		entries.sort(key=lambda entry: entry["updated_at"])
+		return [entry_row(entry) for entry in entries]
+
+	async def search(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		query: str,
+		limit: int,
+		offset: int
+	) -> List[dict]:
+		return search_rows(await self.find_rows(db, user_id), query, limit, offset)
+
+	async def duplicate_candidates(self, db: AsyncIOMotorDatabase, user_id: str, docs: List[dict]) -> List[dict]:
+		# Duplicates share their date, so only the buckets of the new expenses' months are read
+		keys = {key for doc in docs for key in doc["dup_keys"]}
+		buckets = await self._buckets(db).find(
+			{"user_id": ObjectId(user_id), "month": {"$in": sorted({_month(doc) for doc in docs})}},
+			{f"expenses.{field}": 1 for field in ("_id", "dup_keys", *_DUPLICATE_FIELDS)}
+		).to_list(length=None)
+		return [
+			entry for bucket in buckets for entry in bucket.get("expenses", [])
+			if keys.intersection(entry.get("dup_keys", ()))
+		]
+
+	async def update(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		expense_id: str,
+		fields: Dict[str, Any]
+	) -> Optional[dict]:
+		for _ in range(_BUCKET_WRITE_RETRIES):
+			found = await self._find_entry(db, user_id, expense_id)
+			if not found:
+				return None
+			bucket, old = found
+			# An edited expense is no longer treated as a duplicate
+			new = {key: value for key, value in old.items() if key != "duplicate_of"}
+			new.update(fields)
+			guard = {"_id": bucket["_id"], "expenses": {"$elemMatch": _entry_guard(old)}}
+
+			if _month(new) == bucket["month"]:
+				result = await self._buckets(db).update_one(guard, {
+					"$set": {f"expenses.$.{key}": value for key, value in fields.items()},
+					"$unset": {"expenses.$.duplicate_of": ""},
+					"$inc": _totals_inc([new], inc=_totals_inc([old], -1)),
+					"$max": {"updated_at": new["updated_at"]}
+				})
+				if result.matched_count:
+					return entry_row(new)
+				continue
+
+			await self.insert_many(db, [{**new, "user_id": ObjectId(user_id)}])
+			result = await self._buckets(db).update_one(guard, {
+				"$pull": {"expenses": {"_id": old["_id"]}},
+				"$inc": _totals_inc([old], -1, inc={"count": -1})
+			})
+			if result.matched_count:
+				await self._drop_if_empty(db, bucket["_id"])
+				return entry_row(new)
+			# Changed concurrently: take our copy back out and start over
+			await self._buckets(db).update_one(
+				{"user_id": ObjectId(user_id), "month": _month(new), "expenses": {"$elemMatch": _entry_guard(new)}},
+				{"$pull": {"expenses": {"_id": new["_id"], "updated_at": new["updated_at"]}},
+				 "$inc": _totals_inc([new], -1, inc={"count": -1})}
+			)
+		raise RuntimeError(f"Expense {expense_id} kept changing during update")
+
+	async def delete(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> bool:
+		for _ in range(_BUCKET_WRITE_RETRIES):
+			found = await self._find_entry(db, user_id, expense_id)
+			if not found:
+				return False
+			bucket, old = found
+			result = await self._buckets(db).update_one(
+				{"_id": bucket["_id"], "expenses": {"$elemMatch": _entry_guard(old)}},
+				{
+					"$pull": {"expenses": {"_id": old["_id"]}},
+					"$inc": _totals_inc([old], -1, inc={"count": -1})
+				}
+			)
+			if result.matched_count:
+				await self._drop_if_empty(db, bucket["_id"])
+				return True
+		raise RuntimeError(f"Expense {expense_id} kept changing during delete")
+
+	async def promote_duplicates(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		original_id: str,
+		now: datetime
+	) -> List[dict]:
+		original = ObjectId(original_id)
+		buckets = await self._buckets(db).find(
+			{"user_id": ObjectId(user_id), "expenses.duplicate_of": original}, {"expenses": 1}
+		).to_list(length=None)
+		duplicates = sorted(
+			(
+				(bucket["_id"], entry) for bucket in buckets for entry in bucket.get("expenses", [])
+				if entry.get("duplicate_of") == original
+			),
+			key=lambda item: (item[1].get("created_at") or datetime.min, item[1]["_id"])
+		)
+
+		changed: List[dict] = []
+		promoted: Optional[ObjectId] = None
+		for bucket_id, old in duplicates:
+			for _ in range(_BUCKET_WRITE_RETRIES):
+				new = {key: value for key, value in old.items() if key != "duplicate_of"}
+				new["updated_at"] = now
+				update: Dict[str, Any] = {"$set": {"expenses.$.updated_at": now}, "$max": {"updated_at": now}}
+				if promoted is None:
+					update["$unset"] = {"expenses.$.duplicate_of": ""}
+					update["$inc"] = _totals_inc([new])
+				else:
+					new["duplicate_of"] = update["$set"]["expenses.$.duplicate_of"] = promoted
+				result = await self._buckets(db).update_one(
+					{"_id": bucket_id, "expenses": {"$elemMatch": _entry_guard(old)}}, update
+				)
+				if result.matched_count:
+					promoted = promoted or old["_id"]
+					changed.append(entry_row(new))
+					break
+				# Changed meanwhile: re-read it, and leave it alone once it is no longer this duplicate
+				found = await self._find_entry(db, user_id, str(old["_id"]))
+				if not found or found[1].get("duplicate_of") != original:
+					break
+				(bucket, old) = found
+				bucket_id = bucket["_id"]
+		return changed
+
+	async def _drop_if_empty(self, db: AsyncIOMotorDatabase, bucket_id: ObjectId) -> None:
+		# A concurrent insert either lands before (count > 0) or upserts a fresh bucket
+		await self._buckets(db).delete_one({"_id": bucket_id, "count": {"$lte": 0}})
+
+	async def set_classifications(
+		self,
+		db: AsyncIOMotorDatabase,
+		results: List[Tuple[ObjectId, ObjectId, str, str, float]],
+		now: datetime
+	) -> List[Tuple[str, dict]]:
+		wanted = {
+			expense_id: (description, category, probability)
+			for expense_id, _, description, category, probability in results
+		}
+		buckets = await self._buckets(db).find(
+			{
+				"user_id": {"$in": sorted({user_id for _, user_id, _, _, _ in results})},
+				"expenses._id": {"$in": list(wanted)}
+			},
+			{"user_id": 1, "expenses": 1}
+		).to_list(length=None)
+
+		updated = []
+		for bucket in buckets:
+			for old in bucket["expenses"]:
+				if old["_id"] not in wanted:
+					continue
+				description, category, probability = wanted[old["_id"]]
+				# A later edit or user-chosen category always wins
+				if old["category"] != PENDING_CATEGORY or old["description"] != description:
+					continue
+				new = {**old, "category": category, "probability": probability, "updated_at": now}
+				update = {
+					"$set": {
+						"expenses.$.category": category,
+						"expenses.$.probability": probability,
+						"expenses.$.updated_at": now
+					},
+					"$max": {"updated_at": now}
+				}
+				# Duplicates are not in the totals
+				inc = _totals_inc([new], inc=_totals_inc([old], -1))
+				if inc:
+					update["$inc"] = inc
+				result = await self._buckets(db).update_one(
+					{"_id": bucket["_id"], "expenses": {"$elemMatch": {**_entry_guard(old), "description": description}}},
+					update
+				)
+				if result.matched_count:
+					updated.append((str(bucket["user_id"]), entry_row(new)))
+		return updated
+
+	async def pending_expenses(self, db: AsyncIOMotorDatabase) -> List[dict]:
+		buckets = await self._buckets(db).find(
+			{"expenses.category": PENDING_CATEGORY},
+			{"user_id": 1, "expenses._id": 1, "expenses.description": 1, "expenses.category": 1}
+		).to_list(length=None)
+		return [
+			{"_id": entry["_id"], "user_id": bucket["user_id"], "description": entry["description"]}
+			for bucket in buckets for entry in bucket["expenses"]
+			if entry.get("category") == PENDING_CATEGORY
+		]
+
+	async def category_totals(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[List[dict]]:
+		buckets = await self._buckets(db).find({"user_id": ObjectId(user_id)}, {"totals": 1}).to_list(length=None)
+		totals: Dict[str, Dict[str, float]] = {}
+		for bucket in buckets:
+			for key, values in (bucket.get("totals") or {}).items():
+				total = totals.setdefault(category_from_key(key), {"amount": 0.0, "count": 0})
+				total["amount"] += values.get("amount", 0)
+				total["count"] += values.get("count", 0)
+		stats = [
+			{"category": category, "total_amount": values["amount"], "count": values["count"]}
+			for category, values in totals.items() if values["count"] > 0
+		]
+		return sorted(stats, key=lambda s: s["total_amount"], reverse=True)
+
+	# Migration helpers (see app.migrate_layout)
+
+	async def user_ids(self, db: AsyncIOMotorDatabase) -> List[ObjectId]:
+		return await self._buckets(db).distinct("user_id")
+
+	async def export_user(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> List[dict]:
+		buckets = await self._buckets(db).find({"user_id": user_id}, {"expenses": 1}).to_list(length=None)
+		return [{**entry, "user_id": user_id} for bucket in buckets for entry in bucket.get("expenses", [])]
+
+	async def replace_user(self, db: AsyncIOMotorDatabase, user_id: ObjectId, docs: List[dict]) -> None:
+		await self.delete_user(db, user_id)
+		if docs:
+			await self.insert_many(db, docs)
+
+	async def delete_user(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> None:
+		await self._buckets(db).delete_many({"user_id": user_id})
+
+	async def count(self, db: AsyncIOMotorDatabase, user_id: ObjectId) -> int:
+		buckets = await self._buckets(db).find({"user_id": user_id}, {"count": 1}).to_list(length=None)
+		return sum(bucket.get("count", 0) for bucket in buckets)
+
+	# Archival helpers (see app.services.archive); cutoffs are month-aligned, so whole buckets move
+
+	async def export_before(self, db: AsyncIOMotorDatabase, user_id: ObjectId, cutoff: str) -> List[Tuple[Any, List[dict]]]:
+		buckets = await self._buckets(db).find({"user_id": user_id, "month": {"$lt": cutoff[:7]}}).to_list(length=None)
+		return [
+			(
+				{"_id": bucket["_id"], "count": bucket.get("count"), "updated_at": bucket.get("updated_at")},
+				[{**entry, "user_id": user_id} for entry in bucket.get("expenses", [])]
+			)
+			for bucket in buckets
+		]
+
+	async def remove_exported(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: ObjectId,
+		handle: Any,
+		docs: List[dict]
+	) -> List[ObjectId]:
+		# Any write to the bucket since the export changes its count or updated_at
+		result = await self._buckets(db).delete_one(handle)
+		return [] if result.deleted_count else [doc["_id"] for doc in docs]
+
+
+LAYOUTS = {layout.name: layout for layout in (DocumentLayout(), BucketLayout())}
+
+
+def get_expense_layout(name: str = EXPENSE_LAYOUT):
+	"""Layout instance for a name from LAYOUTS."""
+	try:
+		return LAYOUTS[name]
+	except KeyError:
+		raise ValueError(f"Unknown expense layout {name!r}; expected one of {', '.join(LAYOUTS)}") from None
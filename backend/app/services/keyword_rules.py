@@ -0,0 +1,178 @@
+"""
+Keyword rule matching for the classifier's rule tier.
+
+KeywordMatcher compiles a keyword -> category table into an Aho-Corasick
+automaton, so every keyword is found in a single left-to-right scan of the
+description no matter how large the table is. Matches only count on word
+boundaries ("rent" matches "monthly rent" but not "parent" or "rental").
+
+The default table holds unambiguous merchants and keywords. Replace it with
+CLASSIFIER_RULES_PATH pointing to a JSON object of {"keyword": "Category"}.
+"""
+import json
+import os
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+CLASSIFIER_RULES_PATH = os.getenv("CLASSIFIER_RULES_PATH")
+
+DEFAULT_KEYWORD_RULES = {
+	# Transportation
+	"uber": "Transportation",
+	"lyft": "Transportation",
+	"chevron": "Transportation",
+	"exxon": "Transportation",
+	"metrocard": "Transportation",
+	# Food
+	"uber eats": "Food",
+	"ubereats": "Food",
+	"doordash": "Food",
+	"grubhub": "Food",
+	"starbucks": "Food",
+	"mcdonalds": "Food",
+	"chipotle": "Food",
+	"whole foods": "Food",
+	"trader joes": "Food",
+	# Entertainment
+	"netflix": "Entertainment",
+	"spotify": "Entertainment",
+	"hulu": "Entertainment",
+	"disney+": "Entertainment",
+	"hbo max": "Entertainment",
+	"steam": "Entertainment",
+	# Rent
+	"rent": "Rent",
+	"landlord": "Rent",
+	# Travel
+	"airbnb": "Travel",
+	"expedia": "Travel",
+	"booking.com": "Travel",
+	"marriott": "Travel",
+	"hilton": "Travel",
+	# Shopping
+	"amazon": "Shopping",
+	"ebay": "Shopping",
+	"ikea": "Shopping",
+	# Utilities
+	"comcast": "Utilities",
+	"verizon": "Utilities",
+	"xfinity": "Utilities",
+	"pg&e": "Utilities",
+	# Healthcare
+	"cvs": "Healthcare",
+	"walgreens": "Healthcare",
+	"dentist": "Healthcare",
+}
+
+
+def _is_word_char(char: str) -> bool:
+	return char.isalnum()
+
+
+class KeywordMatcher:
+	"""Aho-Corasick automaton over a keyword -> category table."""
+
+	def __init__(self, rules: Dict[str, str]):
+		self.keywords: List[str] = []
+		self.categories: List[str] = []
+		# Trie as per-state transition dicts; state 0 is the root
+		self._goto: List[Dict[str, int]] = [{}]
+		self._fail: List[int] = [0]
+		self._output: List[List[int]] = [[]]
+
+		for keyword, category in rules.items():
+			keyword = " ".join(keyword.lower().split())
+			if not keyword:
+				continue
+			self._add(keyword, len(self.keywords))
+			self.keywords.append(keyword)
+			self.categories.append(category)
+		self._build_failure_links()
+
+	def _add(self, keyword: str, index: int) -> None:
+		state = 0
+		for char in keyword:
+			next_state = self._goto[state].get(char)
+			if next_state is None:
+				next_state = len(self._goto)
+				self._goto.append({})
+				self._fail.append(0)
+				self._output.append([])
+				self._goto[state][char] = next_state
+			state = next_state
+		self._output[state].append(index)
+
+	def _build_failure_links(self) -> None:
+		queue = deque(self._goto[0].values())
+		while queue:
+			state = queue.popleft()
+			for char, next_state in self._goto[state].items():
+				queue.append(next_state)
+				fallback = self._fail[state]
+				while fallback and char not in self._goto[fallback]:
+					fallback = self._fail[fallback]
+				self._fail[next_state] = self._goto[fallback].get(char, 0)
+				# Keywords ending at the fallback state also end here
+				self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+	def find(self, text: str) -> List[Tuple[int, int, int]]:
+		"""
+		Find every keyword occurrence on word boundaries.
+
+		Args:
+			text: Lowercased, whitespace-normalized description
+
+		Returns:
+			List of (start, end, keyword_index) in scan order
+		"""
+		matches = []
+		state = 0
+		for position, char in enumerate(text):
+			while state and char not in self._goto[state]:
+				state = self._fail[state]
+			state = self._goto[state].get(char, 0)
+			for index in self._output[state]:
+				end = position + 1
+				start = end - len(self.keywords[index])
+				if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+					continue
+				if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+					continue
+				matches.append((start, end, index))
+		return matches
+
+	def match(self, text: str) -> Tuple[Optional[str], bool]:
+		"""
+		Resolve the category implied by the keywords in a description.
+
+		A match inside a longer match is ignored ("uber" within "uber eats").
+
+		Returns:
+			(category, ambiguous): category is None when nothing matched or the
+			remaining matches disagree, in which case ambiguous is True
+		"""
+		matches = self.find(text)
+		if not matches:
+			return None, False
+		categories = {
+			self.categories[index]
+			for start, end, index in matches
+			if not any(
+				other_start <= start and end <= other_end and (other_end - other_start) > (end - start)
+				for other_start, other_end, _ in matches
+			)
+		}
+		if len(categories) == 1:
+			return categories.pop(), False
+		return None, True
+
+
+def load_keyword_rules(path: Optional[str] = CLASSIFIER_RULES_PATH) -> Dict[str, str]:
+	"""Keyword table from CLASSIFIER_RULES_PATH, or the built-in default."""
+	if not path:
+		return dict(DEFAULT_KEYWORD_RULES)
+	with open(path) as f:
+		rules = json.load(f)
+	if not isinstance(rules, dict):
+		raise ValueError(f"{path} must contain a JSON object of keyword -> category")
+	return {str(keyword): str(category) for keyword, category in rules.items()}
@@ -0,0 +1,196 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters and histograms are plain dicts keyed by label tuples. Updates happen
+on the event loop thread without taking a lock; the rare lost increment from a
+worker thread racing the loop is an acceptable price for a lock-free hot path.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow Mongo calls
+DEFAULT_BUCKETS = (
+	0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+	0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+	"""Escape a label value for the Prometheus text format."""
+	return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+	pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+	type_name = ""
+
+	def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = tuple(labelnames)
+		_registry.append(self)
+
+	def render(self) -> List[str]:
+		lines = [
+			f"# HELP {self.name} {self.documentation}",
+			f"# TYPE {self.name} {self.type_name}",
+		]
+		lines.extend(self._samples())
+		return lines
+
+	def _samples(self) -> List[str]:
+		raise NotImplementedError
+
+
+class Counter(_Metric):
+	"""Monotonically increasing counter."""
+
+	type_name = "counter"
+
+	def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, documentation, labelnames)
+		self._values: Dict[Tuple[str, ...], float] = {}
+
+	def inc(self, *labels: str, amount: float = 1.0) -> None:
+		values = self._values
+		values[labels] = values.get(labels, 0.0) + amount
+
+	def value(self, *labels: str) -> float:
+		return self._values.get(labels, 0.0)
+
+	def _samples(self) -> List[str]:
+		return [
+			f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+			for labels, value in list(self._values.items())
+		]
+
+
+class Gauge(Counter):
+	"""Value that can go up and down."""
+
+	type_name = "gauge"
+
+	def set(self, *labels: str, value: float) -> None:
+		self._values[labels] = value
+
+
+class _HistogramSeries:
+	__slots__ = ("bucket_counts", "total", "count")
+
+	def __init__(self, size: int):
+		self.bucket_counts = [0] * size
+		self.total = 0.0
+		self.count = 0
+
+
+class Histogram(_Metric):
+	"""Histogram with fixed upper bounds; bucket counts are made cumulative on render."""
+
+	type_name = "histogram"
+
+	def __init__(
+		self,
+		name: str,
+		documentation: str,
+		labelnames: Sequence[str] = (),
+		buckets: Sequence[float] = DEFAULT_BUCKETS
+	):
+		super().__init__(name, documentation, labelnames)
+		self.buckets = tuple(buckets)
+		self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+
+	def observe(self, value: float, *labels: str) -> None:
+		series = self._series.get(labels)
+		if series is None:
+			series = self._series.setdefault(labels, _HistogramSeries(len(self.buckets) + 1))
+		series.bucket_counts[bisect_left(self.buckets, value)] += 1
+		series.total += value
+		series.count += 1
+
+	def _samples(self) -> List[str]:
+		lines = []
+		for labels, series in list(self._series.items()):
+			cumulative = 0
+			for bound, bucket_count in zip(self.buckets + (float("inf"),), series.bucket_counts):
+				cumulative += bucket_count
+				le = "+Inf" if bound == float("inf") else repr(bound)
+				le_label = f'le="{le}"'
+				lines.append(
+					f"{self.name}_bucket{_format_labels(self.labelnames, labels, le_label)} {cumulative}"
+				)
+			label_str = _format_labels(self.labelnames, labels)
+			lines.append(f"{self.name}_sum{label_str} {series.total}")
+			lines.append(f"{self.name}_count{label_str} {series.count}")
+		return lines
+
+
+@contextmanager
+def timed(histogram: Histogram, *labels: str) -> Iterator[None]:
+	"""Observe the wall time of the enclosed block in seconds."""
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		histogram.observe(time.perf_counter() - start, *labels)
+
+
+def track_mongo(operation: str):
+	"""Decorator that records the latency of an async storage function."""
+	def decorator(func):
+		@wraps(func)
+		async def wrapper(*args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return await func(*args, **kwargs)
+			finally:
+				MONGO_LATENCY.observe(time.perf_counter() - start, operation)
+		return wrapper
+	return decorator
+
+
+def render_prometheus() -> str:
+	"""Render every registered metric in the Prometheus text exposition format."""
+	lines: List[str] = []
+	for metric in _registry:
+		lines.extend(metric.render())
+	return "\n".join(lines) + "\n"
+
+
+# Core application metrics
+REQUEST_COUNT = Counter(
+	"http_requests_total",
+	"Total HTTP requests by method, route template and status code.",
+	("method", "route", "status")
+)
+REQUEST_LATENCY = Histogram(
+	"http_request_duration_seconds",
+	"HTTP request latency by method, route template and status code.",
+	("method", "route", "status")
+)
+CLASSIFIER_LATENCY = Histogram(
+	"classifier_inference_seconds",
+	"Time spent in expense classifier inference.",
+	("operation",)
+)
+BCRYPT_LATENCY = Histogram(
+	"bcrypt_seconds",
+	"Time spent hashing or verifying passwords with bcrypt.",
+	("operation",),
+	buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+)
+MONGO_LATENCY = Histogram(
+	"mongo_operation_seconds",
+	"Latency of storage operations against MongoDB.",
+	("operation",)
+)
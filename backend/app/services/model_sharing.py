@@ -0,0 +1,220 @@
+"""
+Shared-memory model serving for multi-worker deployments.
+
+The supervisor (app.serve) trains the classifier once and publishes its
+weights into a single multiprocessing.shared_memory block:
+
+	[8-byte header length][JSON header][padding][idf][coef][intercept]
+
+The JSON header holds the vocabulary, stop words, n-gram range, class names
+and the offset/shape/dtype of each array. Workers attach to the block by name
+and wrap the arrays in read-only NumPy views, so the weights exist once no
+matter how many workers run. Workers also skip training and never import
+sklearn: SharedExpenseClassifier re-implements the word analyzer, TF-IDF
+transform and logistic-regression scoring with NumPy and produces the same
+output as the fitted pipeline.
+"""
+import json
+import math
+import os
+import re
+import struct
+from collections import Counter as TermCounter
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.metrics import CLASSIFIER_LATENCY, timed
+
+# Environment variable the supervisor uses to hand the block name to workers
+MODEL_SHM_ENV = "PENNYWISE_MODEL_SHM"
+
+_HEADER_LEN = struct.Struct("<Q")
+_ALIGN = 64
+
+
+def _aligned(offset: int) -> int:
+	return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _export_weights(classifier) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+	"""Pull vectorizer settings and model arrays out of a fitted ExpenseClassifier."""
+	tfidf = classifier.pipeline.named_steps.get("tfidf")
+	model = classifier.pipeline.named_steps.get("classifier")
+	if tfidf is None or model is None or not hasattr(model, "coef_"):
+		raise ValueError("Only TF-IDF + linear classifier pipelines can be shared")
+	if tfidf.analyzer != "word" or tfidf.tokenizer is not None or tfidf.preprocessor is not None:
+		raise ValueError("Only the default word analyzer can be shared")
+	if tfidf.strip_accents is not None or tfidf.sublinear_tf or tfidf.norm not in ("l2", None):
+		raise ValueError("Unsupported TF-IDF options for shared serving")
+
+	classes = [str(c) for c in model.classes_]
+	multi_class = getattr(model, "multi_class", "auto")
+	# Mirrors LogisticRegression.predict_proba's choice between softmax and OvR
+	ovr = multi_class in ("ovr", "warn") or (
+		multi_class in ("auto", "deprecated")
+		and (len(classes) <= 2 or getattr(model, "solver", "lbfgs") == "liblinear")
+	)
+	stop_words = tfidf.get_stop_words()
+	meta = {
+		"vocabulary": {term: int(idx) for term, idx in tfidf.vocabulary_.items()},
+		"stop_words": sorted(stop_words) if stop_words else [],
+		"token_pattern": tfidf.token_pattern,
+		"lowercase": bool(tfidf.lowercase),
+		"ngram_range": list(tfidf.ngram_range),
+		"norm": tfidf.norm,
+		"use_idf": bool(tfidf.use_idf),
+		"classes": classes,
+		"ovr": bool(ovr),
+	}
+	arrays = {
+		"idf": np.ascontiguousarray(tfidf.idf_ if tfidf.use_idf else np.ones(len(meta["vocabulary"])), dtype=np.float64),
+		"coef": np.ascontiguousarray(model.coef_, dtype=np.float64),
+		"intercept": np.ascontiguousarray(model.intercept_, dtype=np.float64),
+	}
+	return meta, arrays
+
+
+def publish_model(classifier, name: Optional[str] = None) -> shared_memory.SharedMemory:
+	"""
+	Copy a fitted classifier's weights into a new shared memory block.
+
+	The caller owns the block and must close() and unlink() it on shutdown.
+	"""
+	meta, arrays = _export_weights(classifier)
+
+	# Lay the arrays out after the header, each aligned to a cache line
+	layout = {}
+	header_bytes = b""
+	for _ in range(2):
+		# The header size depends on the offsets and vice versa; two passes settle it
+		offset = _aligned(_HEADER_LEN.size + len(header_bytes) + 256)
+		for key, array in arrays.items():
+			layout[key] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+			offset = _aligned(offset + array.nbytes)
+		header_bytes = json.dumps({**meta, "arrays": layout}).encode("utf-8")
+	total_size = offset
+	if _HEADER_LEN.size + len(header_bytes) > min(spec["offset"] for spec in layout.values()):
+		raise ValueError("Shared model header overlaps the weight arrays")
+
+	shm = shared_memory.SharedMemory(name=name, create=True, size=total_size)
+	_HEADER_LEN.pack_into(shm.buf, 0, len(header_bytes))
+	shm.buf[_HEADER_LEN.size:_HEADER_LEN.size + len(header_bytes)] = header_bytes
+	for key, array in arrays.items():
+		view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=layout[key]["offset"])
+		view[...] = array
+	return shm
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+	"""Attach to an existing block without letting this process's tracker unlink it."""
+	try:
+		return shared_memory.SharedMemory(name=name, track=False)
+	except TypeError:
+		# Python < 3.13 always registers attached blocks with the resource tracker
+		shm = shared_memory.SharedMemory(name=name)
+		resource_tracker.unregister(shm._name, "shared_memory")
+		return shm
+
+
+class SharedExpenseClassifier:
+	"""
+	Read-only classifier backed by weights in shared memory.
+
+	Exposes the same predict/predict_batch interface as ExpenseClassifier.
+	"""
+
+	def __init__(self, shm_name: str):
+		from app.services.classifier import ExpenseClassifier
+
+		self.CATEGORIES = ExpenseClassifier.CATEGORIES
+		self._shm = _attach(shm_name)
+		buf = self._shm.buf
+		(header_len,) = _HEADER_LEN.unpack_from(buf, 0)
+		meta = json.loads(bytes(buf[_HEADER_LEN.size:_HEADER_LEN.size + header_len]).decode("utf-8"))
+
+		self.vocabulary: Dict[str, int] = meta["vocabulary"]
+		self.classes: List[str] = meta["classes"]
+		self._stop_words = frozenset(meta["stop_words"])
+		self._token_pattern = re.compile(meta["token_pattern"])
+		self._lowercase = meta["lowercase"]
+		self._min_n, self._max_n = meta["ngram_range"]
+		self._norm = meta["norm"]
+		self._ovr = meta["ovr"]
+
+		arrays = {}
+		for key, spec in meta["arrays"].items():
+			view = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buf, offset=spec["offset"])
+			view.flags.writeable = False
+			arrays[key] = view
+		self.idf = arrays["idf"]
+		self.coef = arrays["coef"]
+		self.intercept = arrays["intercept"]
+
+	def _analyze(self, text: str) -> List[str]:
+		"""Same tokens as TfidfVectorizer's default word analyzer."""
+		if self._lowercase:
+			text = text.lower()
+		tokens = [t for t in self._token_pattern.findall(text) if t not in self._stop_words]
+		if self._max_n == 1:
+			return tokens
+		grams = list(tokens) if self._min_n == 1 else []
+		for n in range(max(self._min_n, 2), self._max_n + 1):
+			for i in range(len(tokens) - n + 1):
+				grams.append(" ".join(tokens[i:i + n]))
+		return grams
+
+	def transform(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+		"""TF-IDF vector of a cleaned description as (feature indices, weights)."""
+		counts = TermCounter(
+			self.vocabulary[gram] for gram in self._analyze(text) if gram in self.vocabulary
+		)
+		if not counts:
+			return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+		indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+		weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[indices]
+		if self._norm == "l2":
+			weights /= math.sqrt(float(weights @ weights))
+		return indices, weights
+
+	def _probabilities(self, cleaned: List[str]) -> np.ndarray:
+		scores = np.tile(self.intercept, (len(cleaned), 1))
+		for row, text in enumerate(cleaned):
+			indices, weights = self.transform(text)
+			if len(indices):
+				scores[row] += self.coef[:, indices] @ weights
+		if self._ovr:
+			if scores.shape[1] == 1:
+				positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+				return np.column_stack([1.0 - positive, positive])
+			probabilities = 1.0 / (1.0 + np.exp(-scores))
+			return probabilities / probabilities.sum(axis=1, keepdims=True)
+		scores -= scores.max(axis=1, keepdims=True)
+		np.exp(scores, out=scores)
+		return scores / scores.sum(axis=1, keepdims=True)
+
+	def predict(self, description: str) -> Tuple[str, float, List[str]]:
+		"""Predict category for expense description (see ExpenseClassifier.predict)."""
+		return self.predict_batch([description])[0]
+
+	def predict_batch(self, descriptions: List[str]) -> List[Tuple[str, float, List[str]]]:
+		"""Predict categories for many descriptions (see ExpenseClassifier.predict_batch)."""
+		from app.services.classifier import ExpenseClassifier
+
+		if not descriptions:
+			return []
+		cleaned = [ExpenseClassifier._clean_text(description) for description in descriptions]
+		with timed(CLASSIFIER_LATENCY, "predict" if len(cleaned) == 1 else "predict_batch"):
+			probabilities = self._probabilities(cleaned)
+		top_indices = probabilities.argsort(axis=1)[:, -3:][:, ::-1]
+		return [
+			(self.classes[indices[0]], float(row[indices[0]]), [self.classes[idx] for idx in indices])
+			for row, indices in zip(probabilities, top_indices)
+		]
+
+	def close(self) -> None:
+		self._shm.close()
+
+
+def shared_model_name() -> Optional[str]:
+	"""Name of the block published by the supervisor, if running under app.serve."""
+	return os.getenv(MODEL_SHM_ENV) or None
@@ -0,0 +1,315 @@
+"""
+MongoDB command monitoring.
+
+A pymongo CommandListener that records the duration of every command, groups
+commands by normalized query shape (filter/sort with values replaced by "?"),
+and keeps a bounded log of operations slower than MONGO_SLOW_MS. Optionally
+captures explain() output for slow shapes so unindexed queries and in-memory
+sorts are visible without attaching a profiler to the server.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from pymongo import monitoring
+from app.services.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Operations slower than this are logged and kept in the slow-operation log
+MONGO_SLOW_MS = float(os.getenv("MONGO_SLOW_MS", "100"))
+# Automatically run explain() the first time a shape exceeds the threshold
+MONGO_EXPLAIN_SLOW = os.getenv("MONGO_EXPLAIN_SLOW", "false").lower() == "true"
+MONGO_SLOW_LOG_SIZE = int(os.getenv("MONGO_SLOW_LOG_SIZE", "200"))
+
+MONGO_COMMAND_LATENCY = Histogram(
+	"mongo_command_seconds",
+	"Server round-trip time of MongoDB commands as seen by the driver.",
+	("command", "collection")
+)
+MONGO_SLOW_COMMANDS = Counter(
+	"mongo_slow_commands_total",
+	"MongoDB commands slower than MONGO_SLOW_MS.",
+	("command", "collection")
+)
+MONGO_FAILED_COMMANDS = Counter(
+	"mongo_failed_commands_total",
+	"MongoDB commands that returned an error.",
+	("command", "collection")
+)
+
+# Commands we build shapes for; handshakes, heartbeats and explains are ignored
+_MONITORED_COMMANDS = {
+	"find", "aggregate", "count", "distinct", "getMore", "insert",
+	"update", "delete", "findAndModify", "createIndexes"
+}
+_EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify"}
+
+
+def normalize_shape(value: Any) -> Any:
+	"""Replace literal values with "?" while keeping field names and operators."""
+	if isinstance(value, dict):
+		return {key: normalize_shape(item) for key, item in value.items()}
+	if isinstance(value, (list, tuple)):
+		# Logical operators hold sub-queries; other arrays are literal values
+		if value and all(isinstance(item, dict) for item in value):
+			return [normalize_shape(item) for item in value]
+		return "?"
+	return "?"
+
+
+def _extract_query(command_name: str, command: dict) -> Dict[str, Any]:
+	"""Pull the filter, sort and pipeline out of a raw command document."""
+	if command_name == "find":
+		return {"filter": command.get("filter", {}), "sort": command.get("sort")}
+	if command_name == "aggregate":
+		return {"pipeline": command.get("pipeline", [])}
+	if command_name in ("count", "distinct", "findAndModify"):
+		return {"filter": command.get("query", {}), "sort": command.get("sort")}
+	if command_name == "update":
+		updates = command.get("updates") or [{}]
+		return {"filter": updates[0].get("q", {})}
+	if command_name == "delete":
+		deletes = command.get("deletes") or [{}]
+		return {"filter": deletes[0].get("q", {})}
+	return {}
+
+
+def _dumps(value: Any) -> str:
+	return json.dumps(value, default=str, sort_keys=False)
+
+
+class _ShapeStats:
+	__slots__ = (
+		"command", "collection", "database", "shape", "count", "total_ms",
+		"max_ms", "slow_count", "sample", "explain"
+	)
+
+	def __init__(self, command: str, collection: str, database: str, shape: Dict[str, Any]):
+		self.command = command
+		self.collection = collection
+		self.database = database
+		self.shape = shape
+		self.count = 0
+		self.total_ms = 0.0
+		self.max_ms = 0.0
+		self.slow_count = 0
+		self.sample: Dict[str, Any] = {}
+		self.explain: Optional[Dict[str, Any]] = None
+
+	def to_dict(self) -> Dict[str, Any]:
+		return {
+			"command": self.command,
+			"collection": self.collection,
+			"shape": self.shape,
+			"count": self.count,
+			"total_ms": round(self.total_ms, 3),
+			"avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+			"max_ms": round(self.max_ms, 3),
+			"slow_count": self.slow_count,
+			"explain": self.explain,
+		}
+
+
+class MongoCommandMonitor(monitoring.CommandListener):
+	"""
+	Records per-command and per-shape timings.
+
+	Callbacks run on the driver's executor threads, so the started/finished
+	bookkeeping only uses atomic dict operations and shape aggregation takes a
+	short lock.
+	"""
+
+	def __init__(self, slow_ms: float = MONGO_SLOW_MS, explain_slow: bool = MONGO_EXPLAIN_SLOW):
+		self.slow_ms = slow_ms
+		self.explain_slow = explain_slow
+		self._pending: Dict[Any, tuple] = {}
+		self._shapes: Dict[str, _ShapeStats] = {}
+		self._slow_log: deque = deque(maxlen=MONGO_SLOW_LOG_SIZE)
+		self._lock = threading.Lock()
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+		self._client = None
+
+	def bind(self, client, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+		"""Attach the Motor client and event loop used for automatic explains."""
+		self._client = client
+		self._loop = loop
+
+	# CommandListener interface
+
+	def started(self, event: monitoring.CommandStartedEvent) -> None:
+		command_name = event.command_name
+		if command_name not in _MONITORED_COMMANDS:
+			return
+		command = event.command
+		collection = command.get(command_name)
+		if command_name == "getMore":
+			collection = command.get("collection")
+		query = _extract_query(command_name, command)
+		self._pending[(event.connection_id, event.request_id)] = (
+			command_name, str(collection), event.database_name, query
+		)
+
+	def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+		self._finish(event, failed=False)
+
+	def failed(self, event: monitoring.CommandFailedEvent) -> None:
+		self._finish(event, failed=True)
+
+	def _finish(self, event, failed: bool) -> None:
+		pending = self._pending.pop((event.connection_id, event.request_id), None)
+		if pending is None:
+			return
+		command_name, collection, database, query = pending
+		duration_ms = event.duration_micros / 1000.0
+		MONGO_COMMAND_LATENCY.observe(duration_ms / 1000.0, command_name, collection)
+		if failed:
+			MONGO_FAILED_COMMANDS.inc(command_name, collection)
+
+		# Sort specs are structural (field and direction), so they are kept verbatim
+		shape = {
+			key: value if key == "sort" else normalize_shape(value)
+			for key, value in query.items() if value is not None
+		}
+		key = f"{database}.{collection}.{command_name} {_dumps(shape)}"
+		is_slow = duration_ms >= self.slow_ms
+
+		with self._lock:
+			stats = self._shapes.get(key)
+			if stats is None:
+				stats = self._shapes[key] = _ShapeStats(command_name, collection, database, shape)
+			stats.count += 1
+			stats.total_ms += duration_ms
+			if duration_ms > stats.max_ms:
+				stats.max_ms = duration_ms
+				stats.sample = query
+			if is_slow:
+				stats.slow_count += 1
+			needs_explain = (
+				is_slow and self.explain_slow and stats.explain is None
+				and command_name in _EXPLAINABLE_COMMANDS and self._loop is not None
+			)
+			if needs_explain:
+				stats.explain = {"status": "pending"}
+
+		if is_slow:
+			MONGO_SLOW_COMMANDS.inc(command_name, collection)
+			entry = {
+				"at": time.time(),
+				"command": command_name,
+				"collection": collection,
+				"duration_ms": round(duration_ms, 3),
+				"filter": query.get("filter"),
+				"sort": query.get("sort"),
+				"pipeline": query.get("pipeline"),
+				"failed": failed,
+			}
+			self._slow_log.append(entry)
+			logger.warning(
+				"Slow MongoDB %s on %s took %.1fms filter=%s sort=%s",
+				command_name, collection, duration_ms,
+				_dumps(query.get("filter") or query.get("pipeline")), _dumps(query.get("sort"))
+			)
+			if needs_explain:
+				self._loop.call_soon_threadsafe(
+					lambda: self._loop.create_task(self.explain_shape(key))
+				)
+
+	# Reporting
+
+	async def explain_shape(self, key: str) -> Optional[Dict[str, Any]]:
+		"""Run explain() for the slowest recorded sample of a shape and cache a summary."""
+		stats = self._shapes.get(key)
+		if stats is None or self._client is None or stats.command not in _EXPLAINABLE_COMMANDS:
+			return None
+		sample = stats.sample
+		if stats.command == "aggregate":
+			explained = {"aggregate": stats.collection, "pipeline": sample.get("pipeline", []), "cursor": {}}
+		elif stats.command == "find":
+			explained = {"find": stats.collection, "filter": sample.get("filter", {})}
+			if sample.get("sort"):
+				explained["sort"] = sample["sort"]
+		elif stats.command == "findAndModify":
+			# Explaining the equivalent find avoids running the modification
+			explained = {"find": stats.collection, "filter": sample.get("filter", {}), "limit": 1}
+			if sample.get("sort"):
+				explained["sort"] = sample["sort"]
+		else:
+			explained = {stats.command: stats.collection, "query": sample.get("filter", {})}
+		try:
+			result = await self._client[stats.database].command(
+				{"explain": explained, "verbosity": "queryPlanner"}
+			)
+			stats.explain = summarize_explain(result)
+		except Exception as e:
+			stats.explain = {"error": str(e)}
+		return stats.explain
+
+	def report(self, top: int = 20) -> Dict[str, Any]:
+		"""Snapshot of shape statistics (slowest total time first) and the slow log."""
+		with self._lock:
+			shapes = sorted(self._shapes.values(), key=lambda s: s.total_ms, reverse=True)
+			shape_dicts = [s.to_dict() for s in shapes[:top]]
+		report = {
+			"slow_threshold_ms": self.slow_ms,
+			"explain_slow": self.explain_slow,
+			"shapes": shape_dicts,
+			"slow_operations": list(self._slow_log)[::-1],
+		}
+		# Round-trip through JSON so ObjectIds and datetimes in samples become strings
+		return json.loads(_dumps(report))
+
+	def slowest_shape_keys(self, top: int) -> List[str]:
+		with self._lock:
+			ranked = sorted(self._shapes.items(), key=lambda item: item[1].max_ms, reverse=True)
+		return [key for key, stats in ranked if stats.command in _EXPLAINABLE_COMMANDS][:top]
+
+	def reset(self) -> None:
+		with self._lock:
+			self._shapes.clear()
+		self._slow_log.clear()
+
+
+def _collect_stages(plan: Dict[str, Any], stages: List[str], index_names: List[str]) -> None:
+	if not isinstance(plan, dict):
+		return
+	if "stage" in plan:
+		stages.append(plan["stage"])
+	if "indexName" in plan:
+		index_names.append(plan["indexName"])
+	for child_key in ("inputStage", "queryPlan"):
+		if child_key in plan:
+			_collect_stages(plan[child_key], stages, index_names)
+	for child in plan.get("inputStages", []):
+		_collect_stages(child, stages, index_names)
+
+
+def summarize_explain(result: Dict[str, Any]) -> Dict[str, Any]:
+	"""Reduce explain() output to the winning plan's stages and red flags."""
+	planner = result.get("queryPlanner")
+	if planner is None:
+		# Aggregations nest the planner under the first $cursor stage
+		for stage in result.get("stages", []):
+			if "$cursor" in stage:
+				planner = stage["$cursor"].get("queryPlanner")
+				break
+	planner = planner or {}
+	stages: List[str] = []
+	index_names: List[str] = []
+	_collect_stages(planner.get("winningPlan", {}), stages, index_names)
+	return {
+		"namespace": planner.get("namespace"),
+		"stages": stages,
+		"collection_scan": "COLLSCAN" in stages,
+		"in_memory_sort": "SORT" in stages,
+		"index_names": index_names,
+		"winning_plan": planner.get("winningPlan"),
+	}
+
+
+# Process-wide monitor registered on the Motor client by app.database.get_client()
+command_monitor = MongoCommandMonitor()
@@ -0,0 +1,205 @@
+"""
+Opt-in per-request sampling profiler.
+
+A background thread samples the event loop thread's Python stack every
+PROFILE_INTERVAL_MS while at least one profiled request is in flight, and
+aggregates samples into collapsed stacks (the flamegraph.pl / speedscope
+format). Samples taken while several requests interleave on the loop are
+attributed to every active profile, which is what you want when looking for
+what blocked the loop during a spike.
+
+Optionally, tracemalloc snapshots are taken around the request and the top
+allocation sites are stored with the profile. Completed profiles are kept in a
+ring buffer of PROFILE_BUFFER_SIZE entries.
+"""
+import itertools
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Install the profiling middleware at all (when false there is zero overhead)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Fraction of requests profiled at random (0.0 - 1.0)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Header that forces profiling; its value must equal the admin token
+PROFILE_DEBUG_HEADER = os.getenv("PROFILE_DEBUG_HEADER", "x-debug-profile").lower()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "false").lower() == "true"
+PROFILE_TRACEMALLOC_TOP = int(os.getenv("PROFILE_TRACEMALLOC_TOP", "25"))
+
+_MAX_STACK_DEPTH = 128
+
+
+def _collapse(frame) -> str:
+	"""Render a frame chain root-first as a collapsed stack line."""
+	parts = []
+	while frame is not None and len(parts) < _MAX_STACK_DEPTH:
+		code = frame.f_code
+		parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+		frame = frame.f_back
+	parts.reverse()
+	return ";".join(parts)
+
+
+class ProfileSession:
+	"""Samples and allocation data collected for a single request."""
+
+	_ids = itertools.count(1)
+
+	def __init__(self, method: str, path: str, reason: str, trace_allocations: bool):
+		self.id = next(self._ids)
+		self.method = method
+		self.path = path
+		self.reason = reason
+		self.started_at = time.time()
+		self.stacks: Dict[str, int] = {}
+		self.samples = 0
+		self.duration_ms = 0.0
+		self.status: Optional[int] = None
+		self.trace_allocations = trace_allocations
+		self.allocations: List[Dict[str, Any]] = []
+		self._snapshot = None
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"id": self.id,
+			"method": self.method,
+			"path": self.path,
+			"status": self.status,
+			"reason": self.reason,
+			"started_at": self.started_at,
+			"duration_ms": round(self.duration_ms, 3),
+			"samples": self.samples,
+			"interval_ms": PROFILE_INTERVAL_MS,
+			"allocation_sites": len(self.allocations),
+		}
+
+	def to_dict(self) -> Dict[str, Any]:
+		data = self.summary()
+		data["stacks"] = self.stacks
+		data["allocations"] = self.allocations
+		return data
+
+	def collapsed(self) -> str:
+		"""Collapsed stack text, one "frame;frame;frame count" line per stack."""
+		lines = [
+			f"{stack} {count}"
+			for stack, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+		]
+		return "\n".join(lines) + "\n"
+
+
+class _Sampler(threading.Thread):
+	def __init__(self, target_thread_id: int, interval: float):
+		super().__init__(name="request-profiler", daemon=True)
+		self.target_thread_id = target_thread_id
+		self.interval = interval
+		self.sessions: set = set()
+		self.stop_event = threading.Event()
+
+	def run(self) -> None:
+		while not self.stop_event.wait(self.interval):
+			frame = sys._current_frames().get(self.target_thread_id)
+			if frame is None:
+				continue
+			stack = _collapse(frame)
+			for session in list(self.sessions):
+				session.stacks[stack] = session.stacks.get(stack, 0) + 1
+				session.samples += 1
+
+
+class RequestProfiler:
+	"""
+	Starts and stops profile sessions and keeps the most recent ones.
+
+	start()/finish() are called from the event loop thread only, so the
+	sampler thread lifecycle needs no extra synchronization.
+	"""
+
+	def __init__(self, buffer_size: int = PROFILE_BUFFER_SIZE):
+		self.profiles: deque = deque(maxlen=buffer_size)
+		self._sampler: Optional[_Sampler] = None
+		self._tracemalloc_users = 0
+		self._tracemalloc_owner = False
+
+	def should_profile(self, header_value: Optional[str], admin_token: Optional[str]) -> Optional[str]:
+		"""Return the reason a request should be profiled, or None."""
+		if header_value is not None and admin_token and secrets.compare_digest(header_value, admin_token):
+			return "header"
+		if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+			return "sampled"
+		return None
+
+	def start(self, method: str, path: str, reason: str) -> ProfileSession:
+		session = ProfileSession(method, path, reason, PROFILE_TRACEMALLOC)
+		if session.trace_allocations:
+			self._start_tracemalloc()
+			session._snapshot = tracemalloc.take_snapshot()
+		sampler = self._sampler
+		if sampler is None or not sampler.is_alive():
+			sampler = self._sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000.0)
+			sampler.sessions.add(session)
+			sampler.start()
+		else:
+			sampler.sessions.add(session)
+		return session
+
+	def finish(self, session: ProfileSession, status: Optional[int], duration_ms: float) -> None:
+		sampler = self._sampler
+		if sampler is not None:
+			sampler.sessions.discard(session)
+			if not sampler.sessions:
+				sampler.stop_event.set()
+				self._sampler = None
+		session.status = status
+		session.duration_ms = duration_ms
+		if session.trace_allocations and session._snapshot is not None:
+			# Hide the profiler's own bookkeeping from the allocation report
+			ignore = (
+				tracemalloc.Filter(False, __file__),
+				tracemalloc.Filter(False, tracemalloc.__file__),
+			)
+			after = tracemalloc.take_snapshot().filter_traces(ignore)
+			before = session._snapshot.filter_traces(ignore)
+			diff = after.compare_to(before, "lineno")[:PROFILE_TRACEMALLOC_TOP]
+			session.allocations = [
+				{
+					"location": str(stat.traceback),
+					"size_diff_bytes": stat.size_diff,
+					"count_diff": stat.count_diff,
+					"size_bytes": stat.size,
+				}
+				for stat in diff
+			]
+			session._snapshot = None
+			self._stop_tracemalloc()
+		self.profiles.append(session)
+
+	def get(self, profile_id: int) -> Optional[ProfileSession]:
+		for session in self.profiles:
+			if session.id == profile_id:
+				return session
+		return None
+
+	def _start_tracemalloc(self) -> None:
+		if self._tracemalloc_users == 0 and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self._tracemalloc_owner = True
+		self._tracemalloc_users += 1
+
+	def _stop_tracemalloc(self) -> None:
+		self._tracemalloc_users -= 1
+		if self._tracemalloc_users == 0 and self._tracemalloc_owner:
+			tracemalloc.stop()
+			self._tracemalloc_owner = False
+
+
+# Process-wide profiler used by ProfilerMiddleware and the admin endpoints
+request_profiler = RequestProfiler()
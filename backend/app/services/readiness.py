@@ -0,0 +1,97 @@
+"""
+Startup phase tracking for the /ready probe.
+
+Startup work (Mongo ping, index creation, classifier training) runs in the
+background so the process answers /health immediately; /ready only reports
+success once every required phase has finished.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, Optional
+from app.services.metrics import Gauge
+from app.services.storage_backends import storage_backend
+
+STARTUP_PHASE_SECONDS = Gauge(
+	"startup_phase_seconds",
+	"Duration of each startup phase in seconds.",
+	("phase", "status")
+)
+TIME_TO_READY_SECONDS = Gauge(
+	"startup_time_to_ready_seconds",
+	"Seconds from process startup until the app reported ready."
+)
+
+
+class StartupTracker:
+	"""Records the outcome and duration of named startup phases."""
+
+	def __init__(self, required: Iterable[str] = ()):
+		self.required = set(required)
+		self.phases: Dict[str, Dict[str, Any]] = {}
+		self.started_at = time.perf_counter()
+		self.ready_after: Optional[float] = None
+		self._ready_event: Optional[asyncio.Event] = None
+
+	def begin(self) -> None:
+		"""Reset state at the start of application startup."""
+		self.phases = {}
+		self.started_at = time.perf_counter()
+		self.ready_after = None
+		self._ready_event = asyncio.Event()
+
+	@asynccontextmanager
+	async def phase(self, name: str):
+		"""Time a startup phase; exceptions mark it failed and are re-raised."""
+		start = time.perf_counter()
+		self.phases[name] = {"status": "running", "seconds": None}
+		try:
+			yield
+		except BaseException as e:
+			self._finish(name, "failed", start, error=str(e))
+			raise
+		self._finish(name, "ok", start)
+
+	def _finish(self, name: str, status: str, start: float, error: Optional[str] = None) -> None:
+		seconds = time.perf_counter() - start
+		self.phases[name] = {
+			"status": status,
+			"seconds": round(seconds, 4),
+			"finished_after": round(time.perf_counter() - self.started_at, 4),
+		}
+		if error:
+			self.phases[name]["error"] = error
+		STARTUP_PHASE_SECONDS.set(name, status, value=seconds)
+		if self.ready_after is None and self.is_ready():
+			self.ready_after = time.perf_counter() - self.started_at
+			TIME_TO_READY_SECONDS.set(value=self.ready_after)
+			if self._ready_event is not None:
+				self._ready_event.set()
+
+	def is_ready(self) -> bool:
+		return all(self.phases.get(name, {}).get("status") == "ok" for name in self.required)
+
+	async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+		"""Wait until all required phases succeeded (False on timeout)."""
+		if self.is_ready():
+			return True
+		if self._ready_event is None:
+			return False
+		try:
+			await asyncio.wait_for(self._ready_event.wait(), timeout)
+		except asyncio.TimeoutError:
+			return False
+		return True
+
+	def report(self) -> Dict[str, Any]:
+		return {
+			"ready": self.is_ready(),
+			"time_to_ready_seconds": round(self.ready_after, 4) if self.ready_after is not None else None,
+			"phases": self.phases,
+		}
+
+
+# Traffic should only be routed once storage answers and the model is warm
+startup_tracker = StartupTracker(
+	required=("mongo_ping" if storage_backend.uses_mongo else "storage_open", "classifier")
+)
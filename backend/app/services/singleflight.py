@@ -0,0 +1,66 @@
+"""
+Singleflight coalescing of identical concurrent reads.
+
+While a read for a given key is in flight, further identical reads await
+the same task instead of issuing their own query. Keys are grouped by scope
+(usually the user id) so a write can forget every in-flight read for that
+user: reads that start after the write never join a query that started
+before it.
+
+Results are shared between callers and must not be mutated.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.services.metrics import Counter
+
+SINGLEFLIGHT_CALLS = Counter(
+	"singleflight_calls_total",
+	"Reads through singleflight groups; result=shared means the read joined an in-flight query.",
+	("group", "result")
+)
+
+
+class SingleFlight:
+	"""A named group of coalesced reads."""
+
+	def __init__(self, name: str):
+		self.name = name
+		self._inflight: Dict[str, Dict[Hashable, asyncio.Future]] = {}
+
+	async def do(self, scope: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+		"""
+		Run fn(), or join the identical call already in flight.
+
+		Args:
+			scope: Invalidation scope, e.g. the user id
+			key: Operation and parameters, e.g. ("expense", expense_id)
+			fn: Zero-argument coroutine function performing the read
+
+		Returns:
+			The shared result of fn()
+		"""
+		calls = self._inflight.setdefault(scope, {})
+		task = calls.get(key)
+		if task is not None:
+			SINGLEFLIGHT_CALLS.inc(self.name, "shared")
+		else:
+			SINGLEFLIGHT_CALLS.inc(self.name, "leader")
+			task = asyncio.ensure_future(fn())
+			calls[key] = task
+			task.add_done_callback(lambda done: self._discard(scope, key, done))
+		# One caller going away (e.g. client disconnect) must not cancel the others
+		return await asyncio.shield(task)
+
+	def _discard(self, scope: str, key: Hashable, task: asyncio.Future) -> None:
+		calls = self._inflight.get(scope)
+		if calls is not None and calls.get(key) is task:
+			del calls[key]
+			if not calls:
+				del self._inflight[scope]
+		if not task.cancelled():
+			# Mark the exception retrieved when every caller has gone away
+			task.exception()
+
+	def forget(self, scope: str) -> None:
+		"""Let reads that start from now on for this scope run fresh queries."""
+		self._inflight.pop(scope, None)
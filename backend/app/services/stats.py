@@ -1,6 +1,10 @@
 from collections import defaultdict
-from typing import List
+from typing import List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from ..models.schemas import Expense, CategoryStat
+from .archive import get_archived_stats, merge_category_stats
+from .cache import user_cache
+from .storage import expense_reads, get_expense_rows_by_user, get_precomputed_category_stats
 
 
 def aggregate_by_category(expenses: List[Expense]) -> List[CategoryStat]:
@@ -15,3 +19,56 @@ def aggregate_by_category(expenses: List[Expense]) -> List[CategoryStat]:
 	return sorted(stats, key=lambda s: s.total_amount, reverse=True)
 
 
+def aggregate_rows_by_category(rows: List[dict]) -> List[dict]:
+	"""
+	Same as aggregate_by_category, for plain expense rows; returns plain dicts.
+	
+	Expenses flagged as duplicates are left out so they do not inflate totals.
+	"""
+	totals = defaultdict(lambda: {"amount": 0.0, "count": 0})
+	for row in rows:
+		if row.get("duplicate_of"):
+			continue
+		totals[row["category"]]["amount"] += row["amount"]
+		totals[row["category"]]["count"] += 1
+	stats = [
+		{"category": cat, "total_amount": vals["amount"], "count": vals["count"]}
+		for cat, vals in totals.items()
+	]
+	return sorted(stats, key=lambda s: s["total_amount"], reverse=True)
+
+
+async def get_category_stats(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> List[dict]:
+	"""
+	Get per-category totals for a user, served from the per-user cache.
+	
+	On a miss the totals come from the storage layout when it keeps them
+	(bucket totals) and are otherwise computed from the (also cached) expense
+	rows; concurrent misses for the same user share one computation.
+	Archived years add their precomputed totals. Date-ranged totals are not
+	cached and only open the archives the range cuts through.
+	"""
+	if date_from or date_to:
+		async def load_range() -> List[dict]:
+			rows = await get_expense_rows_by_user(db, user_id, date_from, date_to, archived=False)
+			return merge_category_stats(
+				aggregate_rows_by_category(rows),
+				await get_archived_stats(db, user_id, date_from, date_to)
+			)
+		
+		return await expense_reads.do(user_id, ("stats", date_from, date_to), load_range)
+	
+	async def load() -> List[dict]:
+		totals = await get_precomputed_category_stats(db, user_id)
+		if totals is None:
+			totals = aggregate_rows_by_category(await get_expense_rows_by_user(db, user_id, archived=False))
+		return merge_category_stats(totals, await get_archived_stats(db, user_id))
+	
+	return await user_cache.get_or_load(
+		user_id, "stats", lambda: expense_reads.do(user_id, ("stats",), load)
+	)
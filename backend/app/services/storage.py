@@ -1,11 +1,108 @@
-"""Expense storage using MongoDB."""
-from typing import List, Optional
+"""Expense storage on the configured storage backend (MongoDB by default)."""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from datetime import date, datetime
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from ..models.schemas import Expense, ExpenseCreate
+from .metrics import track_mongo
+from .cache import user_cache
+from .singleflight import SingleFlight
+from .events import event_broker
+from .expense_layouts import PENDING_CATEGORY, entry_row
+from .archive import (
+	find_archived_expense, get_archive_summaries, get_archived_rows, iter_archived_years, merge_with_archived,
+	update_archive
+)
+from .user_storage import bump_data_version
+from .autocomplete import autocomplete_index, normalize
+from .budgets import record_spend
+from .duplicates import DUPLICATE_POLICY, DuplicateExpenseError, fingerprint, hamming, is_near_duplicate
+# Engine chosen by STORAGE_BACKEND (and EXPENSE_LAYOUT on mongo); see app.services.storage_backends
+from .storage_backends import storage_backend
 
+# Coalesces identical concurrent reads per user (see app.services.singleflight)
+expense_reads = SingleFlight("expenses")
 
+
+async def _after_write(db: AsyncIOMotorDatabase, user_id: str, *events: Dict[str, Any]) -> Optional[int]:
+	"""
+	Hook run after any successful expense write for a user.
+	
+	Cached reads are dropped before the data version is bumped: a read that
+	authenticates with the new version can then never be answered from rows
+	cached before the write (loads already in flight are kept out of the
+	cache by its generation check), so an ETag is never newer than the data
+	it was served with. The change events are published last and carry the
+	new version, which is returned.
+	"""
+	expense_reads.forget(user_id)
+	await user_cache.invalidate_user(user_id)
+	version = await bump_data_version(db, user_id)
+	for event in events:
+		await event_broker.publish(user_id, {**event, "data_version": version})
+	return version
+
+
+def _parse_date(value: Optional[str]) -> str:
+	"""ISO date of a payload date, defaulting to today when missing or invalid."""
+	if value:
+		try:
+			return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+		except ValueError:
+			pass
+	return date.today().isoformat()
+
+
+def _row(doc: dict) -> dict:
+	"""API row for an expense document we just wrote."""
+	row = {
+		"id": str(doc["_id"]),
+		"description": doc["description"],
+		"amount": doc["amount"],
+		"date": doc["date"],
+		"category": doc["category"],
+		"probability": doc["probability"]
+	}
+	if doc.get("duplicate_of") is not None:
+		row["duplicate_of"] = str(doc["duplicate_of"])
+	return row
+
+
+@track_mongo("find_duplicate_expenses")
+async def _find_duplicates(db: AsyncIOMotorDatabase, user_id: str, docs: List[dict]) -> List[Optional[ObjectId]]:
+	"""
+	Fingerprint new expense documents and find the expense each one duplicates.
+	
+	Candidates come from one indexed query on the amount-and-date key
+	(dup_keys), or the same-month buckets in the bucket layout, and the
+	nearest one within DUPLICATE_MAX_HAMMING wins; documents earlier in the
+	same list count as candidates.
+	
+	Returns:
+		For each document, the _id of the original expense or None
+	"""
+	for doc in docs:
+		doc["dup_hash"], doc["dup_keys"] = fingerprint(doc["description"], doc["amount"], doc["date"])
+	if DUPLICATE_POLICY == "off":
+		return [None] * len(docs)
+	
+	candidates = await storage_backend.duplicate_candidates(db, user_id, docs)
+	
+	originals = []
+	for doc in docs:
+		match = min(
+			(c for c in candidates if is_near_duplicate(doc["dup_hash"], doc["amount"], doc["date"], c)),
+			key=lambda c: hamming(doc["dup_hash"], c["dup_hash"]),
+			default=None
+		)
+		original = (match.get("duplicate_of") or match["_id"]) if match else None
+		originals.append(original)
+		if "_id" in doc:
+			candidates.append({**doc, "duplicate_of": original})
+	return originals
+
+
+@track_mongo("create_expense")
 async def create_expense(
 	db: AsyncIOMotorDatabase,
 	user_id: str,
@@ -24,72 +121,295 @@ async def create_expense(
 		probability: Prediction confidence
 	
 	Returns:
-		Created Expense
-	"""
-	# Parse date string to date object
-	expense_date = date.today()
-	if payload.date:
-		try:
-			expense_date = datetime.strptime(payload.date, "%Y-%m-%d").date()
-		except ValueError:
-			expense_date = date.today()
+		Created Expense (with duplicate_of set when flagged as a duplicate)
 	
+	Raises:
+		DuplicateExpenseError: If it duplicates an existing expense and
+			DUPLICATE_POLICY is "reject"
+	"""
 	# Create expense document
 	expense_doc = {
 		"user_id": ObjectId(user_id),
 		"description": payload.description,
 		"amount": payload.amount,
-		"date": expense_date.isoformat(),
+		"date": _parse_date(payload.date),
 		"category": category,
 		"probability": probability,
 		"created_at": datetime.utcnow(),
 		"updated_at": datetime.utcnow()
 	}
 	
-	result = await db.expenses.insert_one(expense_doc)
+	duplicate_of = (await _find_duplicates(db, user_id, [expense_doc]))[0]
+	if duplicate_of is not None:
+		if DUPLICATE_POLICY == "reject":
+			raise DuplicateExpenseError(str(duplicate_of))
+		expense_doc["duplicate_of"] = duplicate_of
 	
-	# Convert to Pydantic model
-	return Expense(
-		id=str(result.inserted_id),
-		description=expense_doc["description"],
-		amount=expense_doc["amount"],
-		date=expense_doc["date"],
-		category=expense_doc["category"],
-		probability=expense_doc["probability"]
-	)
+	await storage_backend.insert_one(db, expense_doc)
+	row = _row(expense_doc)
+	await record_spend(db, user_id, added=[row])
+	version = await _after_write(db, user_id, {"type": "expense.created", "expense": row})
+	autocomplete_index.record(user_id, version, [row])
+	
+	# Convert to Pydantic model (fields were just validated by ExpenseCreate)
+	return Expense.model_construct(**row)
 
 
-async def get_expenses_by_user(db: AsyncIOMotorDatabase, user_id: str) -> List[Expense]:
+@track_mongo("create_expenses_bulk")
+async def create_expenses_bulk(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	items: List[Tuple[ExpenseCreate, str, float]]
+) -> Tuple[List[Expense], List[Tuple[int, str]]]:
 	"""
-	Get all expenses for a specific user, ordered by date (newest first).
+	Create many expenses for a user with one insert_many (e.g. a bank import).
+	
+	Duplicates, against existing expenses or earlier items of the same
+	import, follow DUPLICATE_POLICY: flagged items are created with
+	duplicate_of set, rejected items are skipped and reported.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user who owns the expenses (MongoDB ObjectId as string)
+		items: (payload, category, probability) per expense
+	
+	Returns:
+		Tuple of (created expenses in input order, [(item index, duplicate_of)] rejected)
+	"""
+	now = datetime.utcnow()
+	docs = [
+		{
+			"_id": ObjectId(),
+			"user_id": ObjectId(user_id),
+			"description": payload.description,
+			"amount": payload.amount,
+			"date": _parse_date(payload.date),
+			"category": category,
+			"probability": probability,
+			"created_at": now,
+			"updated_at": now
+		}
+		for payload, category, probability in items
+	]
+	
+	to_insert = []
+	rejected = []
+	for index, (doc, duplicate_of) in enumerate(zip(docs, await _find_duplicates(db, user_id, docs))):
+		if duplicate_of is None:
+			to_insert.append(doc)
+		elif DUPLICATE_POLICY == "reject":
+			rejected.append((index, str(duplicate_of)))
+		else:
+			doc["duplicate_of"] = duplicate_of
+			to_insert.append(doc)
+	
+	if to_insert:
+		await storage_backend.insert_many(db, to_insert)
+		rows = [_row(doc) for doc in to_insert]
+		await record_spend(db, user_id, added=rows)
+		version = await _after_write(db, user_id, *({"type": "expense.created", "expense": row} for row in rows))
+		autocomplete_index.record(user_id, version, rows)
+	else:
+		rows = []
+	return [Expense.model_construct(**row) for row in rows], rejected
+
+
+@track_mongo("find_expenses_by_user")
+async def _query_expense_rows(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> List[dict]:
+	return await storage_backend.find_rows(db, user_id, date_from, date_to)
+
+
+async def get_expense_rows_by_user(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None,
+	archived: bool = True
+) -> List[dict]:
+	"""
+	Get all expenses for a specific user as plain dicts, newest first.
+	
+	This is the fast path used by GET /expenses: only client-facing fields are
+	projected and no Pydantic model is built per document. Results are served
+	from the per-user cache until one of the user's expenses changes; callers
+	must not mutate the returned rows.
+	
+	Archived expenses (see app.services.archive) are read through only when
+	the date range reaches the archive.
 	
 	Args:
 		db: MongoDB database instance
 		user_id: ID of the user (MongoDB ObjectId as string)
+		date_from: Optional first ISO date to include
+		date_to: Optional last ISO date to include
+		archived: Include archived expenses
 	
 	Returns:
-		List of expenses for the user
+		List of expense dicts in the Expense shape
 	"""
 	try:
-		cursor = db.expenses.find({"user_id": ObjectId(user_id)})\
-			.sort([("date", -1), ("created_at", -1)])
-		
-		expenses = []
-		async for expense_doc in cursor:
-			expenses.append(Expense(
-				id=str(expense_doc["_id"]),
-				description=expense_doc["description"],
-				amount=expense_doc["amount"],
-				date=expense_doc.get("date"),
-				category=expense_doc["category"],
-				probability=expense_doc["probability"]
-			))
-		
-		return expenses
+		if date_from or date_to:
+			rows = await expense_reads.do(
+				user_id, ("expenses", date_from, date_to),
+				lambda: _query_expense_rows(db, user_id, date_from, date_to)
+			)
+		else:
+			rows = await user_cache.get_or_load(
+				user_id, "expenses",
+				lambda: expense_reads.do(user_id, ("expenses",), lambda: _query_expense_rows(db, user_id))
+			)
+		if not archived:
+			return rows
+		return merge_with_archived(rows, await get_archived_rows(db, user_id, date_from, date_to))
 	except Exception:
 		return []
 
 
+async def get_expenses_by_user(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> List[Expense]:
+	"""
+	Get all expenses for a specific user, ordered by date (newest first).
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		date_from: Optional first ISO date to include
+		date_to: Optional last ISO date to include
+	
+	Returns:
+		List of expenses for the user
+	"""
+	rows = await get_expense_rows_by_user(db, user_id, date_from, date_to)
+	# Rows come from our own documents, so skip re-validation
+	return [Expense.model_construct(**row) for row in rows]
+
+
+async def iter_expense_batches(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	batch_size: int = 500,
+	date_from: Optional[str] = None,
+	date_to: Optional[str] = None
+) -> AsyncIterator[List[dict]]:
+	"""
+	Stream a user's expenses (newest first) one cursor batch at a time.
+	
+	Each batch is a list of plain dicts in the Expense shape, so callers can
+	serialize rows as they arrive instead of materializing the whole history.
+	Archived expenses follow the hot ones, read one archive year at a time.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		batch_size: Documents fetched per round trip
+		date_from: Optional inclusive lower date bound (ISO)
+		date_to: Optional inclusive upper date bound (ISO)
+	
+	Yields:
+		Lists of expense dicts
+	"""
+	summaries = await get_archive_summaries(db, user_id)
+	newest_archived = max((summary["last_date"] or "" for summary in summaries), default="")
+	overlap = set()
+	async for rows in storage_backend.iter_batches(db, user_id, batch_size, date_from, date_to):
+		overlap.update(row["id"] for row in rows if (row["date"] or "") <= newest_archived)
+		yield rows
+	
+	if summaries:
+		async for year_rows in iter_archived_years(db, user_id, date_from, date_to):
+			archived = [row for row in year_rows if row["id"] not in overlap]
+			for start in range(0, len(archived), batch_size):
+				yield archived[start:start + batch_size]
+
+
+@track_mongo("search_expenses")
+async def search_expense_rows(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	query: str,
+	limit: int,
+	offset: int = 0
+) -> List[dict]:
+	"""
+	Full-text search over a user's expense descriptions, best match first.
+	
+	Uses the (user_id, description text) index; ranking is MongoDB's
+	textScore (stemmed word matches, weighted by frequency). The bucket
+	layout matches word prefixes over the user's rows instead.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		query: Search words; "quoted phrases" and -excluded words are supported
+		limit: Maximum number of rows
+		offset: Rows to skip (for pagination)
+	
+	Returns:
+		List of expense dicts in the Expense shape plus a "score" field
+	"""
+	return await expense_reads.do(
+		user_id, ("search", query, limit, offset),
+		lambda: storage_backend.search(db, user_id, query, limit, offset)
+	)
+
+
+@track_mongo("get_expense_changes")
+async def get_expense_rows_changed_since(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	since: datetime
+) -> List[dict]:
+	"""
+	Get a user's expenses created or updated at or after a point in time.
+	
+	Served by the (user_id, updated_at) index, so the cost follows the number
+	of changes rather than the size of the history.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		since: Naive UTC lower bound for updated_at
+	
+	Returns:
+		List of expense dicts in the Expense shape, oldest change first
+	"""
+	return await expense_reads.do(
+		user_id, ("changes", since), lambda: storage_backend.rows_changed_since(db, user_id, since)
+	)
+
+
+@track_mongo("get_deleted_expense_ids")
+async def get_deleted_expense_ids_since(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	since: datetime
+) -> List[str]:
+	"""
+	Get ids of a user's expenses deleted at or after a point in time.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+		since: Naive UTC lower bound for deleted_at
+	
+	Returns:
+		List of deleted expense ids (strings)
+	"""
+	return await expense_reads.do(
+		user_id, ("deleted", since), lambda: storage_backend.deleted_ids_since(db, user_id, since)
+	)
+
+
+@track_mongo("get_expense_by_id")
 async def get_expense_by_id(
 	db: AsyncIOMotorDatabase,
 	user_id: str,
@@ -106,27 +426,49 @@ async def get_expense_by_id(
 	Returns:
 		Expense if found, None otherwise
 	"""
+	async def query() -> Optional[dict]:
+		row = await storage_backend.find_row(db, user_id, expense_id)
+		if row is None:
+			found = await find_archived_expense(db, user_id, expense_id)
+			row = entry_row(found[1]) if found else None
+		return row
+	
 	try:
-		expense_doc = await db.expenses.find_one({
-			"_id": ObjectId(expense_id),
-			"user_id": ObjectId(user_id)
-		})
-		
-		if not expense_doc:
+		row = await expense_reads.do(user_id, ("expense", expense_id), query)
+		if row is None:
 			return None
 		
-		return Expense(
-			id=str(expense_doc["_id"]),
-			description=expense_doc["description"],
-			amount=expense_doc["amount"],
-			date=expense_doc.get("date"),
-			category=expense_doc["category"],
-			probability=expense_doc["probability"]
-		)
+		return Expense.model_construct(**row)
 	except Exception:
 		return None
 
 
+async def _restore_archived(
+	db: AsyncIOMotorDatabase,
+	user_id: str,
+	expense_id: str,
+	update_doc: Dict[str, Any]
+) -> Optional[Tuple[dict, dict]]:
+	"""
+	Move an archived expense back into the hot layout with an update applied.
+	
+	Returns:
+		(row before, row after) or None when the expense is not archived either
+	"""
+	found = await find_archived_expense(db, user_id, expense_id)
+	if found is None:
+		return None
+	year, doc = found
+	old_row = entry_row(doc)
+	doc.pop("duplicate_of", None)
+	doc.update(update_doc, user_id=ObjectId(user_id))
+	# Hot copy first; readers prefer it while the archived one still exists
+	await storage_backend.insert_one(db, doc)
+	await update_archive(db, doc["user_id"], year, remove={doc["_id"]})
+	return old_row, entry_row(doc)
+
+
+@track_mongo("update_expense")
 async def update_expense(
 	db: AsyncIOMotorDatabase,
 	user_id: str,
@@ -150,53 +492,40 @@ async def update_expense(
 		Updated Expense if found and updated, None otherwise
 	"""
 	try:
-		# Parse date string to date object
-		expense_date = date.today()
-		if payload.date:
-			try:
-				expense_date = datetime.strptime(payload.date, "%Y-%m-%d").date()
-			except ValueError:
-				expense_date = date.today()
-		
 		# Update expense document
 		update_doc = {
 			"description": payload.description,
 			"amount": payload.amount,
-			"date": expense_date.isoformat(),
+			"date": _parse_date(payload.date),
 			"category": category,
 			"probability": probability,
 			"updated_at": datetime.utcnow()
 		}
-		
-		result = await db.expenses.update_one(
-			{"_id": ObjectId(expense_id), "user_id": ObjectId(user_id)},
-			{"$set": update_doc}
+		update_doc["dup_hash"], update_doc["dup_keys"] = fingerprint(
+			update_doc["description"], update_doc["amount"], update_doc["date"]
 		)
 		
-		if result.matched_count == 0:
-			return None
-		
-		# Fetch and return updated expense
-		expense_doc = await db.expenses.find_one({
-			"_id": ObjectId(expense_id),
-			"user_id": ObjectId(user_id)
-		})
-		
-		if not expense_doc:
-			return None
+		# The old version moves the budget spend counters back out
+		old_row = await storage_backend.find_row(db, user_id, expense_id)
+		# An edited expense is no longer treated as a duplicate
+		row = await storage_backend.update(db, user_id, expense_id, update_doc)
+		if row is None:
+			restored = await _restore_archived(db, user_id, expense_id, update_doc)
+			if restored is None:
+				return None
+			old_row, row = restored
 		
-		return Expense(
-			id=str(expense_doc["_id"]),
-			description=expense_doc["description"],
-			amount=expense_doc["amount"],
-			date=expense_doc.get("date"),
-			category=expense_doc["category"],
-			probability=expense_doc["probability"]
-		)
+		await record_spend(db, user_id, removed=[old_row] if old_row else [], added=[row])
+		version = await _after_write(db, user_id, {"type": "expense.updated", "expense": row})
+		# Editing other fields is not another use of the description
+		reused = old_row is not None and normalize(old_row["description"]) == normalize(row["description"])
+		autocomplete_index.record(user_id, version, [row], uses=0 if reused else 1)
+		return Expense.model_construct(**row)
 	except Exception:
 		return None
 
 
+@track_mongo("delete_expense")
 async def delete_expense(
 	db: AsyncIOMotorDatabase,
 	user_id: str,
@@ -205,6 +534,11 @@ async def delete_expense(
 	"""
 	Delete an expense for a user.
 	
+	Deleting an original that has flagged duplicates promotes the oldest
+	duplicate to an original, so it counts again in stats and budgets, and
+	points the other duplicates at it. Duplicates share the original's date,
+	so they are looked up in the store (hot or archived) it was deleted from.
+	
 	Args:
 		db: MongoDB database instance
 		user_id: ID of the user (MongoDB ObjectId as string)
@@ -214,10 +548,95 @@ async def delete_expense(
 		True if expense was found and deleted, False otherwise
 	"""
 	try:
-		result = await db.expenses.delete_one({
-			"_id": ObjectId(expense_id),
-			"user_id": ObjectId(user_id)
-		})
-		return result.deleted_count > 0
+		now = datetime.utcnow()
+		old_row = await storage_backend.find_row(db, user_id, expense_id)
+		if old_row is not None and await storage_backend.delete(db, user_id, expense_id):
+			# Duplicates always point at the original, never at another duplicate
+			changed = [] if old_row.get("duplicate_of") else await storage_backend.promote_duplicates(
+				db, user_id, expense_id, now
+			)
+		else:
+			found = await find_archived_expense(db, user_id, expense_id)
+			if found is None:
+				return False
+			year, doc = found
+			old_row = entry_row(doc)
+			changed = [entry_row(promoted) for promoted in await update_archive(
+				db, ObjectId(user_id), year, remove={doc["_id"]},
+				promote_duplicates_of=None if old_row.get("duplicate_of") else doc["_id"]
+			)]
+		await record_spend(db, user_id, removed=[old_row], added=[row for row in changed if not row.get("duplicate_of")])
+		
+		# Let delta-sync clients learn about the deletion
+		await storage_backend.add_tombstone(db, user_id, expense_id, now)
+		await _after_write(
+			db, user_id, {"type": "expense.deleted", "id": expense_id},
+			*({"type": "expense.updated", "expense": row} for row in changed)
+		)
+		return True
 	except Exception:
 		return False
+
+
+@track_mongo("apply_classifications")
+async def apply_classifications(
+	db: AsyncIOMotorDatabase,
+	results: List[Tuple[ObjectId, ObjectId, str, str, float]]
+) -> int:
+	"""
+	Store deferred classification results for pending expenses.
+	
+	An expense is only updated while it is still pending with the description
+	that was classified, so a later edit or user-chosen category always wins.
+	
+	Args:
+		db: MongoDB database instance
+		results: (expense_id, user_id, classified_description, category, probability) tuples
+	
+	Returns:
+		Number of expenses updated
+	"""
+	if not results:
+		return 0
+	# MongoDB keeps milliseconds; truncate so the stamp can be matched below
+	now = datetime.utcnow()
+	now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+	updated = await storage_backend.set_classifications(db, results, now)
+	
+	# Notify the owners of the changed expenses once per user
+	rows_by_user: Dict[str, List[dict]] = {}
+	for user_id, row in updated:
+		rows_by_user.setdefault(user_id, []).append(row)
+	for user_id, rows in rows_by_user.items():
+		await record_spend(
+			db, user_id, removed=[{**row, "category": PENDING_CATEGORY} for row in rows], added=rows
+		)
+		await _after_write(db, user_id, *({"type": "expense.updated", "expense": row} for row in rows))
+	return len(updated)
+
+
+@track_mongo("find_pending_expenses")
+async def get_pending_expenses(db: AsyncIOMotorDatabase) -> List[dict]:
+	"""
+	Get every expense still waiting for deferred classification.
+	
+	Returns:
+		List of {"_id", "user_id", "description"} dicts
+	"""
+	return await storage_backend.pending_expenses(db)
+
+
+@track_mongo("get_category_totals")
+async def get_precomputed_category_stats(db: AsyncIOMotorDatabase, user_id: str) -> Optional[List[dict]]:
+	"""
+	Per-category totals maintained by the storage layout, if it keeps any.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: ID of the user (MongoDB ObjectId as string)
+	
+	Returns:
+		List of {"category", "total_amount", "count"} dicts sorted by total,
+		or None when totals have to be computed from the expense rows
+	"""
+	return await storage_backend.category_totals(db, user_id)
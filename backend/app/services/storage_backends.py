@@ -0,0 +1,760 @@
+"""
+Pluggable storage engines behind app.services.storage and user_storage.
+
+STORAGE_BACKEND selects the engine:
+
+- "mongo" (default): MongoDB through Motor; expenses use the layout chosen
+  by EXPENSE_LAYOUT (see app.services.expense_layouts).
+- "memory": process-local dicts with per-user sorted indexes. Nothing is
+  persisted; meant for tests, benchmarks and demos.
+- "sqlite": a SQLite file (SQLITE_PATH) in WAL mode. All statements run on
+  one dedicated thread, so the event loop never blocks on disk I/O and
+  writes are serialized without extra locking.
+
+Every engine implements StorageBackend. Features that are built directly
+on MongoDB collections (custom categories, budgets, the deferred
+classification queue, archives) need the mongo engine and are switched off otherwise.
+The db argument of each method is the Motor database; the embedded
+engines ignore it.
+"""
+import asyncio
+import bisect
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Protocol, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from .expense_layouts import PENDING_CATEGORY, entry_row, get_expense_layout, search_rows
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "pennywise.db")
+
+
+class StorageBackend(Protocol):
+	"""
+	Operations storage.py and user_storage.py need from an engine.
+
+	Expense rows are plain dicts in the Expense shape; expense documents
+	passed in are the dicts storage.py builds (ObjectId _id and user_id,
+	naive UTC datetimes, dup_hash/dup_keys fingerprints).
+	"""
+
+	name: str
+	uses_mongo: bool
+
+	async def create_indexes(self, db: AsyncIOMotorDatabase) -> None: ...
+	async def close(self) -> None: ...
+
+	# Users
+	async def insert_user(self, db: AsyncIOMotorDatabase, doc: dict) -> str: ...
+	async def find_user(self, db: AsyncIOMotorDatabase, field: str, value: str) -> Optional[dict]: ...
+	async def bump_data_version(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]: ...
+
+	# Expenses
+	async def insert_one(self, db: AsyncIOMotorDatabase, doc: dict) -> None: ...
+	async def insert_many(self, db: AsyncIOMotorDatabase, docs: List[dict]) -> None: ...
+	async def find_rows(
+		self, db: AsyncIOMotorDatabase, user_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None
+	) -> List[dict]: ...
+	def iter_batches(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		batch_size: int,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> AsyncIterator[List[dict]]: ...
+	async def find_row(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[dict]: ...
+	async def rows_changed_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[dict]: ...
+	async def search(self, db: AsyncIOMotorDatabase, user_id: str, query: str, limit: int, offset: int) -> List[dict]: ...
+	async def duplicate_candidates(self, db: AsyncIOMotorDatabase, user_id: str, docs: List[dict]) -> List[dict]: ...
+	async def update(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str, fields: Dict[str, Any]) -> Optional[dict]: ...
+	async def delete(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> bool: ...
+	# Oldest duplicate of a deleted original becomes an original, the rest its duplicates; changed rows, promoted first
+	async def promote_duplicates(
+		self, db: AsyncIOMotorDatabase, user_id: str, original_id: str, now: datetime
+	) -> List[dict]: ...
+	async def set_classifications(
+		self, db: AsyncIOMotorDatabase, results: List[Tuple[ObjectId, ObjectId, str, str, float]], now: datetime
+	) -> List[Tuple[str, dict]]: ...
+	async def pending_expenses(self, db: AsyncIOMotorDatabase) -> List[dict]: ...
+	async def category_totals(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[List[dict]]: ...
+
+	# Deletion tombstones for delta sync
+	async def add_tombstone(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str, deleted_at: datetime) -> None: ...
+	async def deleted_ids_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[str]: ...
+
+
+def _sorted_stats(totals: Dict[str, List[float]]) -> List[dict]:
+	stats = [
+		{"category": category, "total_amount": amount, "count": count}
+		for category, (amount, count) in totals.items() if count > 0
+	]
+	return sorted(stats, key=lambda s: s["total_amount"], reverse=True)
+
+
+class MongoBackend:
+	"""MongoDB engine; expense operations are those of the configured layout."""
+
+	name = "mongo"
+	uses_mongo = True
+
+	def __init__(self, layout):
+		self.layout = layout
+
+	def __getattr__(self, name: str):
+		return getattr(self.layout, name)
+
+	async def create_indexes(self, db: AsyncIOMotorDatabase) -> None:
+		await asyncio.gather(
+			db.users.create_index("username", unique=True),
+			db.users.create_index("email", unique=True),
+			db.expense_tombstones.create_index([("user_id", 1), ("deleted_at", 1)]),
+			self.layout.create_indexes(db),
+		)
+
+	async def close(self) -> None:
+		pass
+
+	async def insert_user(self, db: AsyncIOMotorDatabase, doc: dict) -> str:
+		result = await db.users.insert_one(doc)
+		return str(result.inserted_id)
+
+	async def find_user(self, db: AsyncIOMotorDatabase, field: str, value: str) -> Optional[dict]:
+		return await db.users.find_one({field: ObjectId(value) if field == "_id" else value})
+
+	async def bump_data_version(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]:
+		user_doc = await db.users.find_one_and_update(
+			{"_id": ObjectId(user_id)},
+			{"$inc": {"data_version": 1}},
+			projection={"_id": 0, "data_version": 1},
+			return_document=ReturnDocument.AFTER
+		)
+		return user_doc["data_version"] if user_doc else None
+
+	async def add_tombstone(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str, deleted_at: datetime) -> None:
+		await db.expense_tombstones.insert_one({
+			"user_id": ObjectId(user_id),
+			"expense_id": ObjectId(expense_id),
+			"deleted_at": deleted_at
+		})
+
+	async def deleted_ids_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[str]:
+		cursor = db.expense_tombstones.find(
+			{"user_id": ObjectId(user_id), "deleted_at": {"$gte": since}},
+			{"_id": 0, "expense_id": 1}
+		)
+		return [str(doc["expense_id"]) for doc in await cursor.to_list(length=None)]
+
+
+class _UserExpenses:
+	"""One user's expenses with sorted (date, created_at) and updated_at indexes."""
+
+	def __init__(self):
+		self.docs: Dict[str, dict] = {}
+		self.by_date: List[Tuple[str, datetime, str]] = []
+		self.by_updated: List[Tuple[datetime, str]] = []
+		self.dup_index: Dict[str, set] = {}
+		self.totals: Dict[str, List[float]] = {}
+
+	@staticmethod
+	def _date_key(doc: dict) -> Tuple[str, datetime, str]:
+		return (doc.get("date") or "", doc.get("created_at") or datetime.min, str(doc["_id"]))
+
+	def _account(self, doc: dict, sign: int) -> None:
+		if doc.get("duplicate_of") is None:
+			total = self.totals.setdefault(doc["category"], [0.0, 0])
+			total[0] += sign * doc["amount"]
+			total[1] += sign
+
+	def add(self, doc: dict) -> None:
+		key = str(doc["_id"])
+		self.docs[key] = doc
+		bisect.insort(self.by_date, self._date_key(doc))
+		bisect.insort(self.by_updated, (doc["updated_at"], key))
+		for dup_key in doc.get("dup_keys", ()):
+			self.dup_index.setdefault(dup_key, set()).add(key)
+		self._account(doc, 1)
+
+	def remove(self, key: str) -> Optional[dict]:
+		doc = self.docs.pop(key, None)
+		if doc is None:
+			return None
+		date_key = self._date_key(doc)
+		del self.by_date[bisect.bisect_left(self.by_date, date_key)]
+		del self.by_updated[bisect.bisect_left(self.by_updated, (doc["updated_at"], key))]
+		for dup_key in doc.get("dup_keys", ()):
+			ids = self.dup_index.get(dup_key)
+			ids.discard(key)
+			if not ids:
+				del self.dup_index[dup_key]
+		self._account(doc, -1)
+		return doc
+
+	def newest_first(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[dict]:
+		low = bisect.bisect_left(self.by_date, (date_from,)) if date_from else 0
+		high = bisect.bisect_right(self.by_date, (date_to, datetime.max)) if date_to else len(self.by_date)
+		return [entry_row(self.docs[self.by_date[i][2]]) for i in range(high - 1, low - 1, -1)]
+
+
+class MemoryBackend:
+	"""Process-local engine; see the module docstring."""
+
+	name = "memory"
+	uses_mongo = False
+
+	def __init__(self):
+		self._users: Dict[str, dict] = {}
+		self._user_ids: Dict[Tuple[str, str], str] = {}
+		self._expenses: Dict[str, _UserExpenses] = {}
+		self._tombstones: Dict[str, List[Tuple[datetime, str]]] = {}
+
+	async def create_indexes(self, db: AsyncIOMotorDatabase) -> None:
+		pass
+
+	async def close(self) -> None:
+		pass
+
+	async def insert_user(self, db: AsyncIOMotorDatabase, doc: dict) -> str:
+		if ("username", doc["username"]) in self._user_ids or ("email", doc["email"]) in self._user_ids:
+			raise ValueError("Username or email already exists")
+		user_id = str(doc.setdefault("_id", ObjectId()))
+		self._users[user_id] = dict(doc)
+		self._user_ids[("username", doc["username"])] = user_id
+		self._user_ids[("email", doc["email"])] = user_id
+		return user_id
+
+	async def find_user(self, db: AsyncIOMotorDatabase, field: str, value: str) -> Optional[dict]:
+		user_id = value if field == "_id" else self._user_ids.get((field, value))
+		user = self._users.get(user_id) if user_id else None
+		return dict(user) if user else None
+
+	async def bump_data_version(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]:
+		user = self._users.get(user_id)
+		if user is None:
+			return None
+		user["data_version"] = user.get("data_version", 0) + 1
+		return user["data_version"]
+
+	def _user(self, user_id: Any) -> _UserExpenses:
+		return self._expenses.setdefault(str(user_id), _UserExpenses())
+
+	async def insert_one(self, db: AsyncIOMotorDatabase, doc: dict) -> None:
+		await self.insert_many(db, [doc])
+
+	async def insert_many(self, db: AsyncIOMotorDatabase, docs: List[dict]) -> None:
+		for doc in docs:
+			doc.setdefault("_id", ObjectId())
+			self._user(doc["user_id"]).add(dict(doc))
+
+	async def find_rows(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> List[dict]:
+		return self._user(user_id).newest_first(date_from, date_to)
+
+	async def iter_batches(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		batch_size: int,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> AsyncIterator[List[dict]]:
+		rows = self._user(user_id).newest_first(date_from, date_to)
+		for start in range(0, len(rows), batch_size):
+			yield rows[start:start + batch_size]
+
+	async def find_row(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[dict]:
+		doc = self._user(user_id).docs.get(expense_id)
+		return entry_row(doc) if doc else None
+
+	async def rows_changed_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[dict]:
+		expenses = self._user(user_id)
+		start = bisect.bisect_left(expenses.by_updated, (since,))
+		return [entry_row(expenses.docs[key]) for _, key in expenses.by_updated[start:]]
+
+	async def search(self, db: AsyncIOMotorDatabase, user_id: str, query: str, limit: int, offset: int) -> List[dict]:
+		return search_rows(self._user(user_id).newest_first(), query, limit, offset)
+
+	async def duplicate_candidates(self, db: AsyncIOMotorDatabase, user_id: str, docs: List[dict]) -> List[dict]:
+		expenses = self._user(user_id)
+		keys = {
+			key for doc in docs for dup_key in doc["dup_keys"]
+			for key in expenses.dup_index.get(dup_key, ())
+		}
+		return [expenses.docs[key] for key in keys]
+
+	async def update(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		expense_id: str,
+		fields: Dict[str, Any]
+	) -> Optional[dict]:
+		expenses = self._user(user_id)
+		old = expenses.remove(expense_id)
+		if old is None:
+			return None
+		new = {key: value for key, value in old.items() if key != "duplicate_of"}
+		new.update(fields)
+		expenses.add(new)
+		return entry_row(new)
+
+	async def delete(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> bool:
+		return self._user(user_id).remove(expense_id) is not None
+
+	async def promote_duplicates(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		original_id: str,
+		now: datetime
+	) -> List[dict]:
+		expenses = self._user(user_id)
+		duplicates = sorted(
+			(doc for doc in expenses.docs.values() if str(doc.get("duplicate_of")) == original_id),
+			key=lambda doc: (doc.get("created_at") or datetime.min, str(doc["_id"]))
+		)
+		changed = []
+		for position, old in enumerate(duplicates):
+			expenses.remove(str(old["_id"]))
+			new = {key: value for key, value in old.items() if key != "duplicate_of"}
+			new["updated_at"] = now
+			if position:
+				new["duplicate_of"] = duplicates[0]["_id"]
+			expenses.add(new)
+			changed.append(entry_row(new))
+		return changed
+
+	async def set_classifications(
+		self,
+		db: AsyncIOMotorDatabase,
+		results: List[Tuple[ObjectId, ObjectId, str, str, float]],
+		now: datetime
+	) -> List[Tuple[str, dict]]:
+		updated = []
+		for expense_id, user_id, description, category, probability in results:
+			expenses = self._user(user_id)
+			doc = expenses.docs.get(str(expense_id))
+			if doc is None or doc["category"] != PENDING_CATEGORY or doc["description"] != description:
+				continue
+			expenses.remove(str(expense_id))
+			doc = {**doc, "category": category, "probability": probability, "updated_at": now}
+			expenses.add(doc)
+			updated.append((str(user_id), entry_row(doc)))
+		return updated
+
+	async def pending_expenses(self, db: AsyncIOMotorDatabase) -> List[dict]:
+		return [
+			{"_id": doc["_id"], "user_id": doc["user_id"], "description": doc["description"]}
+			for expenses in self._expenses.values() for doc in expenses.docs.values()
+			if doc["category"] == PENDING_CATEGORY
+		]
+
+	async def category_totals(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[List[dict]]:
+		return _sorted_stats(self._user(user_id).totals)
+
+	async def add_tombstone(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str, deleted_at: datetime) -> None:
+		bisect.insort(self._tombstones.setdefault(user_id, []), (deleted_at, expense_id))
+
+	async def deleted_ids_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[str]:
+		tombstones = self._tombstones.get(user_id, [])
+		return [expense_id for _, expense_id in tombstones[bisect.bisect_left(tombstones, (since,)):]]
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+	id TEXT PRIMARY KEY,
+	username TEXT NOT NULL UNIQUE,
+	email TEXT NOT NULL UNIQUE,
+	hashed_password TEXT NOT NULL,
+	data_version INTEGER NOT NULL DEFAULT 0,
+	created_at TEXT,
+	updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS expenses (
+	id TEXT PRIMARY KEY,
+	user_id TEXT NOT NULL,
+	description TEXT NOT NULL,
+	amount REAL NOT NULL,
+	date TEXT,
+	category TEXT NOT NULL,
+	probability REAL,
+	duplicate_of TEXT,
+	dup_hash INTEGER,
+	created_at TEXT NOT NULL,
+	updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_user_date ON expenses (user_id, date, created_at);
+CREATE INDEX IF NOT EXISTS expenses_user_updated ON expenses (user_id, updated_at);
+CREATE INDEX IF NOT EXISTS expenses_pending ON expenses (id) WHERE category = 'pending';
+CREATE INDEX IF NOT EXISTS expenses_duplicates ON expenses (user_id, duplicate_of) WHERE duplicate_of IS NOT NULL;
+CREATE TABLE IF NOT EXISTS expense_dup_keys (
+	user_id TEXT NOT NULL,
+	key TEXT NOT NULL,
+	expense_id TEXT NOT NULL,
+	PRIMARY KEY (user_id, key, expense_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS expense_tombstones (
+	user_id TEXT NOT NULL,
+	expense_id TEXT NOT NULL,
+	deleted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expense_tombstones_user_deleted ON expense_tombstones (user_id, deleted_at);
+"""
+
+_ROW_COLUMNS = "id, description, amount, date, category, probability, duplicate_of"
+
+
+def _timestamp(value: datetime) -> str:
+	# Fixed-width ISO strings compare like the datetimes they encode
+	return value.isoformat(timespec="microseconds")
+
+
+def _sqlite_row(record: sqlite3.Row) -> dict:
+	row = {
+		"id": record["id"],
+		"description": record["description"],
+		"amount": record["amount"],
+		"date": record["date"],
+		"category": record["category"],
+		"probability": record["probability"]
+	}
+	if record["duplicate_of"] is not None:
+		row["duplicate_of"] = record["duplicate_of"]
+	return row
+
+
+def _newest_first_sql(user_id: str, date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, Tuple[Any, ...]]:
+	"""Query for a user's rows within a date range, newest first."""
+	sql = f"SELECT {_ROW_COLUMNS} FROM expenses WHERE user_id = ?"
+	params: List[Any] = [user_id]
+	if date_from:
+		sql += " AND date >= ?"
+		params.append(date_from)
+	if date_to:
+		sql += " AND date <= ?"
+		params.append(date_to)
+	return sql + " ORDER BY date DESC, created_at DESC", tuple(params)
+
+
+class SQLiteBackend:
+	"""Embedded SQLite engine; see the module docstring."""
+
+	name = "sqlite"
+	uses_mongo = False
+
+	def __init__(self, path: str = SQLITE_PATH):
+		self.path = path
+		self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+		self._conn: Optional[sqlite3.Connection] = None
+
+	def _connection(self) -> sqlite3.Connection:
+		# Only ever called on the executor thread
+		if self._conn is None:
+			conn = sqlite3.connect(self.path, check_same_thread=False)
+			conn.row_factory = sqlite3.Row
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			conn.executescript(_SQLITE_SCHEMA)
+			self._conn = conn
+		return self._conn
+
+	async def _run(self, fn, *args):
+		return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+	async def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+		return await self._run(lambda: self._connection().execute(sql, params).fetchall())
+
+	async def create_indexes(self, db: AsyncIOMotorDatabase) -> None:
+		await self._run(self._connection)
+
+	async def close(self) -> None:
+		def close() -> None:
+			if self._conn is not None:
+				self._conn.close()
+				self._conn = None
+		await self._run(close)
+
+	async def insert_user(self, db: AsyncIOMotorDatabase, doc: dict) -> str:
+		user_id = str(doc.setdefault("_id", ObjectId()))
+
+		def insert() -> None:
+			with self._connection() as conn:
+				conn.execute(
+					"INSERT INTO users (id, username, email, hashed_password, data_version, created_at, updated_at)"
+					" VALUES (?, ?, ?, ?, ?, ?, ?)",
+					(
+						user_id, doc["username"], doc["email"], doc["hashed_password"], doc.get("data_version", 0),
+						_timestamp(doc["created_at"]), _timestamp(doc["updated_at"])
+					)
+				)
+		try:
+			await self._run(insert)
+		except sqlite3.IntegrityError:
+			raise ValueError("Username or email already exists")
+		return user_id
+
+	async def find_user(self, db: AsyncIOMotorDatabase, field: str, value: str) -> Optional[dict]:
+		column = {"_id": "id", "username": "username", "email": "email"}[field]
+		records = await self._query(
+			f"SELECT id, username, email, hashed_password, data_version FROM users WHERE {column} = ?", (value,)
+		)
+		if not records:
+			return None
+		user = dict(records[0])
+		user["_id"] = user.pop("id")
+		return user
+
+	async def bump_data_version(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]:
+		def bump() -> Optional[int]:
+			with self._connection() as conn:
+				record = conn.execute(
+					"UPDATE users SET data_version = data_version + 1 WHERE id = ? RETURNING data_version", (user_id,)
+				).fetchone()
+			return record[0] if record else None
+		return await self._run(bump)
+
+	@staticmethod
+	def _insert_expenses(conn: sqlite3.Connection, docs: List[dict]) -> None:
+		conn.executemany(
+			"INSERT INTO expenses (id, user_id, description, amount, date, category, probability,"
+			" duplicate_of, dup_hash, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+			[
+				(
+					str(doc["_id"]), str(doc["user_id"]), doc["description"], doc["amount"], doc.get("date"),
+					doc["category"], doc.get("probability"),
+					str(doc["duplicate_of"]) if doc.get("duplicate_of") is not None else None,
+					doc.get("dup_hash"), _timestamp(doc["created_at"]), _timestamp(doc["updated_at"])
+				)
+				for doc in docs
+			]
+		)
+		conn.executemany(
+			"INSERT OR IGNORE INTO expense_dup_keys (user_id, key, expense_id) VALUES (?, ?, ?)",
+			[(str(doc["user_id"]), key, str(doc["_id"])) for doc in docs for key in doc.get("dup_keys", ())]
+		)
+
+	async def insert_one(self, db: AsyncIOMotorDatabase, doc: dict) -> None:
+		await self.insert_many(db, [doc])
+
+	async def insert_many(self, db: AsyncIOMotorDatabase, docs: List[dict]) -> None:
+		for doc in docs:
+			doc.setdefault("_id", ObjectId())
+
+		def insert() -> None:
+			with self._connection() as conn:
+				self._insert_expenses(conn, docs)
+		await self._run(insert)
+
+	async def find_rows(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> List[dict]:
+		return [_sqlite_row(record) for record in await self._query(*_newest_first_sql(user_id, date_from, date_to))]
+
+	async def iter_batches(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		batch_size: int,
+		date_from: Optional[str] = None,
+		date_to: Optional[str] = None
+	) -> AsyncIterator[List[dict]]:
+		sql, params = _newest_first_sql(user_id, date_from, date_to)
+		cursor = await self._run(lambda: self._connection().execute(sql, params))
+		try:
+			while True:
+				records = await self._run(cursor.fetchmany, batch_size)
+				if not records:
+					break
+				yield [_sqlite_row(record) for record in records]
+		finally:
+			await self._run(cursor.close)
+
+	async def find_row(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> Optional[dict]:
+		records = await self._query(
+			f"SELECT {_ROW_COLUMNS} FROM expenses WHERE id = ? AND user_id = ?", (expense_id, user_id)
+		)
+		return _sqlite_row(records[0]) if records else None
+
+	async def rows_changed_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[dict]:
+		records = await self._query(
+			f"SELECT {_ROW_COLUMNS} FROM expenses WHERE user_id = ? AND updated_at >= ? ORDER BY updated_at",
+			(user_id, _timestamp(since))
+		)
+		return [_sqlite_row(record) for record in records]
+
+	async def search(self, db: AsyncIOMotorDatabase, user_id: str, query: str, limit: int, offset: int) -> List[dict]:
+		return search_rows(await self.find_rows(db, user_id), query, limit, offset)
+
+	async def duplicate_candidates(self, db: AsyncIOMotorDatabase, user_id: str, docs: List[dict]) -> List[dict]:
+		keys = sorted({key for doc in docs for key in doc["dup_keys"]})
+		if not keys:
+			return []
+		records = await self._query(
+			"SELECT DISTINCT e.id, e.amount, e.date, e.dup_hash, e.duplicate_of FROM expense_dup_keys k"
+			" JOIN expenses e ON e.id = k.expense_id"
+			f" WHERE k.user_id = ? AND k.key IN ({', '.join('?' * len(keys))})",
+			(user_id, *keys)
+		)
+		candidates = []
+		for record in records:
+			candidate = {"_id": ObjectId(record["id"]), "amount": record["amount"], "date": record["date"]}
+			if record["dup_hash"] is not None:
+				candidate["dup_hash"] = record["dup_hash"]
+			if record["duplicate_of"] is not None:
+				candidate["duplicate_of"] = ObjectId(record["duplicate_of"])
+			candidates.append(candidate)
+		return candidates
+
+	async def update(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		expense_id: str,
+		fields: Dict[str, Any]
+	) -> Optional[dict]:
+		def update() -> Optional[dict]:
+			with self._connection() as conn:
+				# An edited expense is no longer treated as a duplicate
+				changed = conn.execute(
+					"UPDATE expenses SET description = ?, amount = ?, date = ?, category = ?, probability = ?,"
+					" dup_hash = ?, updated_at = ?, duplicate_of = NULL WHERE id = ? AND user_id = ?",
+					(
+						fields["description"], fields["amount"], fields["date"], fields["category"],
+						fields["probability"], fields.get("dup_hash"), _timestamp(fields["updated_at"]),
+						expense_id, user_id
+					)
+				).rowcount
+				if not changed:
+					return None
+				conn.execute("DELETE FROM expense_dup_keys WHERE user_id = ? AND expense_id = ?", (user_id, expense_id))
+				conn.executemany(
+					"INSERT OR IGNORE INTO expense_dup_keys (user_id, key, expense_id) VALUES (?, ?, ?)",
+					[(user_id, key, expense_id) for key in fields.get("dup_keys", ())]
+				)
+				record = conn.execute(f"SELECT {_ROW_COLUMNS} FROM expenses WHERE id = ?", (expense_id,)).fetchone()
+			return _sqlite_row(record)
+		return await self._run(update)
+
+	async def delete(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str) -> bool:
+		def delete() -> bool:
+			with self._connection() as conn:
+				deleted = conn.execute(
+					"DELETE FROM expenses WHERE id = ? AND user_id = ?", (expense_id, user_id)
+				).rowcount
+				conn.execute("DELETE FROM expense_dup_keys WHERE user_id = ? AND expense_id = ?", (user_id, expense_id))
+			return deleted > 0
+		return await self._run(delete)
+
+	async def promote_duplicates(
+		self,
+		db: AsyncIOMotorDatabase,
+		user_id: str,
+		original_id: str,
+		now: datetime
+	) -> List[dict]:
+		def promote() -> List[dict]:
+			with self._connection() as conn:
+				ids = [record[0] for record in conn.execute(
+					"SELECT id FROM expenses WHERE user_id = ? AND duplicate_of = ? ORDER BY created_at, id",
+					(user_id, original_id)
+				)]
+				if not ids:
+					return []
+				conn.execute(
+					"UPDATE expenses SET duplicate_of = NULL, updated_at = ? WHERE id = ?", (_timestamp(now), ids[0])
+				)
+				conn.execute(
+					"UPDATE expenses SET duplicate_of = ?, updated_at = ? WHERE user_id = ? AND duplicate_of = ?",
+					(ids[0], _timestamp(now), user_id, original_id)
+				)
+				records = {
+					record["id"]: record for record in conn.execute(
+						f"SELECT {_ROW_COLUMNS} FROM expenses WHERE id IN ({', '.join('?' * len(ids))})", ids
+					)
+				}
+			return [_sqlite_row(records[expense_id]) for expense_id in ids if expense_id in records]
+		return await self._run(promote)
+
+	async def set_classifications(
+		self,
+		db: AsyncIOMotorDatabase,
+		results: List[Tuple[ObjectId, ObjectId, str, str, float]],
+		now: datetime
+	) -> List[Tuple[str, dict]]:
+		def apply() -> List[Tuple[str, dict]]:
+			updated = []
+			with self._connection() as conn:
+				for expense_id, user_id, description, category, probability in results:
+					changed = conn.execute(
+						"UPDATE expenses SET category = ?, probability = ?, updated_at = ?"
+						" WHERE id = ? AND category = ? AND description = ?",
+						(category, probability, _timestamp(now), str(expense_id), PENDING_CATEGORY, description)
+					).rowcount
+					if changed:
+						record = conn.execute(
+							f"SELECT {_ROW_COLUMNS} FROM expenses WHERE id = ?", (str(expense_id),)
+						).fetchone()
+						updated.append((str(user_id), _sqlite_row(record)))
+			return updated
+		return await self._run(apply)
+
+	async def pending_expenses(self, db: AsyncIOMotorDatabase) -> List[dict]:
+		records = await self._query(
+			"SELECT id, user_id, description FROM expenses WHERE category = ?", (PENDING_CATEGORY,)
+		)
+		return [
+			{"_id": ObjectId(record["id"]), "user_id": ObjectId(record["user_id"]), "description": record["description"]}
+			for record in records
+		]
+
+	async def category_totals(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[List[dict]]:
+		records = await self._query(
+			"SELECT category, SUM(amount), COUNT(*) FROM expenses"
+			" WHERE user_id = ? AND duplicate_of IS NULL GROUP BY category",
+			(user_id,)
+		)
+		return _sorted_stats({record[0]: [record[1], record[2]] for record in records})
+
+	async def add_tombstone(self, db: AsyncIOMotorDatabase, user_id: str, expense_id: str, deleted_at: datetime) -> None:
+		def insert() -> None:
+			with self._connection() as conn:
+				conn.execute(
+					"INSERT INTO expense_tombstones (user_id, expense_id, deleted_at) VALUES (?, ?, ?)",
+					(user_id, expense_id, _timestamp(deleted_at))
+				)
+		await self._run(insert)
+
+	async def deleted_ids_since(self, db: AsyncIOMotorDatabase, user_id: str, since: datetime) -> List[str]:
+		records = await self._query(
+			"SELECT expense_id FROM expense_tombstones WHERE user_id = ? AND deleted_at >= ?",
+			(user_id, _timestamp(since))
+		)
+		return [record[0] for record in records]
+
+
+def get_storage_backend(name: str = STORAGE_BACKEND) -> StorageBackend:
+	"""Engine instance for a STORAGE_BACKEND name."""
+	if name == "mongo":
+		return MongoBackend(get_expense_layout())
+	if name == "memory":
+		return MemoryBackend()
+	if name == "sqlite":
+		return SQLiteBackend()
+	raise ValueError(f"Unknown storage backend {name!r}; expected mongo, memory or sqlite")
+
+
+# Engine used by app.services.storage and app.services.user_storage
+storage_backend = get_storage_backend()
@@ -0,0 +1,59 @@
+"""
+Delta-sync tokens for GET /expenses/changes.
+
+A sync token is an opaque, URL-safe encoding of the server time at which the
+previous changes query started. The next query returns expenses whose
+updated_at (and tombstones whose deleted_at) is at or after that time minus
+SYNC_OVERLAP_SECONDS, so writes that were in flight while the previous sync
+ran are not missed. Clients apply changes as idempotent upserts by id, so
+the few rows repeated by the overlap are harmless.
+
+Tombstones expire after SYNC_TOMBSTONE_TTL_DAYS; a token older than that can
+no longer be answered incrementally and the client is told to reset.
+"""
+import base64
+import os
+import struct
+from datetime import datetime, timedelta
+from typing import Optional
+
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+SYNC_TOMBSTONE_TTL_DAYS = int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", "30"))
+
+_TOKEN = struct.Struct(">Bq")
+_TOKEN_VERSION = 1
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_sync_token(at: datetime) -> str:
+	"""Encode a naive UTC timestamp (millisecond precision, as stored by MongoDB)."""
+	millis = (at - _EPOCH) // timedelta(milliseconds=1)
+	return base64.urlsafe_b64encode(_TOKEN.pack(_TOKEN_VERSION, millis)).decode("ascii").rstrip("=")
+
+
+def decode_sync_token(token: str) -> datetime:
+	"""
+	Decode a token produced by encode_sync_token.
+
+	Raises:
+		ValueError: If the token is malformed or from an unknown version
+	"""
+	try:
+		raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+		version, millis = _TOKEN.unpack(raw)
+	except Exception:
+		raise ValueError("Invalid sync token")
+	if version != _TOKEN_VERSION:
+		raise ValueError("Invalid sync token")
+	return _EPOCH + timedelta(milliseconds=millis)
+
+
+def changes_window_start(since: datetime) -> datetime:
+	"""Lower bound for updated_at/deleted_at when syncing from a token."""
+	return since - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+
+def token_expired(since: datetime, now: Optional[datetime] = None) -> bool:
+	"""True when tombstones newer than the token may already have been purged."""
+	now = now or datetime.utcnow()
+	return since < now - timedelta(days=SYNC_TOMBSTONE_TTL_DAYS)
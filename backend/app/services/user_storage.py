@@ -1,12 +1,18 @@
-"""User storage using MongoDB."""
+"""User storage on the configured storage backend (MongoDB by default)."""
 from typing import Optional
 from datetime import datetime
-from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from ..models.schemas import User, UserCreate
 from .auth import get_password_hash
+from .metrics import track_mongo
+from .singleflight import SingleFlight
+from .storage_backends import storage_backend
 
+# Concurrent authentications of the same user share one lookup
+user_reads = SingleFlight("users")
 
+
+@track_mongo("create_user")
 async def create_user(db: AsyncIOMotorDatabase, user_create: UserCreate) -> User:
 	"""
 	Create a new user in MongoDB.
@@ -22,12 +28,12 @@ async def create_user(db: AsyncIOMotorDatabase, user_create: UserCreate) -> User
 		ValueError: If username or email already exists
 	"""
 	# Check if username exists
-	existing_user = await db.users.find_one({"username": user_create.username})
+	existing_user = await storage_backend.find_user(db, "username", user_create.username)
 	if existing_user:
 		raise ValueError("Username already exists")
 	
 	# Check if email exists
-	existing_email = await db.users.find_one({"email": user_create.email})
+	existing_email = await storage_backend.find_user(db, "email", user_create.email)
 	if existing_email:
 		raise ValueError("Email already exists")
 	
@@ -36,19 +42,21 @@ async def create_user(db: AsyncIOMotorDatabase, user_create: UserCreate) -> User
 		"username": user_create.username,
 		"email": user_create.email,
 		"hashed_password": get_password_hash(user_create.password),
+		"data_version": 0,
 		"created_at": datetime.utcnow(),
 		"updated_at": datetime.utcnow()
 	}
 	
-	result = await db.users.insert_one(user_doc)
+	user_id = await storage_backend.insert_user(db, user_doc)
 	
 	return User(
-		id=str(result.inserted_id),
+		id=user_id,
 		username=user_doc["username"],
 		email=user_doc["email"]
 	)
 
 
+@track_mongo("get_user_by_username")
 async def get_user_by_username(db: AsyncIOMotorDatabase, username: str) -> Optional[dict]:
 	"""
 	Get user by username (returns dict with hashed_password).
@@ -58,20 +66,26 @@ async def get_user_by_username(db: AsyncIOMotorDatabase, username: str) -> Optio
 		username: Username to search for
 	
 	Returns:
-		User dict with hashed_password, or None if not found
+		User dict with hashed_password and data_version, or None if not found
+		(shared with concurrent callers; do not mutate)
 	"""
-	user_doc = await db.users.find_one({"username": username})
-	if not user_doc:
-		return None
+	async def query() -> Optional[dict]:
+		user_doc = await storage_backend.find_user(db, "username", username)
+		if not user_doc:
+			return None
+		
+		return {
+			"id": str(user_doc["_id"]),
+			"username": user_doc["username"],
+			"email": user_doc["email"],
+			"hashed_password": user_doc["hashed_password"],
+			"data_version": user_doc.get("data_version", 0)
+		}
 	
-	return {
-		"id": str(user_doc["_id"]),
-		"username": user_doc["username"],
-		"email": user_doc["email"],
-		"hashed_password": user_doc["hashed_password"]
-	}
+	return await user_reads.do(username, ("by_username",), query)
 
 
+@track_mongo("get_user_by_email")
 async def get_user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[User]:
 	"""
 	Get user by email.
@@ -83,7 +97,7 @@ async def get_user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[Us
 	Returns:
 		User (without password), or None if not found
 	"""
-	user_doc = await db.users.find_one({"email": email})
+	user_doc = await storage_backend.find_user(db, "email", email)
 	if not user_doc:
 		return None
 	
@@ -94,6 +108,7 @@ async def get_user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[Us
 	)
 
 
+@track_mongo("get_user_by_id")
 async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> Optional[User]:
 	"""
 	Get user by ID.
@@ -106,7 +121,7 @@ async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> Optional[Use
 		User (without password), or None if not found
 	"""
 	try:
-		user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
+		user_doc = await storage_backend.find_user(db, "_id", user_id)
 		if not user_doc:
 			return None
 		
@@ -117,3 +132,18 @@ async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> Optional[Use
 		)
 	except Exception:
 		return None
+
+
+@track_mongo("bump_data_version")
+async def bump_data_version(db: AsyncIOMotorDatabase, user_id: str) -> Optional[int]:
+	"""
+	Atomically increment a user's data version after one of their expenses changed.
+	
+	Args:
+		db: MongoDB database instance
+		user_id: User ID (MongoDB ObjectId as string)
+	
+	Returns:
+		The new data version, or None if the user does not exist
+	"""
+	return await storage_backend.bump_data_version(db, user_id)
@@ -0,0 +1,147 @@
+"""
+Write-behind coalescing of single-document inserts into insert_many.
+
+With INSERT_BATCHING enabled, concurrent inserts are buffered for up to
+INSERT_BATCH_MAX_DELAY_MS or INSERT_BATCH_MAX_DOCS documents and written
+with one unordered insert_many. _id values are generated client-side, so
+every caller gets its own id back, and a failed document (e.g. a duplicate
+key) fails only that caller's future. A write concern error (e.g. a
+w:majority timeout) fails every document that was not rejected outright
+with WriteConcernError, as insert_one would have raised it.
+
+Each caller still waits for the acknowledged insert_many, so durability is
+the same as insert_one under the client's write concern. On shutdown,
+pending documents are flushed (INSERT_BATCH_FLUSH_ON_SHUTDOWN=true, the
+default) or failed with an error so callers can report it.
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+from app.services.metrics import Histogram, track_mongo
+
+INSERT_BATCHING = os.getenv("INSERT_BATCHING", "false").lower() in ("1", "true", "yes")
+INSERT_BATCH_MAX_DOCS = int(os.getenv("INSERT_BATCH_MAX_DOCS", "100"))
+INSERT_BATCH_MAX_DELAY_MS = float(os.getenv("INSERT_BATCH_MAX_DELAY_MS", "5"))
+INSERT_BATCH_FLUSH_ON_SHUTDOWN = os.getenv("INSERT_BATCH_FLUSH_ON_SHUTDOWN", "true").lower() in ("1", "true", "yes")
+
+INSERT_BATCH_SIZE = Histogram(
+	"insert_batch_documents",
+	"Documents written per coalesced insert_many, by collection.",
+	("collection",),
+	buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+
+class InsertBatcher:
+	"""Coalesces inserts into one collection; see the module docstring."""
+
+	def __init__(
+		self,
+		collection: str,
+		enabled: bool = INSERT_BATCHING,
+		max_docs: int = INSERT_BATCH_MAX_DOCS,
+		max_delay_ms: float = INSERT_BATCH_MAX_DELAY_MS,
+		flush_on_shutdown: bool = INSERT_BATCH_FLUSH_ON_SHUTDOWN
+	):
+		self.collection = collection
+		self.enabled = enabled
+		self.max_docs = max_docs
+		self.max_delay = max_delay_ms / 1000
+		self.flush_on_shutdown = flush_on_shutdown
+		self._db: Optional[AsyncIOMotorDatabase] = None
+		self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+		self._timer: Optional[asyncio.TimerHandle] = None
+		self._flushes: set = set()
+		self._closed = False
+
+	async def insert(self, db: AsyncIOMotorDatabase, document: Dict[str, Any]) -> ObjectId:
+		"""
+		Insert a document, possibly batched with concurrent inserts.
+
+		Args:
+			db: MongoDB database instance
+			document: Document to insert; an _id is assigned if missing
+
+		Returns:
+			The document's _id
+
+		Raises:
+			DuplicateKeyError, WriteError: If this document was rejected
+			WriteConcernError: If the write concern was not satisfied
+		"""
+		document.setdefault("_id", ObjectId())
+		if not self.enabled or self._closed:
+			await db[self.collection].insert_one(document)
+			return document["_id"]
+
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		self._db = db
+		self._pending.append((document, future))
+		if len(self._pending) >= self.max_docs:
+			self._schedule_flush()
+		elif self._timer is None:
+			self._timer = loop.call_later(self.max_delay, self._schedule_flush)
+		return await future
+
+	def _schedule_flush(self) -> None:
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		if not self._pending:
+			return
+		batch, self._pending = self._pending, []
+		task = asyncio.ensure_future(self._flush(self._db, batch))
+		self._flushes.add(task)
+		task.add_done_callback(self._flushes.discard)
+
+	@track_mongo("insert_many_batched")
+	async def _flush(self, db: AsyncIOMotorDatabase, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+		INSERT_BATCH_SIZE.observe(len(batch), self.collection)
+		failed: Dict[int, Exception] = {}
+		try:
+			await db[self.collection].insert_many([document for document, _ in batch], ordered=False)
+		except BulkWriteError as e:
+			for error in e.details.get("writeErrors", []):
+				error_class = DuplicateKeyError if error.get("code") == 11000 else WriteError
+				failed[error["index"]] = error_class(error.get("errmsg", "Write error"), error.get("code"), error)
+			concern_errors = e.details.get("writeConcernErrors", [])
+			if concern_errors:
+				# Written but not acknowledged as durable: report it like insert_one would
+				error = concern_errors[0]
+				concern_error = WriteConcernError(error.get("errmsg", "Write concern error"), error.get("code"), error)
+				for index in range(len(batch)):
+					failed.setdefault(index, concern_error)
+		except Exception as e:
+			# Outcome unknown for the whole batch (e.g. network error)
+			failed = {index: e for index in range(len(batch))}
+
+		for index, (document, future) in enumerate(batch):
+			if future.done():
+				continue
+			if index in failed:
+				future.set_exception(failed[index])
+			else:
+				future.set_result(document["_id"])
+
+	async def close(self) -> None:
+		"""Stop batching; flush or fail whatever is still pending."""
+		self._closed = True
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		if self._pending and not self.flush_on_shutdown:
+			batch, self._pending = self._pending, []
+			for _, future in batch:
+				if not future.done():
+					future.set_exception(RuntimeError("Server shutting down; document was not saved"))
+		self._schedule_flush()
+		if self._flushes:
+			await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+# Used by app.services.storage.create_expense
+expense_inserts = InsertBatcher("expenses")
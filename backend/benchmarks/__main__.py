@@ -0,0 +1,195 @@
+"""
+Benchmark command line.
+
+Run from the backend/ directory:
+
+	# Seed the MongoDB configured by MONGODB_URL
+	python -m benchmarks seed --users 1000 --expenses 1000000
+
+	# Drive the app in-process against the seeded database
+	python -m benchmarks load --concurrency 50 --duration 30 --output results.json
+
+	# Self-contained run against an in-process MongoDB stand-in (mongomock-motor)
+	python -m benchmarks load --inprocess-db --users 50 --expenses 20000 --output results.json
+
+	# Drive an already running server instead of the in-process app
+	python -m benchmarks load --base-url http://localhost:8000 --output results.json
+
+	# Compare two runs; exits with status 1 if any metric regressed
+	python -m benchmarks compare baseline.json results.json --threshold 10
+
+Extra dependencies are listed in benchmarks/requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import List
+
+from benchmarks.datagen import BENCH_USERNAME_PREFIX, seed_database
+
+
+def use_inprocess_database():
+	"""Point app.database at an in-process MongoDB stand-in."""
+	try:
+		from mongomock_motor import AsyncMongoMockClient
+	except ImportError:
+		sys.exit("--inprocess-db requires mongomock-motor (pip install -r benchmarks/requirements.txt)")
+	import app.database as database
+
+	client = AsyncMongoMockClient()
+	database._client = client
+	database._database = client[database.DATABASE_NAME]
+	return database._database
+
+
+async def _existing_usernames(db, limit: int) -> List[str]:
+	cursor = db.users.find({"username": {"$regex": f"^{BENCH_USERNAME_PREFIX}"}}, {"username": 1}).limit(limit)
+	return [doc["username"] async for doc in cursor]
+
+
+async def _seed(args) -> None:
+	from app.database import get_database
+
+	users = await seed_database(
+		get_database(), args.users, args.expenses, years=args.years, skew=args.skew, seed=args.seed,
+		batch_size=args.batch_size
+	)
+	print(json.dumps({
+		"users": len(users),
+		"expenses": sum(u["expenses"] for u in users),
+		"max_expenses_per_user": max((u["expenses"] for u in users), default=0),
+	}))
+
+
+async def _load(args) -> None:
+	import httpx
+	from benchmarks.loadtest import DEFAULT_MIX, build_report, run_load, write_report
+
+	mix = dict(DEFAULT_MIX)
+	if args.mix:
+		mix = json.loads(args.mix)
+
+	if args.base_url:
+		# Remote server: usernames must already exist in its database
+		from app.database import get_database
+
+		usernames = await _existing_usernames(get_database(), args.users or 1000)
+		client = httpx.AsyncClient(
+			base_url=args.base_url,
+			timeout=args.timeout,
+			limits=httpx.Limits(max_connections=args.concurrency)
+		)
+		app = None
+	else:
+		from app.database import get_database
+
+		db = use_inprocess_database() if args.inprocess_db else get_database()
+		if args.inprocess_db or args.expenses:
+			seeded = await seed_database(
+				db, args.users or 50, args.expenses or 10_000, years=args.years, skew=args.skew, seed=args.seed
+			)
+			usernames = [u["username"] for u in seeded]
+		else:
+			usernames = await _existing_usernames(db, args.users or 1000)
+
+		from app.main import app
+		from app.services.readiness import startup_tracker
+
+		await app.router.startup()
+		if not await startup_tracker.wait_ready(timeout=120):
+			sys.exit(f"App did not become ready: {startup_tracker.report()}")
+		client = httpx.AsyncClient(
+			transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout
+		)
+
+	if not usernames:
+		sys.exit("No benchmark users found; run `python -m benchmarks seed` first")
+
+	try:
+		results = await run_load(
+			client, usernames, concurrency=args.concurrency, duration=args.duration,
+			warmup=args.warmup, mix=mix, seed=args.seed
+		)
+	finally:
+		await client.aclose()
+		if app is not None:
+			await app.router.shutdown()
+
+	config = {
+		"target": args.base_url or ("inprocess-db" if args.inprocess_db else "inprocess-app"),
+		"concurrency": args.concurrency,
+		"duration_s": args.duration,
+		"warmup_s": args.warmup,
+		"users": len(usernames),
+		"seeded_expenses": args.expenses,
+		"mix": mix,
+	}
+	report = build_report(results, config)
+	if args.output:
+		write_report(report, args.output)
+	print(json.dumps(report["endpoints"], indent=2))
+	print(f"total: {report['total_requests']} requests, {report['throughput_rps']} req/s")
+
+
+def _compare(args) -> None:
+	from benchmarks.loadtest import compare_reports
+
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	with open(args.candidate) as f:
+		candidate = json.load(f)
+	rows = compare_reports(baseline, candidate, args.threshold)
+	regressed = False
+	for row in rows:
+		flag = "REGRESSION" if row["regression"] else ""
+		regressed = regressed or row["regression"]
+		print(
+			f"{row['endpoint']:<22} {row['metric']:<15} {row['baseline']:>10} -> "
+			f"{row['candidate']:>10} ({row['change_pct']:+.1f}%) {flag}"
+		)
+	sys.exit(1 if regressed else 0)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m benchmarks", description="PennyWise backend benchmarks")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	def add_data_args(p, users_default, expenses_default):
+		p.add_argument("--users", type=int, default=users_default, help="benchmark users to seed or use")
+		p.add_argument("--expenses", type=int, default=expenses_default, help="total expenses to seed")
+		p.add_argument("--years", type=float, default=3.0, help="years of history to spread expenses over")
+		p.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of expenses per user")
+		p.add_argument("--seed", type=int, default=42)
+
+	seed = sub.add_parser("seed", help="seed users and expenses")
+	add_data_args(seed, 1000, 100_000)
+	seed.add_argument("--batch-size", type=int, default=10_000)
+
+	load = sub.add_parser("load", help="run the concurrent load test")
+	add_data_args(load, None, None)
+	load.add_argument("--inprocess-db", action="store_true", help="seed and use mongomock-motor instead of MongoDB")
+	load.add_argument("--base-url", help="target a running server instead of the in-process app")
+	load.add_argument("--concurrency", type=int, default=20)
+	load.add_argument("--duration", type=float, default=30.0)
+	load.add_argument("--warmup", type=float, default=2.0)
+	load.add_argument("--timeout", type=float, default=30.0)
+	load.add_argument("--mix", help='JSON endpoint weights, e.g. \'{"GET /expenses": 1}\'')
+	load.add_argument("--output", help="write the JSON report to this path")
+
+	compare = sub.add_parser("compare", help="compare two JSON reports")
+	compare.add_argument("baseline")
+	compare.add_argument("candidate")
+	compare.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+
+	args = parser.parse_args()
+	if args.command == "seed":
+		asyncio.run(_seed(args))
+	elif args.command == "load":
+		asyncio.run(_load(args))
+	else:
+		_compare(args)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,224 @@
+"""
+Classifier micro-benchmark and accuracy/latency comparison harness.
+
+Each variant is a factory returning an unfitted sklearn Pipeline that is
+plugged into ExpenseClassifier. For every variant the harness measures fit
+time, single-item predict latency (through ExpenseClassifier.predict, i.e. the
+request path), batched predict throughput, model size and peak fit memory, and
+accuracy/macro-F1 on a held-out labeled set.
+
+The held-out set is generated from HELDOUT_PROFILES (other merchants and
+wording than the training templates), so the scores measure how a variant
+generalizes rather than how well it memorizes the generator. Accuracy on
+a split of the training distribution is reported alongside as
+in_distribution_accuracy.
+
+	python -m benchmarks.classifier_bench
+	python -m benchmarks.classifier_bench --variants baseline,char_wb --corpus 50000 --output clf.json
+	python -m benchmarks.classifier_bench --variants mypkg.models:build_pipeline
+"""
+import argparse
+import importlib
+import json
+import pickle
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.naive_bayes import ComplementNB
+from sklearn.pipeline import Pipeline
+from app.services.classifier import ExpenseClassifier
+from benchmarks.datagen import generate_labeled_corpus
+from benchmarks.loadtest import percentile
+
+
+def _tfidf(**overrides) -> TfidfVectorizer:
+	params = dict(max_features=1000, ngram_range=(1, 2), stop_words='english', lowercase=True)
+	params.update(overrides)
+	return TfidfVectorizer(**params)
+
+
+# Variant name -> factory returning an unfitted pipeline
+VARIANTS: Dict[str, Callable[[], Pipeline]] = {
+	"baseline": ExpenseClassifier.build_pipeline,
+	"unigram": lambda: Pipeline([
+		('tfidf', _tfidf(ngram_range=(1, 1))),
+		('classifier', LogisticRegression(max_iter=1000, random_state=42)),
+	]),
+	"bigram_5k": lambda: Pipeline([
+		('tfidf', _tfidf(max_features=5000)),
+		('classifier', LogisticRegression(max_iter=1000, random_state=42)),
+	]),
+	"char_wb": lambda: Pipeline([
+		('tfidf', _tfidf(analyzer='char_wb', ngram_range=(2, 4), max_features=5000, stop_words=None)),
+		('classifier', LogisticRegression(max_iter=1000, random_state=42)),
+	]),
+	"complement_nb": lambda: Pipeline([
+		('tfidf', _tfidf(max_features=5000)),
+		('classifier', ComplementNB()),
+	]),
+	"sgd_log": lambda: Pipeline([
+		('tfidf', _tfidf(max_features=5000)),
+		('classifier', SGDClassifier(loss='log_loss', random_state=42)),
+	]),
+}
+
+
+def resolve_variant(name: str) -> Callable[[], Pipeline]:
+	"""Look up a built-in variant or import one given as module:function."""
+	if name in VARIANTS:
+		return VARIANTS[name]
+	if ":" in name:
+		module_name, attr = name.split(":", 1)
+		return getattr(importlib.import_module(module_name), attr)
+	raise SystemExit(f"Unknown variant {name!r}; choose from {', '.join(VARIANTS)} or use module:function")
+
+
+def _train_test_split(
+	texts: List[str], labels: List[str], test_fraction: float
+) -> Tuple[Tuple[List[str], List[str]], Tuple[List[str], List[str]]]:
+	cut = int(len(texts) * (1 - test_fraction))
+	return (texts[:cut], labels[:cut]), (texts[cut:], labels[cut:])
+
+
+def benchmark_variant(
+	name: str,
+	factory: Callable[[], Pipeline],
+	train: Tuple[List[str], List[str]],
+	test: Tuple[List[str], List[str]],
+	in_distribution_test: Tuple[List[str], List[str]],
+	single_iterations: int = 500,
+	batch_size: int = 1000
+) -> Dict[str, object]:
+	"""Fit one variant and collect speed, memory and quality numbers."""
+	tracemalloc.start()
+	start = time.perf_counter()
+	classifier = ExpenseClassifier(pipeline=factory(), training_data=train)
+	fit_seconds = time.perf_counter() - start
+	_, fit_peak_bytes = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	test_texts, test_labels = test
+
+	# Single-item latency through the same code path as POST /classify
+	singles = []
+	for i in range(single_iterations):
+		text = test_texts[i % len(test_texts)]
+		t0 = time.perf_counter()
+		classifier.predict(text)
+		singles.append(time.perf_counter() - t0)
+	singles.sort()
+
+	# Batched throughput
+	batch = (test_texts * (batch_size // max(1, len(test_texts)) + 1))[:batch_size]
+	t0 = time.perf_counter()
+	classifier.predict_batch(batch)
+	batch_seconds = time.perf_counter() - t0
+
+	predicted = [result[0] for result in classifier.predict_batch(test_texts)]
+	in_distribution_texts, in_distribution_labels = in_distribution_test
+	in_distribution_predicted = [result[0] for result in classifier.predict_batch(in_distribution_texts)]
+	tfidf = classifier.pipeline.steps[0][1]
+
+	return {
+		"variant": name,
+		"train_size": len(train[0]),
+		"test_size": len(test_texts),
+		"fit_seconds": round(fit_seconds, 4),
+		"fit_peak_memory_bytes": fit_peak_bytes,
+		"model_size_bytes": len(pickle.dumps(classifier.pipeline)),
+		"vocabulary_size": len(getattr(tfidf, "vocabulary_", {})),
+		"single_predict_p50_us": round(percentile(singles, 50) * 1e6, 1),
+		"single_predict_p99_us": round(percentile(singles, 99) * 1e6, 1),
+		"single_predict_mean_us": round(statistics.fmean(singles) * 1e6, 1),
+		"batch_size": batch_size,
+		"batch_predict_seconds": round(batch_seconds, 4),
+		"batch_predict_per_item_us": round(batch_seconds / batch_size * 1e6, 2),
+		"accuracy": round(accuracy_score(test_labels, predicted), 4),
+		"macro_f1": round(f1_score(test_labels, predicted, average="macro", zero_division=0), 4),
+		"in_distribution_accuracy": round(accuracy_score(in_distribution_labels, in_distribution_predicted), 4),
+	}
+
+
+def run(
+	variant_names: List[str],
+	corpus_size: int = 20_000,
+	test_fraction: float = 0.2,
+	train_on: str = "seed+synthetic",
+	seed: int = 7
+) -> Dict[str, object]:
+	"""
+	Benchmark the requested variants on the same data.
+
+	Args:
+		variant_names: Built-in variant names or module:function specs
+		corpus_size: Size of the synthetic labeled corpus
+		test_fraction: Size of the held-out sets relative to the synthetic corpus
+		train_on: "seed" (production training set) or "seed+synthetic"
+		seed: Random seed for the synthetic corpus
+	"""
+	seed_texts, seed_labels = ExpenseClassifier._get_seed_data()
+	texts, labels = generate_labeled_corpus(corpus_size, seed=seed)
+	(synthetic_train, synthetic_labels), in_distribution_test = _train_test_split(texts, labels, test_fraction)
+	test = generate_labeled_corpus(max(1, int(corpus_size * test_fraction)), seed=seed + 1, heldout=True)
+
+	if train_on == "seed":
+		train = (seed_texts, seed_labels)
+	else:
+		train = (seed_texts + synthetic_train, seed_labels + synthetic_labels)
+
+	results = [
+		benchmark_variant(name, resolve_variant(name), train, test, in_distribution_test)
+		for name in variant_names
+	]
+	return {
+		"config": {
+			"corpus_size": corpus_size,
+			"test_fraction": test_fraction,
+			"train_on": train_on,
+			"seed": seed,
+		},
+		"variants": results,
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m benchmarks.classifier_bench")
+	parser.add_argument("--variants", default=",".join(VARIANTS), help="comma-separated variants")
+	parser.add_argument("--corpus", type=int, default=20_000, help="synthetic labeled corpus size")
+	parser.add_argument("--test-fraction", type=float, default=0.2)
+	parser.add_argument("--train-on", choices=["seed", "seed+synthetic"], default="seed+synthetic")
+	parser.add_argument("--seed", type=int, default=7)
+	parser.add_argument("--output", help="write the JSON report to this path")
+	args = parser.parse_args()
+
+	report = run(
+		[name.strip() for name in args.variants.split(",") if name.strip()],
+		corpus_size=args.corpus,
+		test_fraction=args.test_fraction,
+		train_on=args.train_on,
+		seed=args.seed
+	)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2)
+
+	header = (
+		f"{'variant':<16}{'fit s':>8}{'p50 us':>9}{'p99 us':>9}{'batch us':>10}{'size KB':>9}"
+		f"{'acc':>7}{'F1':>7}{'in-dist':>9}"
+	)
+	print(header)
+	for row in report["variants"]:
+		print(
+			f"{row['variant']:<16}{row['fit_seconds']:>8.3f}{row['single_predict_p50_us']:>9.0f}"
+			f"{row['single_predict_p99_us']:>9.0f}{row['batch_predict_per_item_us']:>10.1f}"
+			f"{row['model_size_bytes'] / 1024:>9.0f}{row['accuracy']:>7.3f}{row['macro_f1']:>7.3f}"
+			f"{row['in_distribution_accuracy']:>9.3f}"
+		)
+
+
+if __name__ == "__main__":
+	main()
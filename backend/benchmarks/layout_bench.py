@@ -0,0 +1,157 @@
+"""
+Document vs bucket expense layout: storage, index size and read latency.
+
+Seeds the same generated expenses into both layouts (the expenses and
+expense_buckets collections of one database) and reports, per layout:
+
+- collStats: documents, data size, storage size, index count and size.
+  Storage + index size is the RAM the layout needs to keep a hot working
+  set; on MongoDB the index part must fit in the WiredTiger cache.
+- bytes read for one user's full history (BSON size of what a list reads).
+- p50/p95 latency of listing a user's expenses and of computing their
+  category stats (rows aggregated in Python vs summed bucket totals).
+
+	python -m benchmarks.layout_bench --users 100 --expenses 200000
+	python -m benchmarks.layout_bench --inprocess-db --users 20 --expenses 20000
+
+collStats is not available in-process, so --inprocess-db only compares
+bytes read and latency. Benchmark data is written under fresh user ids
+and removed afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+import bson
+from bson import ObjectId
+from app.services.duplicates import fingerprint
+from app.services.expense_layouts import LAYOUTS
+from app.services.stats import aggregate_rows_by_category
+from benchmarks.datagen import generate_expense_docs, split_expenses
+
+_COLLECTIONS = {"document": "expenses", "bucket": "expense_buckets"}
+
+
+async def _seed(db, user_ids: List[ObjectId], counts: List[int], years: float, seed: int) -> None:
+	rng = random.Random(seed)
+	for user_id, count in zip(user_ids, counts):
+		docs = []
+		for doc in generate_expense_docs(rng, user_id, count, years):
+			doc["dup_hash"], doc["dup_keys"] = fingerprint(doc["description"], doc["amount"], doc["date"])
+			docs.append(doc)
+		for layout in LAYOUTS.values():
+			if docs:
+				await layout.insert_many(db, [{**doc, "_id": ObjectId()} for doc in docs])
+
+
+async def _coll_stats(db, collection: str) -> Dict[str, int]:
+	try:
+		stats = await db.command("collStats", collection)
+	except Exception:
+		return {}
+	return {
+		"documents": stats.get("count"),
+		"size_bytes": stats.get("size"),
+		"storage_bytes": stats.get("storageSize"),
+		"indexes": stats.get("nindexes"),
+		"index_bytes": stats.get("totalIndexSize"),
+		"working_set_bytes": (stats.get("storageSize") or 0) + (stats.get("totalIndexSize") or 0)
+	}
+
+
+async def _bytes_read(db, name: str, user_id: ObjectId) -> int:
+	collection = db[_COLLECTIONS[name]]
+	return sum([len(bson.encode(doc)) async for doc in collection.find({"user_id": user_id})])
+
+
+def _percentiles(timings: List[float]) -> Dict[str, float]:
+	timings = sorted(timings)
+	return {
+		"p50_ms": round(statistics.median(timings) * 1000, 3),
+		"p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3)
+	}
+
+
+async def _latency(db, name: str, user_ids: List[ObjectId], repeat: int) -> Dict[str, Dict[str, float]]:
+	layout = LAYOUTS[name]
+	list_timings, stats_timings = [], []
+	for _ in range(repeat):
+		for user_id in user_ids:
+			start = time.perf_counter()
+			await layout.find_rows(db, str(user_id))
+			list_timings.append(time.perf_counter() - start)
+
+			start = time.perf_counter()
+			totals = await layout.category_totals(db, str(user_id))
+			if totals is None:
+				aggregate_rows_by_category(await layout.find_rows(db, str(user_id)))
+			stats_timings.append(time.perf_counter() - start)
+	return {"list": _percentiles(list_timings), "stats": _percentiles(stats_timings)}
+
+
+async def run(db, users: int, expenses: int, years: float, seed: int, repeat: int, keep: bool) -> dict:
+	user_ids = [ObjectId() for _ in range(users)]
+	counts = split_expenses(random.Random(seed), expenses, users)
+	for layout in LAYOUTS.values():
+		await layout.create_indexes(db)
+	await _seed(db, user_ids, counts, years, seed)
+
+	heaviest = user_ids[counts.index(max(counts))]
+	report = {"users": users, "expenses": expenses, "layouts": {}}
+	try:
+		for name in LAYOUTS:
+			report["layouts"][name] = {
+				"collection": await _coll_stats(db, _COLLECTIONS[name]),
+				"heaviest_user_bytes_read": await _bytes_read(db, name, heaviest),
+				"latency": await _latency(db, name, user_ids, repeat)
+			}
+	finally:
+		if not keep:
+			for layout in LAYOUTS.values():
+				for user_id in user_ids:
+					await layout.delete_user(db, user_id)
+	return report
+
+
+async def _main(args) -> dict:
+	if args.inprocess_db:
+		from benchmarks.__main__ import use_inprocess_database
+		db = use_inprocess_database()
+	else:
+		from app.database import get_database
+		db = get_database()
+	return await run(db, args.users, args.expenses, args.years, args.seed, args.repeat, args.keep)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m benchmarks.layout_bench")
+	parser.add_argument("--users", type=int, default=20)
+	parser.add_argument("--expenses", type=int, default=20_000)
+	parser.add_argument("--years", type=float, default=3.0)
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--inprocess-db", action="store_true", help="use mongomock-motor instead of MongoDB")
+	parser.add_argument("--keep", action="store_true", help="leave the benchmark data in place")
+	parser.add_argument("--output", help="write the JSON report to this path")
+	args = parser.parse_args()
+
+	report = asyncio.run(_main(args))
+	print(f"{'layout':<10}{'docs':>10}{'index MB':>10}{'store MB':>10}{'read KB':>10}{'list p50':>10}{'stats p50':>11}")
+	for name, result in report["layouts"].items():
+		collection = result["collection"]
+		mb = lambda key: f"{collection[key] / 2**20:.1f}" if collection.get(key) is not None else "n/a"
+		print(
+			f"{name:<10}{collection.get('documents', 'n/a'):>10}{mb('index_bytes'):>10}{mb('storage_bytes'):>10}"
+			f"{result['heaviest_user_bytes_read'] / 1024:>10.1f}"
+			f"{result['latency']['list']['p50_ms']:>9.2f}ms{result['latency']['stats']['p50_ms']:>9.2f}ms"
+		)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,245 @@
+"""
+Concurrent load driver for the FastAPI app.
+
+Each virtual client logs in as a seeded benchmark user and then issues a
+weighted mix of requests until the deadline. Latency is recorded per endpoint
+and summarised as throughput plus p50/p95/p99.
+"""
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import httpx
+from benchmarks.datagen import BENCH_PASSWORD, generate_amount, generate_description, pick_category
+
+# Endpoint key -> relative weight in the request mix
+DEFAULT_MIX: Dict[str, float] = {
+	"POST /classify": 0.25,
+	"GET /expenses": 0.30,
+	"GET /stats/category": 0.25,
+	"POST /expenses": 0.10,
+	"POST /auth/login": 0.10,
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+	"""Nearest-rank percentile of an already sorted list."""
+	if not sorted_values:
+		return 0.0
+	rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+	return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LatencyRecorder:
+	"""Collects per-endpoint latencies and error counts."""
+
+	def __init__(self):
+		self.latencies: Dict[str, List[float]] = {}
+		self.errors: Dict[str, int] = {}
+		self.statuses: Dict[str, Dict[str, int]] = {}
+
+	def record(self, endpoint: str, seconds: float, status: Optional[int]) -> None:
+		self.latencies.setdefault(endpoint, []).append(seconds)
+		statuses = self.statuses.setdefault(endpoint, {})
+		key = str(status) if status is not None else "exception"
+		statuses[key] = statuses.get(key, 0) + 1
+		if status is None or status >= 400:
+			self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+	def summary(self, elapsed: float) -> Dict[str, dict]:
+		results = {}
+		for endpoint, values in sorted(self.latencies.items()):
+			values = sorted(values)
+			results[endpoint] = {
+				"count": len(values),
+				"errors": self.errors.get(endpoint, 0),
+				"statuses": self.statuses.get(endpoint, {}),
+				"throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+				"mean_ms": round(sum(values) / len(values) * 1000, 3),
+				"p50_ms": round(percentile(values, 50) * 1000, 3),
+				"p95_ms": round(percentile(values, 95) * 1000, 3),
+				"p99_ms": round(percentile(values, 99) * 1000, 3),
+				"max_ms": round(values[-1] * 1000, 3),
+			}
+		return results
+
+
+async def _timed_request(
+	client: httpx.AsyncClient,
+	recorder: LatencyRecorder,
+	endpoint: str,
+	method: str,
+	url: str,
+	**kwargs
+) -> Optional[httpx.Response]:
+	start = time.perf_counter()
+	try:
+		response = await client.request(method, url, **kwargs)
+	except httpx.HTTPError:
+		recorder.record(endpoint, time.perf_counter() - start, None)
+		return None
+	recorder.record(endpoint, time.perf_counter() - start, response.status_code)
+	return response
+
+
+async def _login(client: httpx.AsyncClient, recorder: LatencyRecorder, username: str) -> Optional[str]:
+	response = await _timed_request(
+		client, recorder, "POST /auth/login", "POST", "/auth/login",
+		json={"username": username, "password": BENCH_PASSWORD}
+	)
+	if response is None or response.status_code != 200:
+		return None
+	return response.json()["access_token"]
+
+
+async def _virtual_client(
+	client: httpx.AsyncClient,
+	recorder: LatencyRecorder,
+	usernames: List[str],
+	mix: Dict[str, float],
+	deadline: float,
+	rng: random.Random
+) -> None:
+	username = rng.choice(usernames)
+	token = await _login(client, recorder, username)
+	if token is None:
+		return
+	headers = {"Authorization": f"Bearer {token}"}
+	endpoints = list(mix)
+	weights = list(mix.values())
+
+	while time.perf_counter() < deadline:
+		endpoint = rng.choices(endpoints, weights=weights, k=1)[0]
+		if endpoint == "POST /classify":
+			category = pick_category(rng)
+			await _timed_request(
+				client, recorder, endpoint, "POST", "/classify",
+				json={"description": generate_description(rng, category)}
+			)
+		elif endpoint == "GET /expenses":
+			await _timed_request(client, recorder, endpoint, "GET", "/expenses", headers=headers)
+		elif endpoint == "GET /stats/category":
+			await _timed_request(client, recorder, endpoint, "GET", "/stats/category", headers=headers)
+		elif endpoint == "POST /expenses":
+			category = pick_category(rng)
+			await _timed_request(
+				client, recorder, endpoint, "POST", "/expenses", headers=headers,
+				json={
+					"description": generate_description(rng, category),
+					"amount": generate_amount(rng, category),
+				}
+			)
+		elif endpoint == "POST /auth/login":
+			token = await _login(client, recorder, username) or token
+			headers = {"Authorization": f"Bearer {token}"}
+
+
+async def run_load(
+	client: httpx.AsyncClient,
+	usernames: List[str],
+	concurrency: int = 20,
+	duration: float = 30.0,
+	warmup: float = 2.0,
+	mix: Optional[Dict[str, float]] = None,
+	seed: int = 1
+) -> Dict[str, object]:
+	"""
+	Drive the API with concurrent virtual clients.
+
+	Args:
+		client: httpx client bound to the app (in-process or over the network)
+		usernames: Seeded benchmark usernames to log in as
+		concurrency: Number of concurrent virtual clients
+		duration: Measured run length in seconds
+		warmup: Unmeasured warm-up period in seconds
+		mix: Endpoint weights (defaults to DEFAULT_MIX)
+		seed: Random seed for request selection
+
+	Returns:
+		Dict with elapsed time and per-endpoint summaries
+	"""
+	mix = mix or DEFAULT_MIX
+	if warmup > 0:
+		warm_recorder = LatencyRecorder()
+		deadline = time.perf_counter() + warmup
+		await asyncio.gather(*[
+			_virtual_client(client, warm_recorder, usernames, mix, deadline, random.Random(seed + 10_000 + i))
+			for i in range(concurrency)
+		])
+
+	recorder = LatencyRecorder()
+	start = time.perf_counter()
+	deadline = start + duration
+	await asyncio.gather(*[
+		_virtual_client(client, recorder, usernames, mix, deadline, random.Random(seed + i))
+		for i in range(concurrency)
+	])
+	elapsed = time.perf_counter() - start
+
+	endpoints = recorder.summary(elapsed)
+	total = sum(item["count"] for item in endpoints.values())
+	return {
+		"elapsed_s": round(elapsed, 3),
+		"total_requests": total,
+		"throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+		"endpoints": endpoints,
+	}
+
+
+def _git_commit() -> Optional[str]:
+	try:
+		return subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def build_report(results: Dict[str, object], config: Dict[str, object]) -> Dict[str, object]:
+	"""Wrap results with enough metadata to compare runs later."""
+	return {
+		"meta": {
+			"timestamp": datetime.now(timezone.utc).isoformat(),
+			"git_commit": _git_commit(),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"config": config,
+		},
+		**results,
+	}
+
+
+def compare_reports(baseline: dict, candidate: dict, threshold_pct: float = 10.0) -> List[dict]:
+	"""
+	Compare two reports endpoint by endpoint.
+
+	A regression is a p50/p95/p99 increase or a throughput drop larger than
+	threshold_pct percent.
+	"""
+	rows = []
+	for endpoint, base in baseline.get("endpoints", {}).items():
+		new = candidate.get("endpoints", {}).get(endpoint)
+		if new is None:
+			continue
+		for metric, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True), ("throughput_rps", False)):
+			old_value, new_value = base.get(metric, 0.0), new.get(metric, 0.0)
+			change = ((new_value - old_value) / old_value * 100.0) if old_value else 0.0
+			worse = change if higher_is_worse else -change
+			rows.append({
+				"endpoint": endpoint,
+				"metric": metric,
+				"baseline": old_value,
+				"candidate": new_value,
+				"change_pct": round(change, 2),
+				"regression": worse > threshold_pct,
+			})
+	return rows
+
+
+def write_report(report: dict, path: str) -> None:
+	with open(path, "w") as f:
+		json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,102 @@
+"""
+Per-row cost of building and serializing the GET /expenses response.
+
+Compares the previous path (an Expense model per Mongo document, FastAPI
+response_model validation, stdlib JSON) with the fast path (projected
+documents turned into rows in place, serialized by ORJSONResponse). Mongo is
+not involved: both paths start from the same list of raw documents.
+
+	python -m benchmarks.serialization_bench --rows 1000 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Callable, Dict, List
+from bson import ObjectId
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app.models.schemas import Expense, ExpensesResponse
+from app.services.expense_layouts import EXPENSE_PROJECTION, _to_rows
+from benchmarks.datagen import generate_expense_docs
+
+
+def _raw_docs(count: int) -> List[dict]:
+	"""Documents as Motor returns them with the client-facing projection."""
+	docs = []
+	for doc in generate_expense_docs(random.Random(3), ObjectId(), count):
+		doc["_id"] = ObjectId()
+		docs.append({key: doc[key] for key in ("_id", *EXPENSE_PROJECTION) if key in doc})
+	return docs
+
+
+_response_field = create_model_field(name="Response_list_expenses", type_=ExpensesResponse, mode="serialization")
+
+
+def before(docs: List[dict]) -> bytes:
+	"""Expense per document, then FastAPI validation + jsonable output + JSONResponse."""
+	expenses = [
+		Expense(
+			id=str(doc["_id"]),
+			description=doc["description"],
+			amount=doc["amount"],
+			date=doc.get("date"),
+			category=doc["category"],
+			probability=doc["probability"]
+		)
+		for doc in docs
+	]
+	content = asyncio.run(serialize_response(
+		field=_response_field, response_content=ExpensesResponse(expenses=expenses)
+	))
+	return JSONResponse(content).body
+
+
+def after(docs: List[dict]) -> bytes:
+	"""Rows converted in place and serialized with orjson, no validation."""
+	return ORJSONResponse({"expenses": _to_rows(docs)}).body
+
+
+def measure(func: Callable[[List[dict]], bytes], rows: int, repeat: int) -> Dict[str, float]:
+	timings = []
+	body = b""
+	for _ in range(repeat):
+		docs = _raw_docs(rows)
+		start = time.perf_counter()
+		body = func(docs)
+		timings.append(time.perf_counter() - start)
+	best = min(timings)
+	return {"total_ms": round(best * 1000, 3), "per_row_us": round(best / rows * 1e6, 3), "bytes": len(body)}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization_bench")
+	parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--output", help="write the JSON report to this path")
+	args = parser.parse_args()
+
+	# Both paths must produce the same payload (the model path also emits unset optional fields as null)
+	sample = _raw_docs(50)
+	expected = json.loads(before([dict(d) for d in sample]))["expenses"]
+	actual = json.loads(after([dict(d) for d in sample]))["expenses"]
+	assert [{k: v for k, v in row.items() if v is not None} for row in expected] == actual
+
+	results = []
+	print(f"{'rows':>8}{'before us/row':>16}{'after us/row':>15}{'speedup':>9}")
+	for rows in args.rows:
+		old = measure(before, rows, args.repeat)
+		new = measure(after, rows, args.repeat)
+		speedup = old["per_row_us"] / new["per_row_us"] if new["per_row_us"] else 0.0
+		results.append({"rows": rows, "before": old, "after": new, "speedup": round(speedup, 2)})
+		print(f"{rows:>8}{old['per_row_us']:>16.2f}{new['per_row_us']:>15.2f}{speedup:>8.1f}x")
+
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+	main()
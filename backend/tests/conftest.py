@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests run against the in-process backend; it is picked when storage is imported
+os.environ["STORAGE_BACKEND"] = "memory"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
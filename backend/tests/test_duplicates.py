@@ -0,0 +1,55 @@
+import asyncio
+
+from bson import ObjectId
+
+from app.models.schemas import ExpenseCreate
+from app.services import stats, storage
+
+
+def _create(user_id: str, description: str, amount: float) -> dict:
+	payload = ExpenseCreate(description=description, amount=amount, date="2024-03-05")
+	return asyncio.run(storage.create_expense(None, user_id, payload, "Food", 0.9)).model_dump()
+
+
+def _rows(user_id: str) -> dict:
+	return {row["id"]: row for row in asyncio.run(storage.get_expense_rows_by_user(None, user_id))}
+
+
+def test_deleting_an_original_promotes_its_duplicate():
+	user_id = str(ObjectId())
+	original = _create(user_id, "Lunch at cafe", 20)
+	duplicate = _create(user_id, "Lunch at cafe", 20)
+	assert duplicate["duplicate_of"] == original["id"]
+
+	assert asyncio.run(storage.delete_expense(None, user_id, original["id"]))
+
+	rows = _rows(user_id)
+	assert list(rows) == [duplicate["id"]]
+	assert rows[duplicate["id"]].get("duplicate_of") is None
+	category_stats = asyncio.run(stats.get_category_stats(None, user_id))
+	assert [(entry["category"], entry["total_amount"], entry["count"]) for entry in category_stats] == [("Food", 20, 1)]
+
+
+def test_remaining_duplicates_point_at_the_promoted_one():
+	user_id = str(ObjectId())
+	original = _create(user_id, "Lunch at cafe", 20)
+	second = _create(user_id, "Lunch at cafe", 20)
+	third = _create(user_id, "Lunch at cafe", 20)
+
+	assert asyncio.run(storage.delete_expense(None, user_id, original["id"]))
+
+	rows = _rows(user_id)
+	assert rows[second["id"]].get("duplicate_of") is None
+	assert rows[third["id"]]["duplicate_of"] == second["id"]
+
+
+def test_deleting_a_duplicate_keeps_the_original():
+	user_id = str(ObjectId())
+	original = _create(user_id, "Lunch at cafe", 20)
+	duplicate = _create(user_id, "Lunch at cafe", 20)
+
+	assert asyncio.run(storage.delete_expense(None, user_id, duplicate["id"]))
+
+	rows = _rows(user_id)
+	assert list(rows) == [original["id"]]
+	assert rows[original["id"]].get("duplicate_of") is None